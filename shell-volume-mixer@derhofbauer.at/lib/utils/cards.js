@@ -28,6 +28,12 @@ var STREAM_MATCHING = Object.freeze({
 
 const NULL_CARD = 4294967295;
 
+// milliseconds to wait for more cards to be added before querying them all at once
+const CARDS_ADDED_DELAY = 100;
+
+// milliseconds to wait before querying cards again, unless the helper suggests otherwise
+const RETRY_DELAY = 2000;
+
 /** @typedef {{
  *   name: String,
  *   description: String,
@@ -56,6 +62,25 @@ const NULL_CARD = 4294967295;
  * }} paCard
  */
 
+/** @typedef {{
+ *   values: Array.<Number>,
+ *   channels: Array.<?String>,
+ *   base: Number,
+ *   steps: Number,
+ *   percent: Array.<Number>,
+ *   linear: Array.<Number>,
+ *   dB: Array.<?Number>,
+ * }} paVolume
+ */
+
+/** @typedef {{
+ *   index: Number,
+ *   name: String,
+ *   card: ?Number,
+ *   volume: paVolume,
+ * }} paSink
+ */
+
 /**
  * @property {Object.<string, paCard>} _paCards
  * @mixes EventHandlerDelegate
@@ -69,6 +94,9 @@ var Cards = class {
         this._control = control;
         this.eventHandlerDelegate = control;
 
+        this._addedCards = new Set();
+        this._addedCardsTimeout = null;
+
         this._initDone = new Promise(resolve => {
             this._initialized = resolve;
         });
@@ -80,6 +108,9 @@ var Cards = class {
         this._events.connect('debug-cards', (event, callback) => {
             callback(Log.dump(this._paCards));
         });
+
+        // cards are queried repeatedly, keep the helper running instead of spawning it each time
+        PaHelper.startService();
     }
 
     /**
@@ -140,7 +171,7 @@ var Cards = class {
             cards = await this._getCardDetails();
         } while (!cards
             && (--retries) > 0
-            && await new Promise(resolve => GLib.timeout_add_seconds(GLib.PRIORITY_DEFAULT, 2, () => resolve(true)))
+            && await this._waitForRetry()
         );
 
         if (!cards) {
@@ -150,6 +181,28 @@ var Cards = class {
         this._paCards = cards;
     }
 
+    /**
+     * Waits as long as the helper suggested before querying again, if it makes sense at all.
+     *
+     * @returns {Promise<boolean>} Whether to retry
+     * @private
+     */
+    _waitForRetry() {
+        const error = PaHelper.getLastError();
+
+        if (error && error.retry === null) {
+            Log.info('Cards', '_waitForRetry', `Not retrying after ${error.code}`);
+            return Promise.resolve(false);
+        }
+
+        const delay = error ? error.retry * 1000 : RETRY_DELAY;
+
+        return new Promise(resolve => GLib.timeout_add(GLib.PRIORITY_DEFAULT, delay, () => {
+            resolve(true);
+            return GLib.SOURCE_REMOVE;
+        }));
+    }
+
     /**
      * @returns {?Object.<string, paCard>}
      * @private
@@ -196,42 +249,88 @@ var Cards = class {
 
     /**
      * Signal for added cards.
+     * Cards added in quick succession (e.g. by a dock) are collected to be queried at once.
+     */
+    _onCardAdded(control, index) {
+        this._addedCards.add(index);
+
+        if (this._addedCardsTimeout) {
+            return;
+        }
+
+        this._addedCardsTimeout = GLib.timeout_add(GLib.PRIORITY_DEFAULT, CARDS_ADDED_DELAY, () => {
+            this._addedCardsTimeout = null;
+
+            // noinspection JSIgnoredPromiseFromCall
+            this._addCards(control);
+
+            return GLib.SOURCE_REMOVE;
+        });
+    }
+
+    /**
+     * Adds all cards collected, querying the ones we don't know yet with a single helper call.
+     *
+     * @param {Gvc.MixerControl} control
+     * @private
      */
-    async _onCardAdded(control, index) {
-        // we're actually looking up card.index
-        let card = control.lookup_card_id(index);
-        let paCard = await this.get(index);
+    async _addCards(control) {
+        const indexes = [...this._addedCards];
+        this._addedCards.clear();
 
-        if (!paCard || paCard.fake) {
+        await this._initDone;
+
+        const unknown = indexes.filter(index => !(index in this._paCards) || this._paCards[index].fake);
+        let paCards = {};
+
+        if (unknown.length) {
             try {
-                paCard = await PaHelper.getCardByIndex(index);
+                paCards = await PaHelper.getCardsByIndex(unknown);
             } catch (e) {
-                Log.error('Cards', '_onCardAdded', 'Calling Python helper failed');
+                Log.error('Cards', '_addCards', 'Calling Python helper failed');
             }
+        }
 
-            if (!paCard) {
-                Log.error('Cards', '_onCardAdded', 'GVC card not found through Python helper');
-
-                // external script couldn't get card info, fake it
-                paCard = {
-                    // card name (human name) won't be useful, we'll set it anyway
-                    name:     card.name,
-                    index:    index,
-                    profiles: [],
-                    fake:     true
-                };
+        for (const index of indexes) {
+            // we're actually looking up card.index
+            const card = control.lookup_card_id(index);
+
+            if (!card) {
+                Log.info('Added card vanished before it could be tracked', index);
+                continue;
             }
 
-            this._paCards[index] = paCard;
-        }
+            let paCard = this._paCards[index];
+
+            if (!paCard || paCard.fake) {
+                paCard = paCards[index];
+
+                if (!paCard) {
+                    Log.error('Cards', '_addCards', 'GVC card not found through Python helper');
+
+                    // external script couldn't get card info, fake it
+                    paCard = {
+                        // card name (human name) won't be useful, we'll set it anyway
+                        name:     card.name,
+                        index:    index,
+                        profiles: [],
+                        fake:     true
+                    };
+                }
 
-        this._addGvcCard(paCard, card);
+                this._paCards[index] = paCard;
+            }
+
+            this._addGvcCard(paCard, card);
+        }
     }
 
     /**
      * Signal for removed cards.
      */
     _onCardRemoved(control, index) {
+        this._addedCards.delete(index);
+
         if (index in this._paCards) {
             const name = this._paCards[index].name;
             delete this._cardNames[name];
@@ -297,15 +396,50 @@ var Cards = class {
         return null;
     }
 
+    /**
+     * Applies card profiles, sink ports and the default sink in one go, see PaHelper.applyChanges().
+     * Cards affected are updated from the state the helper returns along with the results.
+     *
+     * @param {Array<Object>} changes
+     * @returns {Promise<?paChanges>}
+     */
+    async apply(changes) {
+        await this._initDone;
+
+        const result = await PaHelper.applyChanges(changes);
+
+        if (result && result.cards) {
+            for (const [index, paCard] of Object.entries(result.cards)) {
+                const known = this._paCards[index];
+
+                if (known && known.card) {
+                    paCard.card = known.card;
+                }
+
+                this._paCards[index] = paCard;
+            }
+        }
+
+        return result;
+    }
+
     /**
      * Tries to find out whether a certain stream matches profile for a card.
      *
+     * Streams are matched to cards by index, names are only compared if a stream doesn't know its card.
+     *
      * @param {Gvc.MixerStream} stream
      * @param {paCard} paCard
      * @param {string} profileName
      * @returns {STREAM_MATCHING}
      */
     streamMatchesPaCard(stream, paCard, profileName) {
+        const knowsCard = stream.card_index !== undefined && stream.card_index !== NULL_CARD;
+
+        if (knowsCard && stream.card_index !== paCard.index) {
+            return false;
+        }
+
         const streamName = stream.name;
         const cardName = paCard.name;
 
@@ -323,9 +457,7 @@ var Cards = class {
         profileParts.shift();
         const profile = profileParts.join(':');
 
-        if (streamAddr !== cardAddr
-            || streamIndex !== cardIndex
-        ) {
+        if (!knowsCard && (streamAddr !== cardAddr || streamIndex !== cardIndex)) {
             // cards don't match, certainly no hit
             return false;
         }
@@ -342,6 +474,13 @@ var Cards = class {
      */
     destroy() {
         this.disconnectAll();
+
+        if (this._addedCardsTimeout) {
+            GLib.source_remove(this._addedCardsTimeout);
+            this._addedCardsTimeout = null;
+        }
+
+        PaHelper.stopService();
     }
 };
 
@@ -6,7 +6,7 @@
  * @author Alexander Hofbauer <alex@derhofbauer.at>
  */
 
-/* exported getCards, getCardByIndex */
+/* exported applyChanges, getCards, getCardByIndex, getCardsByIndex, getLastError, startService, stopService */
 
 const Lib = imports.misc.extensionUtils.getCurrentExtension().imports.lib;
 const Log = Lib.utils.log;
@@ -14,10 +14,32 @@ const Process = Lib.utils.process;
 const Utils = Lib.utils.utils;
 
 const PYTHON_HELPER_PATH = 'pautils/query.py';
+const TYPE_APPLY = 'apply';
 const TYPE_CARDS = 'cards';
 
 let PYTHON;
 
+/** @type {?Process.LineProcess} */
+let service = null;
+let serviceEnabled = false;
+
+/**
+ * Cards of the last full query, along with the tag the helper handed out for them.
+ *
+ * @type {{tag: string, cards: Object.<string, paCard>}}
+ */
+const cardsCache = {
+    tag:   '',
+    cards: {},
+};
+
+/**
+ * Error of the last query that failed, with the seconds after which trying again makes sense (null if it doesn't).
+ *
+ * @type {?{code: string, retry: ?number}}
+ */
+let lastError = null;
+
 async function findPython() {
     if (PYTHON === undefined) {
         for (let python of ['python3', 'python']) {
@@ -45,15 +67,13 @@ async function findPython() {
 }
 
 /**
- * @param {string} type Type of data to query
- * @param {?number} [index=undefined]
- * @returns {Promise<?Object.<string, paCard>>} JSON object of the output
+ * @returns {Promise<?Array<string>>} Command to run the helper script
  */
-async function execHelper(type, index = undefined) {
+async function helperCommand() {
     const paUtilPath = Utils.getExtensionPath(PYTHON_HELPER_PATH);
 
     if (!paUtilPath) {
-        Log.error('paHelper', 'execHelper', `Could not find PulseAudio utility in extension path ${PYTHON_HELPER_PATH}`);
+        Log.error('paHelper', 'helperCommand', `Could not find PulseAudio utility in extension path ${PYTHON_HELPER_PATH}`);
         return null;
     }
 
@@ -63,31 +83,152 @@ async function execHelper(type, index = undefined) {
         return null;
     }
 
-    const args = ['/usr/bin/env', python, paUtilPath, type];
+    const command = ['/usr/bin/env', python, paUtilPath];
 
-    if (!isNaN(index)) {
-        args.push(index);
+    // timings of the helper's query phases are logged along with verbose output
+    if (Log.verbose) {
+        command.push('--trace');
     }
 
+    return command;
+}
 
-    let ret;
-    let stdout;
-    let stderr;
-    let pythonError;
+/**
+ * Logs what the helper wrote to stderr, timings of its queries in particular.
+ *
+ * @param {string} output
+ */
+function logStderr(output) {
+    for (let line of output.split('\n')) {
+        if (!line) {
+            continue;
+        }
+
+        let record = null;
+        try {
+            record = JSON.parse(line);
+        } catch (e) {
+            // not a trace record, but debug output
+        }
+
+        if (record && record.trace) {
+            Log.info('paHelper trace', JSON.stringify(record.trace));
+        } else {
+            Log.info('paHelper', line);
+        }
+    }
+}
+
+/**
+ * Keeps the helper script running in serve mode, for all further queries to be answered through one connection.
+ */
+function startService() {
+    serviceEnabled = true;
+}
+
+/**
+ * Terminates the helper service, if it is running.
+ */
+function stopService() {
+    serviceEnabled = false;
+
+    if (service) {
+        service.destroy();
+        service = null;
+    }
+}
+
+/**
+ * Queries the helper service, spawning it if necessary.
+ *
+ * @param {Object} request
+ * @returns {Promise<?string>} Raw output of the helper
+ */
+async function queryService(request) {
+    const [stdout] = await sendToService(request);
+
+    return stdout;
+}
+
+/**
+ * Sends a request to the helper service, spawning it if necessary.
+ *
+ * @param {Object} request
+ * @returns {Promise<[?string, boolean]>} Raw output of the helper and whether the request might have reached it
+ */
+async function sendToService(request) {
+    if (!service) {
+        const command = await helperCommand();
+
+        if (!command) {
+            return [null, false];
+        }
+
+        try {
+            service = new Process.LineProcess(command.concat('--serve'), Log.verbose ? logStderr : null);
+        } catch (e) {
+            Log.error('paHelper', 'sendToService', e);
+            return [null, false];
+        }
+    }
+
+    const current = service;
 
     try {
-        [ret, stdout, stderr] = await Process.execAsync(args);
+        return [await current.query(JSON.stringify(request)), true];
     } catch (e) {
-        pythonError = e;
+        Log.error('paHelper', 'sendToService', e);
+
+        // service is probably dead, a new one will be spawned with the next query
+        current.destroy();
+        if (service === current) {
+            service = null;
+        }
+
+        return [null, Boolean(e.written)];
     }
+}
 
-    if (pythonError) {
-        Log.error('paHelper', 'execHelper', pythonError);
-        if (stderr) {
-            Log.error('paHelper', 'execHelper', `(${ret}) ${stderr}`);
+/**
+ * @param {string} type Type of data to query
+ * @param {Array<number>} [indexes=[]] Indexes to query, all data if empty
+ * @param {?string} [since=null] Tag of a previous result to only query changes
+ * @returns {Promise<?Object.<string, paCard>>} JSON object of the output
+ */
+async function execHelper(type, indexes = [], since = null) {
+    indexes = indexes.filter(index => !isNaN(index));
+
+    let stdout;
+    lastError = null;
+
+    if (serviceEnabled) {
+        const request = { type };
+
+        if (indexes.length) {
+            request.indexes = indexes;
         }
+
+        if (since !== null) {
+            request.since = since;
+        }
+
+        stdout = await queryService(request);
     }
 
+    if (!stdout) {
+        [stdout] = await execOnce(type, indexes, since);
+    }
+
+    return parseOutput(stdout);
+}
+
+/**
+ * Parses the helper's output, remembering the error it reports, if any.
+ *
+ * @param {?string} stdout Raw output of the helper
+ * @returns {?Object} JSON object of the output
+ */
+function parseOutput(stdout) {
     if (!stdout) {
         return null;
     }
@@ -96,30 +237,114 @@ async function execHelper(type, index = undefined) {
     try {
         data = JSON.parse(stdout);
     } catch (e) {
-        Log.error('paHelper', 'execHelper', e);
+        Log.error('paHelper', 'parseOutput', e);
         return null;
     }
 
     if (!data || typeof data !== 'object') {
-        Log.error('paHelper', 'execHelper', 'Invalid response');
+        Log.error('paHelper', 'parseOutput', 'Invalid response');
         return null;
     }
 
     if ('success' in data && data.success === false) {
-        Log.error('paHelper', 'execHelper', `Error: ${data.error}`);
-        return null;
+        Log.error('paHelper', 'parseOutput', `Error: ${data.error}`);
+
+        if (data.code) {
+            lastError = { code: data.code, retry: data.retry === undefined ? null : data.retry };
+        }
+
+        // changes sent before the error still come with their results
+        return data.results ? data : null;
     }
 
     return data;
 }
 
+/**
+ * Runs the helper script for a single query.
+ *
+ * @param {string} type Type of data to query
+ * @param {Array<number|string>} indexes Indexes to query, all data if empty (changes to apply as JSON)
+ * @param {?string} since Tag of a previous result to only query changes
+ * @returns {Promise<[?string, boolean]>} Raw output of the helper and whether it was started
+ */
+async function execOnce(type, indexes, since) {
+    const command = await helperCommand();
+
+    if (!command) {
+        return [null, false];
+    }
+
+    const args = command.concat(type, indexes);
+
+    if (since !== null) {
+        args.push('--since', since);
+    }
+
+
+    let ret;
+    let stdout;
+    let stderr;
+    let pythonError;
+
+    try {
+        [ret, stdout, stderr] = await Process.execAsync(args);
+    } catch (e) {
+        pythonError = e;
+    }
+
+    if (pythonError) {
+        Log.error('paHelper', 'execOnce', pythonError);
+        if (stderr) {
+            Log.error('paHelper', 'execOnce', `(${ret}) ${stderr}`);
+        }
+    } else if (stderr && Log.verbose) {
+        logStderr(stderr);
+    }
+
+    return [stdout || null, !pythonError || Boolean(pythonError.spawned)];
+}
+
+/**
+ * @returns {?{code: string, retry: ?number}} Error of the last query, if it failed because of the audio server
+ */
+function getLastError() {
+    return lastError;
+}
+
 /**
  * Calls the Python helper script to get details about all available cards and their profiles.
+ * Only changes since the last call are transferred.
  *
  * @returns {Promise<?Object.<string, paCard>>} JSON object of the output
  */
 async function getCards() {
-    return await execHelper(TYPE_CARDS);
+    const data = await execHelper(TYPE_CARDS, [], cardsCache.tag);
+
+    if (!data) {
+        return null;
+    }
+
+    if (data.data) {
+        cardsCache.cards = data.data;
+
+    } else if (!data.unchanged) {
+        Object.assign(cardsCache.cards, data.changed);
+
+        for (let index of data.removed || []) {
+            delete cardsCache.cards[index];
+        }
+    }
+
+    cardsCache.tag = data.tag || '';
+
+    // callers attach their own properties to cards, keep the cached ones untouched
+    const cards = {};
+    for (let index in cardsCache.cards) {
+        cards[index] = Object.assign({}, cardsCache.cards[index]);
+    }
+
+    return cards;
 }
 
 /**
@@ -129,7 +354,7 @@ async function getCards() {
  * @returns {Promise<?paCard>} JSON object of the output
  */
 async function getCardByIndex(index) {
-    const data = await execHelper(TYPE_CARDS, index);
+    const data = await execHelper(TYPE_CARDS, [index]);
 
     if (data && data[index]) {
         return data[index];
@@ -137,3 +362,65 @@ async function getCardByIndex(index) {
 
     return null;
 }
+
+/**
+ * Calls the Python helper script once to get details about several cards and their profiles.
+ *
+ * @param {Array<number>} indexes
+ * @returns {Promise<Object.<string, paCard>>} JSON object of the cards found
+ */
+async function getCardsByIndex(indexes) {
+    if (!indexes.length) {
+        return {};
+    }
+
+    return await execHelper(TYPE_CARDS, indexes) || {};
+}
+
+/** @typedef {{
+ *   success: ?Boolean,
+ *   results: Array.<{success: Boolean, error: ?String}>,
+ *   cards: Object.<string, paCard>,
+ *   sinks: Object.<string, paSink>,
+ *   default_sink: ?String,
+ * }} paChanges
+ */
+
+/**
+ * Calls the Python helper script to apply card profiles, sink ports and the default sink in one go.
+ *
+ * Changes look like `{card: name, profile: name}`, `{sink: name, port: name}` or `{default_sink: name}`, cards and
+ * sinks given by index or name. They're sent to the server all at once, the result of each is returned in the same
+ * order, along with the cards and sinks affected and the default sink as they are afterwards.
+ *
+ * Changes are only run through a helper of their own if the service never got them, they're not applied twice.
+ * If the helper got them but didn't answer, whether they were applied is unknown and an error is thrown. If the
+ * audio server failed or didn't answer in time after they were sent, `success` is false and only `results` is set,
+ * changes not confirmed failing with "no reply in time".
+ *
+ * @param {Array<Object>} changes
+ * @returns {Promise<?paChanges>} JSON object of the output, null if the helper couldn't be run
+ */
+async function applyChanges(changes) {
+    let stdout = null;
+    let sent = false;
+    lastError = null;
+
+    if (serviceEnabled) {
+        [stdout, sent] = await sendToService({ type: TYPE_APPLY, changes });
+    }
+
+    if (!stdout && sent) {
+        throw Error('Helper service got the changes but did not answer');
+    }
+
+    if (!stdout) {
+        [stdout, sent] = await execOnce(TYPE_APPLY, [JSON.stringify(changes)], null);
+    }
+
+    if (!stdout && sent) {
+        throw Error('Helper was started with the changes but did not answer');
+    }
+
+    return parseOutput(stdout);
+}
@@ -6,13 +6,16 @@
  * @author Alexander Hofbauer <alex@derhofbauer.at>
  */
 
-/* exported execAsync */
+/* exported execAsync, LineProcess */
 
-const { Gio } = imports.gi;
+const { Gio, GLib } = imports.gi;
+const ByteArray = imports.byteArray;
 
 /**
  * Executes an async command.
  *
+ * Errors after the process was spawned have `spawned` set, it might have done its work.
+ *
  * @param {Array} command
  * @returns {Promise<[int, string, string]>|Promise<Error>}
  */
@@ -31,14 +34,148 @@ async function execAsync(command) {
                 const ret = process.get_exit_status();
 
                 if (!success) {
-                    reject(Error('Error spawning subprocess'));
+                    const error = Error('Error spawning subprocess');
+                    error.spawned = true;
+                    reject(error);
                 } else {
                     resolve([ret, stdout, stderr]);
                 }
 
             } catch (e) {
+                e.spawned = true;
                 reject(e);
             }
         });
     });
 }
+
+
+/**
+ * Long-running process exchanging one line of output for each line of input.
+ * Queries are answered strictly in order, so they're queued up to never overlap.
+ */
+var LineProcess = class {
+    /**
+     * @param {Array} command
+     * @param {?function(string)} [onStderr=null] Called with each line the process writes to stderr
+     */
+    constructor(command, onStderr = null) {
+        let flags = Gio.SubprocessFlags.STDIN_PIPE | Gio.SubprocessFlags.STDOUT_PIPE;
+
+        if (onStderr) {
+            flags |= Gio.SubprocessFlags.STDERR_PIPE;
+        }
+
+        this._process = new Gio.Subprocess({
+            argv:  command.map(arg => arg.toString()),
+            flags,
+        });
+
+        this._process.init(null);
+
+        this._stdin = this._process.get_stdin_pipe();
+        this._stdout = new Gio.DataInputStream({
+            base_stream:       this._process.get_stdout_pipe(),
+            close_base_stream: true,
+        });
+
+        this._queue = Promise.resolve();
+
+        if (onStderr) {
+            this._readStderr(new Gio.DataInputStream({
+                base_stream:       this._process.get_stderr_pipe(),
+                close_base_stream: true,
+            }), onStderr);
+        }
+    }
+
+    /**
+     * Passes lines written to stderr on, until the process closes it.
+     *
+     * @param {Gio.DataInputStream} stream
+     * @param {function(string)} onStderr
+     * @private
+     */
+    _readStderr(stream, onStderr) {
+        stream.read_line_async(GLib.PRIORITY_LOW, null, (stream, result) => {
+            let line;
+
+            try {
+                [line] = stream.read_line_finish_utf8(result);
+            } catch (e) {
+                return;
+            }
+
+            if (line === null) {
+                return;
+            }
+
+            onStderr(line);
+            this._readStderr(stream, onStderr);
+        });
+    }
+
+    /**
+     * Writes a line to the process and waits for its response.
+     * Errors after the line was written have `written` set, the process might have acted on it.
+     *
+     * @param {string} line
+     * @returns {Promise<string>}
+     */
+    query(line) {
+        const result = this._queue.then(() => this._exchange(line));
+        // keep the queue going, errors are handled by the caller
+        this._queue = result.catch(() => null);
+
+        return result;
+    }
+
+    /**
+     * @param {string} line
+     * @returns {Promise<string>}
+     * @private
+     */
+    async _exchange(line) {
+        await new Promise((resolve, reject) => {
+            const bytes = new GLib.Bytes(ByteArray.fromString(`${line}\n`));
+
+            this._stdin.write_bytes_async(bytes, GLib.PRIORITY_DEFAULT, null, (stream, result) => {
+                try {
+                    stream.write_bytes_finish(result);
+                    resolve();
+                } catch (e) {
+                    reject(e);
+                }
+            });
+        });
+
+        return new Promise((resolve, reject) => {
+            const fail = e => {
+                e.written = true;
+                reject(e);
+            };
+
+            this._stdout.read_line_async(GLib.PRIORITY_DEFAULT, null, (stream, result) => {
+                try {
+                    const [response] = stream.read_line_finish_utf8(result);
+
+                    if (response === null) {
+                        fail(Error('Process closed its output'));
+                    } else {
+                        resolve(response);
+                    }
+
+                } catch (e) {
+                    fail(e);
+                }
+            });
+        });
+    }
+
+    /**
+     * Terminates the process.
+     */
+    destroy() {
+        this._process.force_exit();
+    }
+};
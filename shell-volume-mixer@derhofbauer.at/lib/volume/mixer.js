@@ -259,17 +259,74 @@ var Mixer = class
             }
         }
 
-        paCard.card.set_profile(next.profile);
-
         if (newSink) {
             this._pauseDefaultSinkEvent = true;
-            this._control.set_default_sink(newSink);
+        }
+
+        if (!await this._applyProfile(paCard, next.profile, newSink)) {
+            this._pauseDefaultSinkEvent = false;
+            return;
         }
 
         const paProfile = paCard.profiles[next.profile];
         this._showNotification(`${paCard.description || paCard.name}\n${paProfile.description || paProfile.name}`);
     }
 
+    /**
+     * Sets a card's profile and the default sink at once, through the helper.
+     *
+     * @param {paCard} paCard
+     * @param {string} profile
+     * @param {?Gvc.MixerStream} sink
+     * @returns {Promise<boolean>} Whether the profile was switched
+     * @private
+     */
+    async _applyProfile(paCard, profile, sink) {
+        const changes = [{ card: paCard.name, profile }];
+
+        if (sink) {
+            changes.push({ default_sink: sink.get_name() });
+        }
+
+        let result;
+        try {
+            result = await this._cards.apply(changes);
+        } catch (e) {
+            // the helper might have applied them, don't send them again
+            Log.error('Mixer', '_applyProfile', e);
+            return false;
+        }
+
+        if (!result) {
+            // helper unavailable or never got the changes, fall back to one call after the other
+            paCard.card.set_profile(profile);
+
+            if (sink) {
+                this._control.set_default_sink(sink);
+            }
+
+            return true;
+        }
+
+        const [profileResult, sinkResult] = result.results;
+
+        if (!profileResult.success) {
+            Log.error('Mixer', '_applyProfile', `Setting profile ${profile} failed: ${profileResult.error}`);
+            return false;
+        }
+
+        if (sinkResult && !sinkResult.success) {
+            Log.error('Mixer', '_applyProfile', `Setting default sink failed: ${sinkResult.error}`);
+
+            // unless the server refused it, the default sink might still be set, don't send it again
+            if (result.success !== false) {
+                this._control.set_default_sink(sink);
+            }
+        }
+
+        return true;
+    }
+
     /**
      * Shows a notification window through Shell's OSD Window Manager.
      *
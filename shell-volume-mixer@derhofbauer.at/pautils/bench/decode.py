@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares decoding the profiles and ports of cards with hundreds of them into records, going through
+# pointer objects for every element as cb_data used to, and reading the pointer arrays at once as it
+# does now.
+#
+# Usage: decode.py [--cards N] [--profiles N] [--ports N] [-n RUNS] [--json]
+#
+# Both decoders are run on the same synthesized card_info structures, their output is checked to be
+# the same.
+
+import argparse
+import json
+import statistics
+from time import perf_counter
+
+from fakepulse import FakePulse
+
+from lib import records
+from lib.cards import Cards
+from lib.records import Port, Profile, intern
+
+
+def legacy_profiles(pa_card):
+    profiles = {}
+
+    for i in range(0, pa_card.n_profiles):
+        if not pa_card.profiles2[i] or not pa_card.profiles2[i][0]:
+            continue
+
+        profile = pa_card.profiles2[i][0]
+        name = intern(profile.name)
+        data = Profile()
+        data.name = name
+        data.description = intern(profile.description)
+        data.available = bool(profile.available)
+        profiles[name] = data
+
+    return profiles
+
+
+def legacy_ports(pa_card):
+    ports = {}
+
+    for index in range(0, pa_card.n_ports):
+        if not pa_card.ports[index] or not pa_card.ports[index][0]:
+            continue
+
+        port = pa_card.ports[index][0]
+        name = intern(port.name)
+        data = Port()
+        data.name = name
+        data.description = intern(port.description)
+        data.direction = 'out' if port.direction == 1 else 'in'
+        data.available = True if port.available == 2 else (False if port.available == 1 else None)
+        ports[name] = data
+
+    return ports
+
+
+def legacy(card_infos):
+    return [(legacy_profiles(pa_card), legacy_ports(pa_card)) for pa_card in card_infos]
+
+
+def current(card_infos):
+    decoder = Cards(connection=FakeConnection())
+    return [(decoder._profiles(pa_card, None), decoder._ports(pa_card, None)) for pa_card in card_infos]
+
+
+def exported(decoded):
+    return [(records.export(profiles), records.export(ports)) for profiles, ports in decoded]
+
+
+class FakeConnection:
+    context = None
+
+
+def measure(runs, function):
+    times = []
+
+    for _ in range(runs):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return {'median': statistics.median(times), 'min': min(times)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=4)
+    parser.add_argument('--profiles', type=int, default=400)
+    parser.add_argument('--ports', type=int, default=100)
+    parser.add_argument('-n', '--runs', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    fake = FakePulse(args.cards, args.profiles, args.ports, sinks=0, sources=0)
+    fake.install()
+
+    decoded = current(fake.card_infos)
+
+    if exported(legacy(fake.card_infos)) != exported(decoded):
+        raise RuntimeError('Decoders disagree')
+
+    elements = args.cards * (args.profiles + args.ports)
+    report = {}
+
+    for name, decoder in (('legacy', legacy), ('current', current)):
+        result = measure(args.runs, lambda: decoder(fake.card_infos))
+        result['elements_per_s'] = elements / result['median']
+        report[name] = result
+
+    report['speedup'] = report['legacy']['median'] / report['current']['median']
+    report['export'] = measure(args.runs, lambda: exported(decoded))
+
+    if args.json:
+        print(json.dumps({'config': vars(args), 'report': report}, indent=4))
+        return
+
+    print(f'{args.cards} cards with {args.profiles} profiles and {args.ports} ports each, {args.runs} runs')
+
+    for name in ('legacy', 'current'):
+        print(f'  {name:8}  median {report[name]["median"] * 1000:9.3f}ms  min {report[name]["min"] * 1000:9.3f}ms  '
+              f'{report[name]["elements_per_s"]:12.0f} elements/s')
+
+    print(f'  speedup   {report["speedup"]:.2f}x')
+    print(f'  export    median {report["export"]["median"] * 1000:9.3f}ms  (to dicts, the same for both)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,548 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from array import array
+from ctypes import POINTER, addressof, c_char, c_void_p, cast, pointer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import libpulse  # noqa: E402
+
+
+class FakePulse:
+    """
+    Stand-in for the functions of the libpulse module, answering from synthesized structures.
+
+    Objects are delivered through the callbacks the decoders pass in, the same way libpulse would,
+    from a mainloop that dispatches everything queued so far on each iteration.
+
+    Any number of contexts can be connected, to servers all answering the same, except for those in
+    `refused`, refusing connections, and those in `silent`, never getting past connecting.
+    """
+
+    def __init__(self, cards=3, profiles=4, ports=2, sinks=None, sources=None, connect_iterations=4,
+                 sink_inputs=None, connect_delay=0, refused=(), silent=()):
+        self.cards = cards
+        self.profiles = profiles
+        self.ports = ports
+        self.sinks = cards if sinks is None else sinks
+        self.sources = cards if sources is None else sources
+        self.sink_inputs = cards if sink_inputs is None else sink_inputs
+        self.connect_iterations = connect_iterations
+        # seconds until the server shows up after connecting started
+        self.connect_delay = connect_delay
+        self.refused = refused
+        self.silent = silent
+
+        self._queue = deque()
+        self._contexts = {}
+        self._subscribe_cb = None
+        self._poll_func = None
+        self._thread = None
+        self._thread_lock = threading.RLock()
+        self._running = False
+        self._operation = pointer(libpulse.operation())
+        self._proplists = {}
+        self._proplist_keys = {}
+        self._keep = []
+        self._streams = {}
+
+        self.card_infos = [self._card(index) for index in range(self.cards)]
+        self.sink_infos = [self._sink(index) for index in range(self.sinks)]
+        self.source_infos = [self._source(index) for index in range(self.sources)]
+        self.sink_input_infos = [self._sink_input(index) for index in range(self.sink_inputs)]
+
+        self._server_info = libpulse.server_info(b'user', b'localhost', b'15.0', b'pulseaudio')
+        self._server_info.cookie = 0x1234abcd
+        self._server_info.default_sink_name = self.sink_infos[0].name if self.sink_infos else None
+
+    def install(self):
+        """
+        Replaces the libpulse functions, the shared library is never loaded.
+        """
+        for name in libpulse._prototypes:
+            setattr(libpulse, name, getattr(self, name, self._noop))
+
+    def _noop(self, *args):
+        return 0
+
+    def _proplist(self, properties):
+        buffer = (c_char * 1)()
+        self._keep.append(buffer)
+        self._proplists[cast(buffer, c_void_p).value] = properties
+        self._proplist_keys[cast(buffer, c_void_p).value] = list(properties)
+        return cast(buffer, POINTER(libpulse.proplist))
+
+    def _array(self, cls, items):
+        array = (POINTER(cls) * (len(items) + 1))(*[pointer(item) for item in items])
+        self._keep.append((items, array))
+        return cast(array, POINTER(POINTER(cls)))
+
+    def _card(self, index):
+        profiles = [
+            libpulse.card_profile_info2(f'output:analog-stereo-{i}+input:analog-stereo'.encode(),
+                                        f'Analog Stereo Duplex {i}'.encode(), 1, 1, 100 - i, 1)
+            for i in range(self.profiles)
+        ]
+        ports = [
+            libpulse.card_port_info(f'analog-output-{i}'.encode(), f'Analog Output {i}'.encode(), 100 - i,
+                                    2 if i % 2 else 1, 1)
+            for i in range(self.ports)
+        ]
+
+        card = libpulse.card_info()
+        card.index = index
+        card.name = f'alsa_card.pci-0000_00_{index:02x}.0'.encode()
+        card.driver = b'module-alsa-card.c'
+        card.proplist = self._proplist({
+            b'alsa.card': str(index).encode(),
+            b'alsa.card_name': f'HDA Intel PCH {index}'.encode(),
+            b'alsa.driver_name': b'snd_hda_intel',
+            b'alsa.long_card_name': f'HDA Intel PCH at 0xf7f{index:02x}000 irq 32'.encode(),
+            b'device.bus': b'pci',
+            b'device.vendor.name': b'Intel Corporation',
+            b'device.product.name': b'Sunrise Point-LP HD Audio',
+            b'device.form_factor': b'internal',
+            b'device.string': str(index).encode(),
+            b'device.description': f'Built-in Audio {index}'.encode(),
+            b'device.icon_name': b'audio-card-pci',
+        })
+        card.n_profiles = len(profiles)
+        card.profiles2 = self._array(libpulse.card_profile_info2, profiles)
+        card.n_ports = len(ports)
+        card.ports = self._array(libpulse.card_port_info, ports)
+
+        if profiles:
+            card.active_profile = cast(pointer(profiles[0]), POINTER(libpulse.card_profile_info))
+            card.active_profile2 = pointer(profiles[0])
+
+        return card
+
+    def _device(self, cls, port_cls, index, name):
+        ports = [
+            port_cls(f'analog-{name}-{i}'.encode(), f'Analog {name} {i}'.encode(), 100 - i, 2 if i % 2 else 1)
+            for i in range(self.ports)
+        ]
+
+        device = cls()
+        device.index = index
+        device.name = f'alsa_{name}.pci-0000_00_{index:02x}.0.analog-stereo'.encode()
+        device.description = f'Built-in Audio Analog Stereo {index}'.encode()
+        device.driver = b'module-alsa-card.c'
+        device.card = index if index < self.cards else libpulse.NULL_ID
+        device.sample_spec = libpulse.sample_spec(3, 48000, 2)
+        device.channel_map.channels = 2
+        device.channel_map.map[0] = 1
+        device.channel_map.map[1] = 2
+        device.volume.channels = 2
+        device.volume.values[0] = 0x10000
+        device.volume.values[1] = 0x8000
+        device.base_volume = 0x10000
+        device.n_volume_steps = 0x10001
+        device.proplist = self._proplist({
+            b'alsa.card': str(index).encode(),
+            b'device.description': device.description,
+        })
+        device.n_ports = len(ports)
+        device.ports = self._array(port_cls, ports)
+
+        if ports:
+            device.active_port = pointer(ports[0])
+
+        return device
+
+    def _sink(self, index):
+        sink = self._device(libpulse.sink_info, libpulse.sink_port_info, index, 'output')
+        sink.monitor_source = index
+        return sink
+
+    def _source(self, index):
+        source = self._device(libpulse.source_info, libpulse.source_port_info, index, 'input')
+        source.monitor_of_sink = libpulse.NULL_ID
+        return source
+
+    def _sink_input(self, index):
+        sink_input = libpulse.sink_input_info()
+        sink_input.index = index
+        sink_input.name = f'Playback {index}'.encode()
+        sink_input.owner_module = libpulse.NULL_ID
+        sink_input.client = index
+        sink_input.sink = index % self.sinks if self.sinks else libpulse.NULL_ID
+        sink_input.sample_spec = libpulse.sample_spec(5, 44100, 2)
+        sink_input.channel_map.channels = 2
+        sink_input.channel_map.map[0] = 1
+        sink_input.channel_map.map[1] = 2
+        sink_input.volume.channels = 2
+        sink_input.volume.values[0] = 0x10000 - index
+        sink_input.volume.values[1] = 0 if index % 4 == 3 else 0x10000 - index
+        sink_input.driver = b'protocol-native.c'
+        sink_input.mute = index % 3 == 2
+        sink_input.proplist = self._proplist({
+            b'media.name': sink_input.name,
+            b'application.name': f'Browser tab {index}'.encode(),
+            b'application.process.binary': b'firefox',
+            b'application.process.id': str(1000 + index).encode(),
+            b'application.icon_name': b'firefox',
+            b'module-stream-restore.id': f'sink-input-by-application-name:Browser tab {index}'.encode(),
+        })
+        sink_input.corked = index % 2
+        sink_input.has_volume = 1
+        sink_input.volume_writable = 1
+        return sink_input
+
+    def _wait(self, until, count):
+        """
+        Holds back the `count` callbacks queued after it until the time given.
+        """
+        def run():
+            if time.monotonic() < until:
+                held = [self._queue.popleft() for _ in range(count)]
+                self._queue.extendleft(reversed(held))
+                self._queue.appendleft(run)
+                time.sleep(0.01)
+
+        return run
+
+    def _context(self, context):
+        return self._contexts[addressof(context.contents)]
+
+    def _set_state(self, context, state, errno=0):
+        data = self._context(context)
+        data['state'] = state
+        data['errno'] = errno
+        data['state_cb'](context, None)
+
+    def _deliver(self, context, callback, items):
+        def run():
+            for item in items:
+                callback(context, pointer(item), 0, None)
+            callback(context, None, 1, None)
+
+        self._queue.append(run)
+        return self._operation
+
+    def _deliver_found(self, context, callback, items):
+        """
+        Delivers the objects looked up, failing with no such entity like libpulse if there are none.
+        """
+        if items:
+            return self._deliver(context, callback, items)
+
+        def run():
+            self._context(context)['errno'] = libpulse.ERR_NOENTITY
+            callback(context, None, -1, None)
+
+        self._queue.append(run)
+        return self._operation
+
+    def _by_index(self, items, index):
+        return [item for item in items if item.index == index]
+
+    def _by_name(self, items, name):
+        return [item for item in items if item.name == name]
+
+    def mainloop_new(self):
+        return pointer(libpulse.mainloop())
+
+    def mainloop_get_api(self, mainloop):
+        return pointer(libpulse.mainloop_api())
+
+    def mainloop_set_poll_func(self, mainloop, poll_func, userdata):
+        self._poll_func = poll_func
+
+    def mainloop_poll(self, mainloop):
+        # there are no file descriptors, anything queued is due right away
+        if self._poll_func:
+            return self._poll_func((libpulse.pollfd * 1)(), 0, 0 if self._queue else -1, None)
+
+        return 0
+
+    def mainloop_dispatch(self, mainloop):
+        dispatched = len(self._queue)
+
+        for _ in range(dispatched):
+            self._queue.popleft()()
+
+        return dispatched
+
+    def operation_get_state(self, operation):
+        # everything queued is dispatched by the next iteration, nothing is left to cancel
+        return libpulse.OPERATION_DONE
+
+    def threaded_mainloop_new(self):
+        return self.mainloop_new()
+
+    def threaded_mainloop_start(self, mainloop):
+        def run():
+            while self._running:
+                with self._thread_lock:
+                    dispatched = self.mainloop_dispatch(mainloop)
+
+                if not dispatched:
+                    time.sleep(0.0005)
+
+        self._running = True
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return 0
+
+    def threaded_mainloop_stop(self, mainloop):
+        self._running = False
+        self._thread.join()
+
+    def threaded_mainloop_lock(self, mainloop):
+        self._thread_lock.acquire()
+
+    def threaded_mainloop_unlock(self, mainloop):
+        self._thread_lock.release()
+
+    def threaded_mainloop_in_thread(self, mainloop):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    threaded_mainloop_get_api = mainloop_get_api
+
+    def context_new(self, api, name):
+        context = pointer(libpulse.context())
+        self._contexts[addressof(context.contents)] = {
+            'state': libpulse.CONTEXT_UNCONNECTED,
+            'state_cb': None,
+            'errno': 0,
+        }
+        return context
+
+    def context_set_state_callback(self, context, callback, userdata):
+        self._context(context)['state_cb'] = callback
+
+    def context_connect(self, context, server, flags, api):
+        server = server.decode('utf8') if server else None
+
+        if server in self.refused or server in self.silent:
+            self._queue.append(lambda: self._set_state(context, libpulse.CONTEXT_CONNECTING))
+
+            if server in self.refused:
+                self._queue.append(lambda: self._set_state(context, libpulse.CONTEXT_FAILED,
+                                                           libpulse.ERR_CONNECTIONREFUSED))
+            return 0
+
+        # connecting, authorizing and setting the name take a round trip each
+        states = [libpulse.CONTEXT_CONNECTING, libpulse.CONTEXT_AUTHORIZING, libpulse.CONTEXT_SETTING_NAME]
+
+        for state in states[:max(0, self.connect_iterations - 1)]:
+            self._queue.append(lambda state=state: self._set_state(context, state))
+
+        self._queue.append(lambda: self._set_state(context, libpulse.CONTEXT_READY))
+
+        if self.connect_delay:
+            self._queue.appendleft(self._wait(time.monotonic() + self.connect_delay, len(self._queue)))
+        return 0
+
+    def context_disconnect(self, context):
+        self._context(context)['state'] = libpulse.CONTEXT_TERMINATED
+
+    def context_get_state(self, context):
+        return self._context(context)['state']
+
+    def context_set_subscribe_callback(self, context, callback, userdata):
+        self._subscribe_cb = callback
+
+    def context_subscribe(self, context, mask, callback, userdata):
+        self._queue.append(lambda: callback(context, 1, None))
+        return self._operation
+
+    def context_get_server_info(self, context, callback, userdata):
+        self._queue.append(lambda: callback(context, pointer(self._server_info), None))
+        return self._operation
+
+    def context_get_card_info_list(self, context, callback, userdata):
+        return self._deliver(context, callback, self.card_infos)
+
+    def context_get_card_info_by_index(self, context, index, callback, userdata):
+        return self._deliver_found(context, callback, self._by_index(self.card_infos, index))
+
+    def context_get_card_info_by_name(self, context, name, callback, userdata):
+        return self._deliver_found(context, callback, self._by_name(self.card_infos, name))
+
+    def context_get_sink_info_list(self, context, callback, userdata):
+        return self._deliver(context, callback, self.sink_infos)
+
+    def context_get_sink_info_by_index(self, context, index, callback, userdata):
+        return self._deliver_found(context, callback, self._by_index(self.sink_infos, index))
+
+    def context_get_sink_info_by_name(self, context, name, callback, userdata):
+        return self._deliver_found(context, callback, self._by_name(self.sink_infos, name))
+
+    def context_get_source_info_list(self, context, callback, userdata):
+        return self._deliver(context, callback, self.source_infos)
+
+    def context_get_source_info_by_index(self, context, index, callback, userdata):
+        return self._deliver_found(context, callback, self._by_index(self.source_infos, index))
+
+    def context_get_source_info_by_name(self, context, name, callback, userdata):
+        return self._deliver_found(context, callback, self._by_name(self.source_infos, name))
+
+    def context_get_sink_input_info(self, context, index, callback, userdata):
+        return self._deliver_found(context, callback, self._by_index(self.sink_input_infos, index))
+
+    def context_get_sink_input_info_list(self, context, callback, userdata):
+        return self._deliver(context, callback, self.sink_input_infos)
+
+    def context_errno(self, context):
+        return self._context(context)['errno']
+
+    def strerror(self, errno):
+        messages = {libpulse.ERR_NOENTITY: b'No such entity', libpulse.ERR_CONNECTIONREFUSED: b'Connection refused'}
+        return messages.get(errno)
+
+    def _write(self, context, callback, items, change):
+        """
+        Queues the answer to a write, applying `change` to the first of `items`, failing if there's none.
+        """
+        def run():
+            self._context(context)['errno'] = 0 if items else libpulse.ERR_NOENTITY
+
+            if items:
+                change(items[0])
+
+            callback(context, 1 if items else 0, None)
+
+        self._queue.append(run)
+        return self._operation
+
+    def _set_profile(self, card, name):
+        for i in range(card.n_profiles):
+            if card.profiles2[i].contents.name == name:
+                card.active_profile2 = card.profiles2[i]
+                card.active_profile = cast(card.profiles2[i], POINTER(libpulse.card_profile_info))
+
+    def _set_port(self, sink, name):
+        for i in range(sink.n_ports):
+            if sink.ports[i].contents.name == name:
+                sink.active_port = sink.ports[i]
+
+    def context_set_card_profile_by_index(self, context, index, profile, callback, userdata):
+        return self._write(context, callback, self._by_index(self.card_infos, index),
+                           lambda card: self._set_profile(card, profile))
+
+    def context_set_card_profile_by_name(self, context, name, profile, callback, userdata):
+        return self._write(context, callback, self._by_name(self.card_infos, name),
+                           lambda card: self._set_profile(card, profile))
+
+    def context_set_sink_port_by_index(self, context, index, port, callback, userdata):
+        return self._write(context, callback, self._by_index(self.sink_infos, index),
+                           lambda sink: self._set_port(sink, port))
+
+    def context_set_sink_port_by_name(self, context, name, port, callback, userdata):
+        return self._write(context, callback, self._by_name(self.sink_infos, name),
+                           lambda sink: self._set_port(sink, port))
+
+    def context_set_default_sink(self, context, name, callback, userdata):
+        def change(sink):
+            self._server_info.default_sink_name = sink.name
+
+        return self._write(context, callback, self._by_name(self.sink_infos, name), change)
+
+    def feed(self, peaks):
+        """
+        Queues a fragment of `peaks` for every record stream connected, as read callbacks would be
+        called by the mainloop.
+        """
+        for stream in self._streams.values():
+            if stream['state'] == libpulse.STREAM_READY:
+                stream['fragments'].append(array('f', peaks).tobytes())
+                self._queue.append(lambda stream=stream: stream['read_cb'](stream['pointer'], 0, None))
+
+    def _stream(self, stream):
+        return self._streams[addressof(stream.contents)]
+
+    def stream_new(self, context, name, spec, channel_map):
+        stream = pointer(libpulse.stream())
+        self._streams[addressof(stream.contents)] = {
+            'pointer': stream,
+            'state': libpulse.STREAM_UNCONNECTED,
+            'fragments': deque(),
+            'peeked': None,
+            'read_cb': None,
+            'state_cb': None,
+        }
+        return stream
+
+    def stream_set_read_callback(self, stream, callback, userdata):
+        self._stream(stream)['read_cb'] = callback
+
+    def stream_set_state_callback(self, stream, callback, userdata):
+        self._stream(stream)['state_cb'] = callback
+
+    def stream_connect_record(self, stream, device, attr, flags):
+        data = self._stream(stream)
+
+        def ready():
+            data['state'] = libpulse.STREAM_READY
+            data['state_cb'](stream, None)
+
+        self._queue.append(ready)
+        return 0
+
+    def stream_get_state(self, stream):
+        return self._stream(stream)['state']
+
+    def stream_peek(self, stream, data, nbytes):
+        stream = self._stream(stream)
+
+        if not stream['fragments']:
+            data._obj.value = None
+            nbytes._obj.value = 0
+            return 0
+
+        # the fragment has to stay around until it's dropped
+        stream['peeked'] = stream['fragments'][0]
+        data._obj.value = cast(stream['peeked'], c_void_p).value
+        nbytes._obj.value = len(stream['peeked'])
+        return 0
+
+    def stream_drop(self, stream):
+        self._stream(stream)['fragments'].popleft()
+        return 0
+
+    def stream_disconnect(self, stream):
+        self._stream(stream)['state'] = libpulse.STREAM_TERMINATED
+        return 0
+
+    def stream_unref(self, stream):
+        self._streams.pop(addressof(stream.contents), None)
+
+    def proplist_iterate(self, proplist, state):
+        # state is passed by reference, holding the position of the next key
+        state = state._obj
+        keys = self._proplist_keys.get(cast(proplist, c_void_p).value, [])
+        position = state.value or 0
+
+        if position >= len(keys):
+            return None
+
+        state.value = position + 1
+        return keys[position]
+
+    def proplist_gets(self, proplist, key):
+        return self._proplists.get(cast(proplist, c_void_p).value, {}).get(key)
+
+    def proplist_to_string(self, proplist):
+        properties = self._proplists.get(cast(proplist, c_void_p).value, {})
+        return b'\n'.join(key + b' = "' + value + b'"' for key, value in properties.items())
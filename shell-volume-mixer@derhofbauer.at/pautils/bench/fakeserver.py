@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Stand-in for a PulseAudio server speaking the native protocol on a Unix socket, answering from the
+# objects synthesized by FakePulse.
+#
+# Usage: fakeserver.py --socket PATH [--cards N] [--profiles N] [--ports N] [--version N]
+#
+# Then e.g. `PULSE_SERVER=unix:PATH query.py --native all`.
+
+import argparse
+import os
+import socketserver
+import struct
+import threading
+from ctypes import c_void_p, cast
+
+from fakepulse import FakePulse
+
+from lib import libpulse
+from lib import native
+from lib import structs
+from lib import tagstruct
+
+_header = struct.Struct('!IIIII')
+
+
+class FakeServer:
+    """
+    Serves the cards, sinks and sources of a FakePulse, encoded for the protocol version agreed on.
+    """
+
+    def __init__(self, fake, path, version=native.PROTOCOL_VERSION):
+        self.fake = fake
+        self.path = path
+        self.version = version
+
+        self._commands = {
+            native.COMMAND_AUTH: self._auth,
+            native.COMMAND_SET_CLIENT_NAME: self._client_name,
+            native.COMMAND_GET_SERVER_INFO: self._server_info,
+            native.COMMAND_GET_CARD_INFO: _lookup(self._card, fake.card_infos),
+            native.COMMAND_GET_CARD_INFO_LIST: _list_all(self._card, fake.card_infos),
+            native.COMMAND_GET_SINK_INFO: _lookup(self._sink, fake.sink_infos),
+            native.COMMAND_GET_SINK_INFO_LIST: _list_all(self._sink, fake.sink_infos),
+            native.COMMAND_GET_SOURCE_INFO: _lookup(self._source, fake.source_infos),
+            native.COMMAND_GET_SOURCE_INFO_LIST: _list_all(self._source, fake.source_infos),
+            native.COMMAND_GET_SINK_INPUT_INFO: _lookup(self._sink_input, fake.sink_input_infos, names=False),
+            native.COMMAND_GET_SINK_INPUT_INFO_LIST: _list_all(self._sink_input, fake.sink_input_infos),
+        }
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_client(self.rfile, self.wfile)
+
+        self._server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self._server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        os.unlink(self.path)
+
+    def serve_client(self, infile, outfile):
+        client = {'version': self.version}
+
+        while True:
+            header = infile.read(_header.size)
+
+            if len(header) < _header.size:
+                return
+
+            length = _header.unpack(header)[0]
+            reader = tagstruct.Reader(infile.read(length))
+            command = reader.u32()
+            tag = reader.u32()
+
+            try:
+                reply = self._commands[command](client, reader)
+                packet = bytes(tagstruct.Writer().u32(native.COMMAND_REPLY).u32(tag)) + bytes(reply)
+            except LookupError:
+                packet = bytes(tagstruct.Writer().u32(native.COMMAND_ERROR).u32(tag).u32(libpulse.ERR_NOENTITY))
+
+            outfile.write(_header.pack(len(packet), native.CONTROL_CHANNEL, 0, 0, 0) + packet)
+            outfile.flush()
+
+    def _properties(self, pa_proplist):
+        return self.fake._proplists.get(cast(pa_proplist, c_void_p).value, {})
+
+    def _auth(self, client, reader):
+        client['version'] = min(reader.u32() & native.PROTOCOL_VERSION_MASK, self.version)
+        reader.arbitrary()
+        return tagstruct.Writer().u32(self.version)
+
+    def _client_name(self, client, reader):
+        reader.proplist()
+        return tagstruct.Writer().u32(1)
+
+    def _server_info(self, client, reader):
+        info = self.fake._server_info
+        writer = tagstruct.Writer()
+        writer.string(info.server_name).string(info.server_version).string(info.user_name).string(info.host_name)
+        writer.sample_spec(3, 2, 48000).string(info.default_sink_name).string(None).u32(info.cookie)
+
+        if client['version'] >= 15:
+            writer.channel_map([1, 2])
+
+        return writer
+
+    def _card(self, client, writer, card):
+        version = client['version']
+        profiles = structs.items(card.profiles2, card.n_profiles, libpulse.card_profile_info2)
+        ports = structs.items(card.ports, card.n_ports, libpulse.card_port_info)
+
+        writer.u32(card.index).string(card.name).u32(libpulse.NULL_ID).string(card.driver).u32(len(profiles))
+
+        for profile in profiles:
+            writer.string(profile.name).string(profile.description)
+            writer.u32(profile.n_sinks).u32(profile.n_sources).u32(profile.priority)
+
+            if version >= 29:
+                writer.u32(profile.available)
+
+        active_profile = card.active_profile2[0].name if card.active_profile2 else None
+        writer.string(active_profile).proplist(self._properties(card.proplist))
+
+        if version < 26:
+            return
+
+        writer.u32(len(ports))
+
+        for port in ports:
+            writer.string(port.name).string(port.description).u32(port.priority).u32(port.available)
+            writer.u8(port.direction).proplist({}).u32(0)
+
+            if version >= 27:
+                writer.s64(0)
+
+            if version >= 34:
+                writer.string(None).u32(0)
+
+    def _device(self, client, writer, device, monitor, port_cls):
+        version = client['version']
+        ports = structs.items(device.ports, device.n_ports, port_cls)
+
+        writer.u32(device.index).string(device.name).string(device.description)
+        writer.sample_spec(device.sample_spec.format, device.sample_spec.channels, device.sample_spec.rate)
+        writer.channel_map(device.channel_map.map[:device.channel_map.channels]).u32(libpulse.NULL_ID)
+        writer.cvolume(device.volume.values[:device.volume.channels]).boolean(False)
+        writer.u32(monitor).string(None).usec(0).string(device.driver).u32(0)
+        writer.proplist(self._properties(device.proplist)).usec(0)
+
+        if version >= 15:
+            writer.volume(device.base_volume).u32(0).u32(device.n_volume_steps).u32(device.card)
+
+        if version >= 16:
+            writer.u32(len(ports))
+
+            for port in ports:
+                writer.string(port.name).string(port.description).u32(port.priority)
+
+                if version >= 24:
+                    writer.u32(port.available)
+
+                if version >= 34:
+                    writer.string(None).u32(port.type)
+
+            writer.string(device.active_port[0].name if device.active_port else None)
+
+        if version >= 21:
+            writer.u8(1).format_info(1, {})
+
+    def _sink(self, client, writer, sink):
+        self._device(client, writer, sink, sink.monitor_source, libpulse.sink_port_info)
+
+    def _source(self, client, writer, source):
+        self._device(client, writer, source, source.monitor_of_sink, libpulse.source_port_info)
+
+    def _sink_input(self, client, writer, sink_input):
+        version = client['version']
+        spec = sink_input.sample_spec
+        channel_map = sink_input.channel_map
+        volume = sink_input.volume
+
+        writer.u32(sink_input.index).string(sink_input.name).u32(sink_input.owner_module).u32(sink_input.client)
+        writer.u32(sink_input.sink).sample_spec(spec.format, spec.channels, spec.rate)
+        writer.channel_map(channel_map.map[:channel_map.channels]).cvolume(volume.values[:volume.channels])
+        writer.usec(0).usec(0).string(None).string(sink_input.driver)
+
+        if version >= 11:
+            writer.boolean(sink_input.mute)
+
+        if version >= 13:
+            writer.proplist(self._properties(sink_input.proplist))
+
+        if version >= 19:
+            writer.boolean(sink_input.corked)
+
+        if version >= 20:
+            writer.boolean(sink_input.has_volume).boolean(sink_input.volume_writable)
+
+        if version >= 21:
+            writer.format_info(1, {})
+
+
+def _lookup(encode, infos, names=True):
+    def lookup(client, reader):
+        index = reader.u32()
+        name = reader.string() if names else None
+
+        for info in infos:
+            if info.index == index or (name is not None and info.name.decode('utf8') == name):
+                writer = tagstruct.Writer()
+                encode(client, writer, info)
+                return writer
+
+        raise LookupError(index if name is None else name)
+
+    return lookup
+
+
+def _list_all(encode, infos):
+    # objects don't change, each list is only encoded once per protocol version
+    encoded = {}
+
+    def list_all(client, reader):
+        if client['version'] not in encoded:
+            writer = tagstruct.Writer()
+
+            for info in infos:
+                encode(client, writer, info)
+
+            encoded[client['version']] = bytes(writer)
+
+        return encoded[client['version']]
+
+    return list_all
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', required=True)
+    parser.add_argument('--cards', type=int, default=3)
+    parser.add_argument('--profiles', type=int, default=4)
+    parser.add_argument('--ports', type=int, default=2)
+    parser.add_argument('--version', type=int, default=native.PROTOCOL_VERSION, help='protocol version spoken')
+    args = parser.parse_args()
+
+    server = FakeServer(FakePulse(args.cards, args.profiles, args.ports), args.socket, args.version)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
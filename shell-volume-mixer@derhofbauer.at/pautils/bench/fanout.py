@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Checks that query.py merges the results of several --server, against a fake libpulse, no audio
+# server needed.
+#
+# Usage: fanout.py [--connect-timeout seconds]
+#
+# One server answers, one refuses connections and one never gets past connecting. The answer is
+# expected to be the same as that of a single server, the others failing with their own error, all
+# of them queried in about as long as the connect timeout.
+
+import argparse
+import io
+import json
+import os
+import runpy
+import sys
+from contextlib import redirect_stdout
+from time import monotonic
+
+from fakepulse import FakePulse
+
+QUERY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query.py')
+
+
+def query(*args):
+    """
+    Runs query.py with the arguments given, returning its output and how long it took.
+    """
+    sys.argv = [QUERY_PATH, *args]
+    output = io.StringIO()
+    started = monotonic()
+
+    with redirect_stdout(output):
+        try:
+            runpy.run_path(QUERY_PATH, run_name='__main__')
+        except SystemExit:
+            pass
+
+    return json.loads(output.getvalue()), monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connect-timeout', type=float, default=0.5)
+    args = parser.parse_args()
+
+    FakePulse(refused=['refused'], silent=['silent']).install()
+
+    timeouts = ['--connect-timeout', str(args.connect_timeout)]
+    expected, _ = query('cards', '--server', 'healthy', *timeouts)
+    result, took = query('cards', '--server', 'healthy', '--server', 'refused', '--server', 'silent', *timeouts)
+
+    checks = {
+        'healthy': result.get('healthy') == expected,
+        'refused': result.get('refused', {}).get('code') == 'no_server',
+        'silent': result.get('silent', {}).get('code') == 'timeout',
+    }
+
+    for server, success in checks.items():
+        outcome = result.get(server, {})
+        print(f'  {server:8} {"ok" if success else "wrong":5} {outcome.get("error", f"{len(outcome)} cards")}')
+
+    print(f'  all servers queried in {took:.2f}s')
+
+    if not all(checks.values()) or took > args.connect_timeout * 2:
+        print('Each server should have its own result, the healthy one the same as queried on its own')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
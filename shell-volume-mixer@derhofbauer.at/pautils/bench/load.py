@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the hot paths of pautils against a fake libpulse, no audio server needed.
+#
+# Usage: load.py [--cards N] [--profiles N] [--ports N] [--sinks N] [--fields keys]
+#                [--properties prefixes] [-n RUNS] [--json]
+#
+# Reports time to connect, callback decode throughput of each decoder, JSON serialization time and
+# peak memory, with the whole result serialized at once and with objects streamed as they're decoded.
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import tracemalloc
+from time import perf_counter
+
+from fakepulse import FakePulse
+
+from lib import fields
+from lib import snapshot
+from lib import stream
+from lib.connection import Connection
+
+TYPES = ('cards', 'sinks')
+
+
+def measure(runs, function):
+    times = []
+    result = None
+
+    for _ in range(runs):
+        start = perf_counter()
+        result = function()
+        times.append(perf_counter() - start)
+
+    return statistics.median(times), min(times), result
+
+
+def bench_connect(runs):
+    def connect():
+        with Connection() as connection:
+            connection.run(lambda: None, lambda: True)
+
+    median, best, _ = measure(runs, connect)
+    return {'median': median, 'min': best}
+
+
+def bench_decode(fake, op_type, runs, projection=None, properties=None):
+    infos = fake.card_infos if op_type == 'cards' else fake.sink_infos
+    count = len(infos)
+    cls = snapshot.load(op_type)
+
+    with Connection() as connection:
+        query = cls(connection, fields=projection, properties=properties)
+
+        # through the mainloop and the callback, as a query would
+        median, best, data = measure(runs, lambda: query.get_batch(None))
+
+        if len(data) != count:
+            raise RuntimeError(f'Expected {count} {op_type}, got {len(data)}')
+
+        # cb_data alone
+        cb_median, cb_best, _ = measure(runs, lambda: [query.cb_data(info) for info in infos])
+
+    json_median, json_best, encoded = measure(runs, lambda: json.dumps(data))
+
+    return {
+        'objects': count,
+        'callback_objects_per_s': count / median if median else None,
+        'cb_data_objects_per_s': count / cb_median if cb_median else None,
+        'query': {'median': median, 'min': best},
+        'cb_data': {'median': cb_median, 'min': cb_best},
+        'json': {'median': json_median, 'min': json_best, 'bytes': len(encoded)},
+    }
+
+
+def bench_memory():
+    tracemalloc.start()
+
+    with Connection() as connection:
+        queries = {op_type: snapshot.load(op_type)(connection) for op_type in TYPES}
+        result = snapshot.get_info(connection, queries)
+        json.dumps(result)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'traced_peak_bytes': peak,
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def bench_stream():
+    tracemalloc.start()
+
+    with open(os.devnull, 'w') as outfile, Connection() as connection:
+        writer = stream.Writer(outfile, compact=True)
+        queries = {op_type: snapshot.load(op_type)(connection) for op_type in TYPES}
+
+        for op_type, query in queries.items():
+            writer.attach(op_type, query)
+
+        writer.end(snapshot.get_info(connection, queries))
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'traced_peak_bytes': peak}
+
+
+def print_report(config, report):
+    print(f'{config["cards"]} cards with {config["profiles"]} profiles and {config["ports"]} ports each, '
+          f'{config["sinks"]} sinks, fields {config["fields"] or "all"}, {config["runs"]} runs')
+    print(f'  connect           median {report["connect"]["median"] * 1000:9.3f}ms  '
+          f'min {report["connect"]["min"] * 1000:9.3f}ms')
+
+    for op_type in TYPES:
+        result = report[op_type]
+        print(f'  {op_type}')
+        print(f'    query           median {result["query"]["median"] * 1000:9.3f}ms  '
+              f'{result["callback_objects_per_s"]:12.0f} objects/s')
+        print(f'    cb_data         median {result["cb_data"]["median"] * 1000:9.3f}ms  '
+              f'{result["cb_data_objects_per_s"]:12.0f} objects/s')
+        print(f'    json            median {result["json"]["median"] * 1000:9.3f}ms  '
+              f'{result["json"]["bytes"]:12d} bytes')
+
+    print(f'  peak memory       traced {report["memory"]["traced_peak_bytes"] / 1024:9.1f}KiB  '
+          f'max rss {report["memory"]["max_rss_bytes"] / 1024 / 1024:.1f}MiB')
+    print(f'  streamed          traced {report["stream"]["traced_peak_bytes"] / 1024:9.1f}KiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=32)
+    parser.add_argument('--profiles', type=int, default=20)
+    parser.add_argument('--ports', type=int, default=8)
+    parser.add_argument('--sinks', type=int, default=None)
+    parser.add_argument('--fields', help='only decode the keys listed, as query.py --fields')
+    parser.add_argument('--properties', help='prefixes of properties to output, as query.py --properties')
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    fake = FakePulse(args.cards, args.profiles, args.ports, args.sinks)
+    fake.install()
+
+    config = {
+        'cards': fake.cards,
+        'profiles': fake.profiles,
+        'ports': fake.ports,
+        'sinks': fake.sinks,
+        'fields': args.fields,
+        'properties': args.properties,
+        'runs': args.runs,
+    }
+
+    report = {
+        'connect': bench_connect(args.runs),
+        'memory': bench_memory(),
+        'stream': bench_stream(),
+    }
+
+    for op_type in TYPES:
+        report[op_type] = bench_decode(fake, op_type, args.runs, fields.parse(args.fields),
+                                       (args.properties or '').split(',') if args.properties else None)
+
+    if args.json:
+        print(json.dumps({'config': config, 'report': report}, indent=4))
+    else:
+        print_report(config, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the CPU time metering peaks of more and more sinks takes against a fake libpulse, no audio
+# server needed.
+#
+# Usage: meter.py [--sinks N,N,...] [--lines N] [--json]
+#
+# Every line written, each stream receives a fragment of peaks, which are dispatched and reduced
+# before the line is written, as if `query.py meter` ran for the number of lines given.
+
+import argparse
+import io
+import json
+from time import process_time
+
+from fakepulse import FakePulse
+
+from lib.connection import Connection
+from lib.meter import Meter
+
+
+def bench(sinks, lines):
+    fake = FakePulse(cards=sinks, sinks=sinks, sources=0)
+    fake.install()
+
+    peaks = [0.25 * (i % 4) for i in range(Meter.samples_per_line)]
+    outfile = io.StringIO()
+
+    with Connection() as connection:
+        meter = Meter(outfile, list(range(sinks)))
+        meter._connection = connection
+
+        if not meter.open():
+            raise RuntimeError(outfile.getvalue())
+
+        connection.flush()
+        started = process_time()
+
+        for _ in range(lines):
+            fake.feed(peaks)
+            connection.flush()
+            meter.emit()
+
+        elapsed = process_time() - started
+        meter.close()
+
+    last = json.loads(outfile.getvalue().splitlines()[-1])
+
+    if len(last['peaks']) != sinks or max(last['peaks'].values()) != max(peaks):
+        raise RuntimeError(f'Unexpected peaks {last}')
+
+    return {
+        'line_us': elapsed / lines * 1000000,
+        'sink_line_us': elapsed / lines / sinks * 1000000,
+        'cpu_at_rate': elapsed / lines * Meter.rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sinks', default='1,4,16,64')
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    report = {sinks: bench(int(sinks), args.lines) for sinks in args.sinks.split(',')}
+
+    if args.json:
+        print(json.dumps({'config': vars(args), 'report': report}, indent=4))
+        return
+
+    for sinks, result in report.items():
+        print(f'{sinks:>4} sinks: {result["line_us"]:8.1f}us per line, {result["sink_line_us"]:6.1f}us per sink, '
+              f'{result["cpu_at_rate"] * 100:.3f}% CPU at {Meter.rate} lines/s')
+
+
+if __name__ == '__main__':
+    main()
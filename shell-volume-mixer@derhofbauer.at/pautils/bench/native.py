@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the native protocol backend against the stand-in server of fakeserver.py, no audio server
+# needed.
+#
+# Usage: native.py [--cards N] [--profiles N] [--ports N] [--version N] [-n RUNS] [--json]
+#
+# Reports time to connect and authorize, decode throughput of each type, and all types queried one
+# after another compared to pipelined on one socket. The output is checked to be the same as that of
+# the libpulse decoders for the same objects.
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+from time import perf_counter
+
+from fakepulse import FakePulse
+from fakeserver import FakeServer
+
+from lib import native
+from lib import snapshot
+from lib.connection import Connection
+from lib.native import NativeConnection
+
+
+def measure(runs, function):
+    times = []
+
+    for _ in range(runs):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return {'median': statistics.median(times), 'min': min(times)}
+
+
+def check(path):
+    with Connection() as connection:
+        expected = snapshot.get_info(connection, {op_type: snapshot.load(op_type)(connection)
+                                                  for op_type in snapshot.TYPES})
+
+    with NativeConnection(path=path) as connection:
+        result = snapshot.get_info(connection, {op_type: snapshot.load(op_type, True)(connection)
+                                                for op_type in snapshot.TYPES})
+
+    if json.dumps(result) != json.dumps(expected):
+        raise RuntimeError('Output differs from the libpulse decoders')
+
+
+def bench(fake, path, runs):
+    def connect():
+        with NativeConnection(path=path) as connection:
+            connection.run(lambda: None, lambda: True)
+
+    report = {'connect': measure(runs, connect)}
+
+    with NativeConnection(path=path) as connection:
+        for op_type, infos in (('cards', fake.card_infos), ('sinks', fake.sink_infos),
+                               ('sources', fake.source_infos), ('sink_inputs', fake.sink_input_infos)):
+            query = snapshot.load(op_type, True)(connection)
+            result = measure(runs, lambda: query.get_batch(None))
+            result['objects_per_s'] = len(infos) / result['median']
+            report[op_type] = result
+
+        queries = {op_type: snapshot.load(op_type, True)(connection) for op_type in snapshot.TYPES}
+
+        report['sequential'] = measure(runs, lambda: [query.get_batch(None) for query in queries.values()])
+        report['pipelined'] = measure(runs, lambda: snapshot.get_info(connection, queries))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=32)
+    parser.add_argument('--profiles', type=int, default=20)
+    parser.add_argument('--ports', type=int, default=8)
+    parser.add_argument('--version', type=int, default=native.PROTOCOL_VERSION, help='protocol version spoken')
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    fake = FakePulse(args.cards, args.profiles, args.ports)
+    fake.install()
+
+    path = os.path.join(tempfile.mkdtemp(), 'native')
+    server = FakeServer(fake, path, args.version).start()
+
+    try:
+        if args.version >= 34:
+            check(path)
+
+        report = bench(fake, path, args.runs)
+    finally:
+        server.close()
+        os.rmdir(os.path.dirname(path))
+
+    if args.json:
+        print(json.dumps({'config': vars(args), 'report': report}, indent=4))
+        return
+
+    print(f'{args.cards} cards with {args.profiles} profiles and {args.ports} ports each, '
+          f'protocol version {args.version}, {args.runs} runs')
+    print(f'  connect     median {report["connect"]["median"] * 1000:9.3f}ms  '
+          f'min {report["connect"]["min"] * 1000:9.3f}ms')
+
+    for op_type in snapshot.TYPES:
+        print(f'  {op_type:11} median {report[op_type]["median"] * 1000:9.3f}ms  '
+              f'{report[op_type]["objects_per_s"]:12.0f} objects/s')
+
+    for mode in ('sequential', 'pipelined'):
+        print(f'  {mode:11} median {report[mode]["median"] * 1000:9.3f}ms  (all types)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the startup cost paid on every invocation of query.py.
+#
+# Usage: startup.py [-n RUNS] [--top N] [query.py arguments, default: cards]
+#
+# Reports time to the first byte of output and to exit, and the slowest imports as reported by
+# `python -X importtime`.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+QUERY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query.py')
+
+
+def run_once(args):
+    with tempfile.TemporaryFile() as stderr:
+        start = perf_counter()
+        process = subprocess.Popen([sys.executable, '-X', 'importtime', QUERY] + args,
+                                   stdout=subprocess.PIPE, stderr=stderr)
+
+        process.stdout.read(1)
+        first_byte = perf_counter() - start
+
+        process.stdout.read()
+        process.wait()
+        total = perf_counter() - start
+
+        stderr.seek(0)
+        imports = parse_importtime(stderr.read().decode('utf8', 'replace'))
+
+    return first_byte, total, imports
+
+
+def parse_importtime(output):
+    imports = {}
+
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[len('import time:'):].split('|')
+
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+
+        imports[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('args', nargs='*', default=['cards'])
+    args = parser.parse_args()
+
+    first_bytes = []
+    totals = []
+    imports = {}
+
+    for _ in range(args.runs):
+        first_byte, total, run_imports = run_once(args.args)
+        first_bytes.append(first_byte)
+        totals.append(total)
+
+        for name, (self_us, cumulative_us) in run_imports.items():
+            imports.setdefault(name, []).append((self_us, cumulative_us))
+
+    print(f'query.py {" ".join(args.args)}, {args.runs} runs')
+    print(f'  first byte  median {statistics.median(first_bytes) * 1000:8.2f}ms  '
+          f'min {min(first_bytes) * 1000:8.2f}ms')
+    print(f'  total       median {statistics.median(totals) * 1000:8.2f}ms  '
+          f'min {min(totals) * 1000:8.2f}ms')
+
+    cumulative = {name: statistics.median(c for _, c in times) for name, times in imports.items()}
+    own = {name: statistics.median(s for s, _ in times) for name, times in imports.items()}
+
+    print(f'\n  {"cumulative":>12} {"self":>10}  import (median, us)')
+    for name in sorted(cumulative, key=cumulative.get, reverse=True)[:args.top]:
+        print(f'  {cumulative[name]:12.0f} {own[name]:10.0f}  {name}')
+
+
+if __name__ == '__main__':
+    main()
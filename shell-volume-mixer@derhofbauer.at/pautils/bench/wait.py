@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Checks that waiting for the server outlasts the default connect timeout, against a fake libpulse
+# and the stand-in server of fakeserver.py, no audio server needed.
+#
+# Usage: wait.py [--delay seconds]
+#
+# The server shows up `--delay` seconds after connecting started. Cards are queried with and without
+# CONTEXT_NOFAIL, through libpulse and the native backend. Only queries waiting for the server are
+# expected to succeed.
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from time import monotonic
+
+from fakepulse import FakePulse
+from fakeserver import FakeServer
+
+from lib import libpulse
+from lib import snapshot
+from lib.connection import Connection
+from lib.native import NativeConnection
+
+
+def query(connection):
+    started = monotonic()
+
+    with connection:
+        result = snapshot.load('cards', isinstance(connection, NativeConnection))(connection).get_batch(None)
+
+    return 'success' not in result, monotonic() - started
+
+
+def native(fake, delay, flags):
+    path = os.path.join(tempfile.mkdtemp(), 'native')
+    servers = []
+
+    def start():
+        servers.append(FakeServer(fake, path).start())
+
+    timer = threading.Timer(delay, start)
+    timer.start()
+
+    try:
+        return query(NativeConnection(timeout=delay * 3, flags=flags, path=path))
+    finally:
+        timer.join()
+        servers[0].close()
+        os.rmdir(os.path.dirname(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delay', type=float, default=1.5)
+    args = parser.parse_args()
+
+    fake = FakePulse(connect_delay=args.delay)
+    fake.install()
+
+    failed = False
+
+    for flags, expected in ((libpulse.CONTEXT_NOFLAGS, False), (libpulse.CONTEXT_NOFAIL, True)):
+        for backend in ('libpulse', 'native'):
+            if backend == 'native':
+                success, took = native(fake, args.delay, flags)
+            else:
+                success, took = query(Connection(timeout=args.delay * 3, flags=flags))
+
+            mode = 'waiting' if flags & libpulse.CONTEXT_NOFAIL else 'not waiting'
+            print(f'  {backend:8} {mode:11} {"succeeded" if success else "failed":9} after {took:.2f}s')
+            failed |= success != expected
+
+    if failed:
+        print(f'Only queries waiting for the server should have succeeded after {args.delay}s')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from ctypes import CDLL, POINTER, c_int, c_ulong
+from time import monotonic
+
+from . import log
+from . import libpulse
+from .cards import Cards
+from .connection import Connection
+from .pulseaudio import Request
+from .sink_inputs import SinkInputs
+from .sinks import Sinks
+from .sources import Sources
+
+_libc = None
+
+
+def _poll(ufds, nfds):
+    global _libc
+
+    if _libc is None:
+        _libc = CDLL(None, use_errno=True)
+        _libc.poll.restype = c_int
+        _libc.poll.argtypes = [POINTER(libpulse.pollfd), c_ulong, c_int]
+
+    return _libc.poll(ufds, nfds, 0)
+
+
+class _Waiter:
+    def __init__(self, start, done, future):
+        self.start = start
+        self.done = done
+        self.future = future
+        self.started = False
+
+
+class AsyncConnection(Connection):
+    """
+    Connection driven by an asyncio event loop, instead of blocking in the mainloop.
+
+    libpulse never polls by itself. The file descriptors and timeout it would have polled for are
+    handed to the event loop, the mainloop is only dispatched once one of them is ready.
+    """
+
+    def __init__(self, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS):
+        super().__init__(timeout, connect_timeout, flags)
+
+        self._pollfds = []
+        self._poll_timeout = -1
+        self._waiters = []
+        self._wakeup = None
+        self._watched = None
+        self._pump_task = None
+
+        self._poll_func = libpulse.poll_func_t(self._poll)
+        libpulse.mainloop_set_poll_func(self._pa_mainloop, self._poll_func, None)
+
+    async def __aenter__(self):
+        self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        super().connect()
+        self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+
+    def close(self):
+        if self._pump_task:
+            self._pump_task.cancel()
+            self._pump_task = None
+
+        # file descriptors are closed along with the context, stop watching them right away
+        self._unwatch()
+
+        for waiter in self._waiters:
+            waiter.future.cancel()
+
+        self._waiters = []
+        super().close()
+
+    def _poll(self, ufds, nfds, timeout, userdata):
+        self._pollfds = [(ufds[i].fd, ufds[i].events) for i in range(nfds)]
+        self._poll_timeout = timeout
+
+        return _poll(ufds, nfds)
+
+    def _iterate(self):
+        # no timeout of our own, to find out when the mainloop's next timer is due
+        if libpulse.mainloop_prepare(self._pa_mainloop, -1) < 0:
+            return -1
+
+        if libpulse.mainloop_poll(self._pa_mainloop) < 0:
+            return -1
+
+        return libpulse.mainloop_dispatch(self._pa_mainloop)
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            dispatched = self._iterate()
+
+            if self._waiters:
+                self._check_connect_timeout()
+
+            started = self._check_waiters()
+
+            if dispatched < 0 or self.failed:
+                log.debug('Mainloop failed' if dispatched < 0 else 'Context failed')
+                self._fail_waiters()
+                return
+
+            if dispatched > 0 or started:
+                # let others run while there's a lot going on
+                await asyncio.sleep(0)
+                continue
+
+            await self._wait_ready(loop)
+
+    async def _wait_ready(self, loop):
+        future = loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        readers = {fd for fd, events in self._pollfds if events & (libpulse.POLLIN | libpulse.POLLPRI)}
+        writers = {fd for fd, events in self._pollfds if events & libpulse.POLLOUT}
+
+        for fd in readers:
+            loop.add_reader(fd, ready)
+
+        for fd in writers:
+            loop.add_writer(fd, ready)
+
+        timeout = self._poll_timeout / 1000 if self._poll_timeout >= 0 else None
+
+        # wake up in time to give up on a server that doesn't answer
+        if self._waiters and self.state != libpulse.CONTEXT_READY:
+            connect_timeout = max(0, self._connect_deadline() - monotonic())
+            timeout = connect_timeout if timeout is None else min(timeout, connect_timeout)
+
+        timer = loop.call_later(timeout, ready) if timeout is not None else None
+
+        self._watched = (loop, readers, writers, timer)
+        self._wakeup = ready
+
+        try:
+            await future
+        finally:
+            self._wakeup = None
+            self._unwatch()
+
+    def _unwatch(self):
+        if not self._watched:
+            return
+
+        loop, readers, writers, timer = self._watched
+        self._watched = None
+
+        for fd in readers:
+            loop.remove_reader(fd)
+
+        for fd in writers:
+            loop.remove_writer(fd)
+
+        if timer:
+            timer.cancel()
+
+    def _check_waiters(self):
+        started = False
+
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+
+            if self.state == libpulse.CONTEXT_READY and not waiter.started:
+                waiter.started = True
+                waiter.start()
+                started = True
+
+            if waiter.started and waiter.done():
+                waiter.future.set_result(True)
+                self._waiters.remove(waiter)
+
+        return started
+
+    def _fail_waiters(self):
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                waiter.future.set_result(False)
+
+        self._waiters = []
+
+    async def wait(self, start, done, timeout=None):
+        """
+        Counterpart of run() for coroutines, any number of which may wait at the same time.
+
+        `start()` is called once, as soon as the context is ready. Returns False if the context
+        failed or didn't get ready in time, see error(). Raises asyncio.TimeoutError if `done()`
+        isn't true after `timeout` seconds.
+        """
+        if self.failed or not self._pump_task:
+            return False
+
+        waiter = _Waiter(start, done, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+
+        if self._wakeup:
+            self._wakeup()
+
+        try:
+            return await asyncio.wait_for(waiter.future, self.timeout if timeout is None else timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+
+class AsyncQuery:
+    """
+    Makes a query's get_info() and get_batch() coroutines, e.g. `await AsyncCards().get_info(index=3)`.
+
+    Queries of several types can run at the same time on one AsyncConnection. Cancelling a query
+    cancels its operations.
+    """
+
+    connection_class = AsyncConnection
+
+    async def __aenter__(self):
+        if self._owns_connection:
+            self._connection.connect()
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self._owns_connection:
+            self._connection.close()
+
+    async def get_batch(self, lookups):
+        log.debug('Querying details...')
+        self._request = Request()
+
+        try:
+            if not await self._connection.wait(lambda: self.request(lookups), lambda: self.done):
+                self._request.data = self._connection.error()
+        finally:
+            self.release()
+
+        log.debug('Query done')
+
+        return self.data
+
+
+class AsyncCards(AsyncQuery, Cards):
+    pass
+
+
+class AsyncSinks(AsyncQuery, Sinks):
+    pass
+
+
+class AsyncSources(AsyncQuery, Sources):
+    pass
+
+
+class AsyncSinkInputs(AsyncQuery, SinkInputs):
+    pass
@@ -0,0 +1,114 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+
+from . import log
+
+CACHE_DIR = 'shell-volume-mixer'
+
+
+def _hash(value):
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+class Cache:
+    """
+    Remembers content hashes of the objects in the last few results handed out, by tag.
+
+    Callers passing the tag of the data they already have only get back what changed since. Tags
+    include the server's identity, a restarted server invalidates all of them.
+    """
+
+    # number of tags remembered
+    _keep = 8
+
+    def __init__(self, op_type):
+        self._tags = {}
+        self._path = None
+
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+
+        if runtime_dir:
+            self._path = os.path.join(runtime_dir, CACHE_DIR, f'{op_type}.json')
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, encoding='utf8') as file:
+                tags = json.load(file)
+
+            if isinstance(tags, dict):
+                self._tags = tags
+
+        except (OSError, ValueError) as e:
+            log.debug('Cache not loaded:', e)
+
+    def _save(self):
+        if not self._path:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self._path), mode=0o700, exist_ok=True)
+
+            tmp_path = f'{self._path}.{os.getpid()}'
+            with open(tmp_path, 'w', encoding='utf8') as file:
+                json.dump(self._tags, file)
+
+            os.replace(tmp_path, self._path)
+
+        except OSError as e:
+            log.debug('Cache not saved:', e)
+
+    def _remember(self, tag, hashes):
+        if tag in self._tags:
+            return
+
+        self._tags[tag] = hashes
+
+        while len(self._tags) > self._keep:
+            del self._tags[next(iter(self._tags))]
+
+        self._save()
+
+    def tag(self, data, server=''):
+        hashes = {str(index): _hash(item) for index, item in data.items()}
+        return _hash([server, sorted(hashes.items())]), hashes
+
+    def diff(self, data, server='', since=None):
+        """
+        Returns only the changes of `data` since the result tagged `since` was handed out.
+
+        If nothing changed `unchanged` is set, an unknown tag results in all data being returned.
+        """
+        tag, hashes = self.tag(data, server)
+
+        if since and since == tag:
+            return {'unchanged': True, 'tag': tag}
+
+        known = self._tags.get(since) if since else None
+        self._remember(tag, hashes)
+
+        if known is None:
+            return {'tag': tag, 'data': data}
+
+        changed = {index: item for index, item in data.items() if known.get(str(index)) != hashes[str(index)]}
+        removed = [int(index) for index in known if index not in hashes]
+
+        return {'tag': tag, 'changed': changed, 'removed': removed}
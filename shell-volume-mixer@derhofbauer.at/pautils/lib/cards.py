@@ -14,14 +14,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from functools import partial
+
 from .pulseaudio import Pulseaudio
-from . import log
 from . import libpulse
+from . import structs
+from .fields import sub, wants
+from .records import Card, Port, Profile, intern
 
 
 class Cards(Pulseaudio):
-    def build_callback(self):
-        return libpulse.card_info_cb_t(self.pa_cb)
+    _property_keys = ('alsa.card', 'alsa.card_name', 'device.description')
+
+    def build_callback(self, request):
+        return libpulse.card_info_cb_t(partial(self.pa_cb, request))
 
     def get_by_index(self, index, callback):
         return libpulse.context_get_card_info_by_index(self._context, index, callback, None)
@@ -33,71 +39,83 @@ class Cards(Pulseaudio):
         return libpulse.context_get_card_info_list(self._context, callback, None)
 
     def cb_data(self, pa_card):
-        card_name = pa_card.name.decode('utf8')
-
-        try:
-            alsa_card = libpulse.proplist_gets(pa_card.proplist, b'alsa.card')
-            alsa_card = int(alsa_card.decode('utf8')) if alsa_card else None
-        except Exception:
-            log.debug('No property "alsa.card"')
-            alsa_card = None
-
-        try:
-            description = libpulse.proplist_gets(pa_card.proplist, b'device.description')
-            description = description.decode('utf8') if description else None
-        except Exception:
-            log.debug('No property "device.description"')
-            description = None
-
-        if not description:
-            try:
-                description = libpulse.proplist_gets(pa_card.proplist, b'alsa.card_name')
-                description = description.decode('utf8') if description else None
-            except Exception:
-                log.debug('No property "alsa.card_name"')
-                description = card_name
-
-        card = {
-            'index': pa_card.index,
-            'alsaCard': alsa_card,
-            'name': card_name,
-            'description': description,
-            'active_profile': None,
-            'profiles': {
-            },
-            'ports': {
-            },
-        }
-
-        if pa_card.active_profile and pa_card.active_profile[0]:
-            ap = pa_card.active_profile[0]
-            card['active_profile'] = ap.name.decode('utf8')
-
-        for i in range(0, pa_card.n_profiles):
-            if not pa_card.profiles2[i] or not pa_card.profiles2[i][0]:
-                continue
-
-            profile = pa_card.profiles2[i][0]
-            name = profile.name.decode('utf8')
-
-            card['profiles'][name] = {
-                'name': name,
-                'description': profile.description.decode('utf8'),
-                'available': bool(profile.available),
-            }
-
-        for index in range(0, pa_card.n_ports):
-            if not pa_card.ports[index] or not pa_card.ports[index][0]:
-                continue
-
-            port = pa_card.ports[index][0]
-            name = port.name.decode('utf8')
-
-            card['ports'][name] = {
-                'name': name,
-                'description': port.description.decode('utf8'),
-                'direction': 'out' if port.direction == 1 else 'in',
-                'available': True if port.available == 2 else (False if port.available == 1 else None),
-            }
+        fields = self.fields
+        properties = self._properties(pa_card.proplist)
+        card = Card()
+
+        if wants(fields, 'index'):
+            card.index = pa_card.index
+
+        if wants(fields, 'alsaCard'):
+            card.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            card.name = intern(pa_card.name)
+
+        if wants(fields, 'description'):
+            card.description = properties.get('device.description') or properties.get('alsa.card_name')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            card.properties = self._exported(properties)
+
+        if wants(fields, 'active_profile'):
+            card.active_profile = None
+
+            if pa_card.active_profile and pa_card.active_profile[0]:
+                ap = pa_card.active_profile[0]
+                card.active_profile = intern(ap.name)
+
+        if wants(fields, 'profiles'):
+            card.profiles = self._profiles(pa_card, sub(fields, 'profiles'))
+
+        if wants(fields, 'ports'):
+            card.ports = self._ports(pa_card, sub(fields, 'ports'))
 
         return card
+
+    def _profiles(self, pa_card, fields):
+        profiles = {}
+        want_name, want_description, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'available'))
+
+        for profile in structs.items(pa_card.profiles2, pa_card.n_profiles, libpulse.card_profile_info2):
+            name = intern(profile.name)
+            data = Profile()
+
+            if want_name:
+                data.name = name
+
+            if want_description:
+                data.description = intern(profile.description)
+
+            if want_available:
+                data.available = bool(profile.available)
+
+            profiles[name] = data
+
+        return profiles
+
+    def _ports(self, pa_card, fields):
+        ports = {}
+        want_name, want_description, want_direction, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'direction', 'available'))
+
+        for port in structs.items(pa_card.ports, pa_card.n_ports, libpulse.card_port_info):
+            name = intern(port.name)
+            data = Port()
+
+            if want_name:
+                data.name = name
+
+            if want_description:
+                data.description = intern(port.description)
+
+            if want_direction:
+                data.direction = 'out' if port.direction == 1 else 'in'
+
+            if want_available:
+                data.available = True if port.available == 2 else (False if port.available == 1 else None)
+
+            ports[name] = data
+
+        return ports
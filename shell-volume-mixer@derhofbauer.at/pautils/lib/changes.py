@@ -0,0 +1,193 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from functools import partial
+
+from . import log
+from . import libpulse
+from . import snapshot
+from .serverinfo import ServerInfo
+
+# keys of each kind of change, the first one naming the object changed
+KINDS = (('card', 'profile'), ('sink', 'port'), ('default_sink',))
+
+
+def parse(changes):
+    """
+    Validates a list of changes, e.g. `[{"card": 3, "profile": "output:hdmi-stereo"},
+    {"sink": "alsa_output...", "port": "hdmi-output"}, {"default_sink": "alsa_output..."}]`.
+
+    Cards and sinks are given by index or name. Returns what's wrong with them, None if nothing is.
+    """
+    if not isinstance(changes, list) or not changes:
+        return 'need a list of changes'
+
+    for change in changes:
+        kind = next((keys for keys in KINDS if keys[0] in change), None) if isinstance(change, dict) else None
+
+        if not kind or set(change) != set(kind) or any(not isinstance(change[key], str) for key in kind[1:]):
+            return f'invalid change {json.dumps(change)}'
+
+        target = change[kind[0]]
+
+        if not isinstance(target, str) and (kind[0] == 'default_sink' or type(target) is not int):
+            return f'invalid change {json.dumps(change)}'
+
+    return None
+
+
+class Changes:
+    """
+    Operations applying a list of changes, see parse(), issued all at once.
+
+    The result of each change is `{"success": true}` or `{"success": false, "error": "..."}`.
+    """
+
+    def __init__(self, connection, changes):
+        self._connection = connection
+        self._changes = changes
+        self._operations = []
+        self._callbacks = []
+
+        self.results = [None] * len(changes)
+        self.pending = 0
+        # whether any change was sent to the server
+        self.sent = False
+
+    @property
+    def done(self):
+        return self.pending <= 0
+
+    def request(self):
+        context = self._connection.context
+
+        for position, change in enumerate(self._changes):
+            callback = libpulse.context_success_cb_t(partial(self.success_cb, position))
+            operation = self._issue(context, change, callback)
+
+            if not operation:
+                log.debug('Operation failed')
+                self.results[position] = self._failure()
+                continue
+
+            self._callbacks.append(callback)
+            self._operations.append(operation)
+            self.pending += 1
+            self.sent = True
+
+    def _issue(self, context, change, callback):
+        if 'card' in change:
+            card = change['card']
+            profile = change['profile'].encode('utf8')
+
+            if isinstance(card, int):
+                return libpulse.context_set_card_profile_by_index(context, card, profile, callback, None)
+
+            return libpulse.context_set_card_profile_by_name(context, card.encode('utf8'), profile, callback, None)
+
+        if 'sink' in change:
+            sink = change['sink']
+            port = change['port'].encode('utf8')
+
+            if isinstance(sink, int):
+                return libpulse.context_set_sink_port_by_index(context, sink, port, callback, None)
+
+            return libpulse.context_set_sink_port_by_name(context, sink.encode('utf8'), port, callback, None)
+
+        return libpulse.context_set_default_sink(context, change['default_sink'].encode('utf8'), callback, None)
+
+    def success_cb(self, position, context, success, userdata):
+        self.results[position] = {'success': True} if success else self._failure()
+        self.pending -= 1
+        self._connection.notify()
+
+    def _failure(self):
+        message = libpulse.strerror(libpulse.context_errno(self._connection.context))
+        return {'success': False, 'error': message.decode('utf8') if message else 'unknown error'}
+
+    def release(self):
+        """
+        Releases the operations, changes not confirmed in time might still be applied.
+        """
+        with self._connection.lock():
+            for operation in self._operations:
+                libpulse.operation_unref(operation)
+
+        self._operations = []
+        self.pending = 0
+        self.results = [result or {'success': False, 'error': 'no reply in time'} for result in self.results]
+
+
+def apply(connection, changes):
+    """
+    Applies a list of changes, see parse(), returning the result of each change along with the cards
+    and sinks affected and the default sink, all queried afterwards.
+
+    The server handles the commands of a connection in order, so the queries are issued right after
+    the changes and still see their outcome, everything taking a single round trip. Sinks affected
+    are those changed and those of the cards changed, which might only exist with the new profile.
+
+    If the server failed or didn't answer in time once changes were sent, the error is returned along
+    with the result of each change.
+    """
+    log.debug('Applying', len(changes), 'changes')
+
+    card_lookups = list(dict.fromkeys(change['card'] for change in changes if 'card' in change))
+    sink_lookups = {change.get('sink', change.get('default_sink')) for change in changes if 'card' not in change}
+
+    writes = Changes(connection, changes)
+    queries = {'server': (ServerInfo(connection), None)}
+
+    if card_lookups:
+        queries['cards'] = (snapshot.load('cards')(connection), card_lookups)
+
+    if card_lookups or sink_lookups:
+        queries['sinks'] = (snapshot.load('sinks')(connection), None)
+
+    def start():
+        writes.request()
+
+        for query, lookups in queries.values():
+            query.request(lookups)
+
+    def done():
+        return writes.done and all(query.done for query, _ in queries.values())
+
+    success = connection.run(start, done)
+    writes.release()
+
+    for query, _ in queries.values():
+        query.release()
+
+    if not success:
+        if not writes.sent:
+            return connection.error()
+
+        # changes sent might have been applied, their results tell which ones were confirmed
+        return dict(connection.error(), results=writes.results)
+
+    cards = queries['cards'][0].data if 'cards' in queries else {}
+    sinks = queries['sinks'][0].data if 'sinks' in queries else {}
+    card_indexes = {card['index'] for card in cards.values()}
+
+    return {
+        'results': writes.results,
+        'cards': cards,
+        'sinks': {index: sink for index, sink in sinks.items()
+                  if sink['card'] in card_indexes or sink['index'] in sink_lookups or sink['name'] in sink_lookups},
+        'default_sink': queries['server'][0].data.get('default_sink_name'),
+    }
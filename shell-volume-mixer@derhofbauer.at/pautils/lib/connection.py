@@ -0,0 +1,347 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import abc
+from contextlib import nullcontext
+from time import monotonic
+
+from . import log
+from . import libpulse
+from . import trace
+
+STATE_NAMES = {
+    libpulse.CONTEXT_UNCONNECTED: 'unconnected',
+    libpulse.CONTEXT_CONNECTING: 'connecting',
+    libpulse.CONTEXT_AUTHORIZING: 'authorizing',
+    libpulse.CONTEXT_SETTING_NAME: 'setting_name',
+    libpulse.CONTEXT_READY: 'ready',
+    libpulse.CONTEXT_FAILED: 'failed',
+    libpulse.CONTEXT_TERMINATED: 'terminated',
+}
+
+# codes of the errors in the success/error envelope by libpulse error
+ERROR_CODES = {
+    libpulse.ERR_CONNECTIONREFUSED: 'no_server',
+    libpulse.ERR_NOENTITY: 'no_server',
+    libpulse.ERR_INVALIDSERVER: 'no_server',
+    libpulse.ERR_TIMEOUT: 'timeout',
+    libpulse.ERR_CONNECTIONTERMINATED: 'terminated',
+    libpulse.ERR_KILLED: 'terminated',
+    libpulse.ERR_ACCESS: 'access_denied',
+    libpulse.ERR_AUTHKEY: 'access_denied',
+    libpulse.ERR_VERSION: 'unsupported',
+}
+
+# seconds after which trying again makes sense by error code, None if it doesn't
+RETRY = {
+    'no_server': 1.0,
+    'timeout': 1.0,
+    'terminated': 0.5,
+    'access_denied': None,
+    'unsupported': None,
+    'failed': 2.0,
+}
+
+# longest timeout of a mainloop iteration in microseconds, mainloop_prepare() takes a C int
+MAX_ITERATE_TIMEOUT = 2 ** 31 - 1
+
+
+class BaseConnection:
+    """
+    Context connected to a PulseAudio server, driven by a mainloop of the kind of the subclass.
+    """
+
+    # seconds a query may take, including connecting if necessary
+    timeout = 3.0
+
+    # seconds the context may take to get ready, failing early if the server isn't there (yet)
+    connect_timeout = 1.0
+
+    def __init__(self, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS, server=None,
+                 mainloop=None):
+        self.state = libpulse.CONTEXT_UNCONNECTED
+        self.timings = {}
+        self.flags = flags
+        # server string as understood by libpulse, e.g. `tcp:host`, None for the default server
+        self.server = server
+
+        if timeout is not None:
+            self.timeout = timeout
+
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        elif flags & libpulse.CONTEXT_NOFAIL:
+            # waiting for the server to show up may take as long as the query itself
+            self.connect_timeout = self.timeout
+
+        self._state_changes = {}
+        self._connect_timed_out = False
+        # seconds after which the last query was given up on, None if it wasn't
+        self._timed_out = None
+
+        # contexts of several connections can be driven by the mainloop of one of them, see fanout.py
+        self._owns_mainloop = mainloop is None
+
+        if self._owns_mainloop:
+            self._pa_mainloop = None
+            self._pa_mainloop_api = self._create_mainloop()
+        else:
+            self._pa_mainloop = mainloop._pa_mainloop
+            self._pa_mainloop_api = mainloop._pa_mainloop_api
+
+        self.context = libpulse.context_new(self._pa_mainloop_api, b'ShellVolumeMixer')
+        self._context_notify_cb = libpulse.context_notify_cb_t(self.context_notify_cb)
+
+        libpulse.context_set_state_callback(self.context, self._context_notify_cb, None)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def failed(self):
+        return self.state in (libpulse.CONTEXT_FAILED, libpulse.CONTEXT_TERMINATED)
+
+    def connect(self):
+        self._state_changes[libpulse.CONTEXT_UNCONNECTED] = monotonic()
+        trace.mark('state', STATE_NAMES[libpulse.CONTEXT_UNCONNECTED])
+
+        server = self.server.encode('utf8') if self.server else None
+
+        if libpulse.context_connect(self.context, server, self.flags, None) < 0:
+            log.debug('Connecting failed')
+            self.state = libpulse.CONTEXT_FAILED
+
+    def error(self):
+        """
+        Returns the success/error envelope telling why the context failed or the last query didn't
+        complete.
+
+        `code` is one of RETRY's keys, `retry` the seconds after which trying again makes sense.
+        """
+        if self._connect_timed_out:
+            code = 'timeout'
+            message = f'context failed: not connected after {self.connect_timeout}s'
+        elif self._timed_out is not None and not self.failed:
+            code = 'timeout'
+            message = f'no answer within {self._timed_out}s'
+        else:
+            errno = libpulse.context_errno(self.context)
+            code = ERROR_CODES.get(errno, 'failed')
+            message = libpulse.strerror(errno)
+            message = 'context failed: ' + (message.decode('utf8') if message else 'unknown error')
+
+        return {
+            'success': False,
+            'error': message,
+            'code': code,
+            'retry': RETRY[code],
+        }
+
+    def _connect_deadline(self):
+        return self._state_changes.get(libpulse.CONTEXT_UNCONNECTED, monotonic()) + self.connect_timeout
+
+    def _check_connect_timeout(self):
+        if self.state == libpulse.CONTEXT_READY or self.failed or monotonic() < self._connect_deadline():
+            return False
+
+        log.debug(f'Context not ready after {self.connect_timeout}s')
+        trace.mark('connect_timeout')
+        self._connect_timed_out = True
+        self.state = libpulse.CONTEXT_FAILED
+
+        return True
+
+    def close(self):
+        libpulse.context_disconnect(self.context)
+        libpulse.context_unref(self.context)
+
+        if self._owns_mainloop:
+            self._free_mainloop()
+
+    @abc.abstractmethod
+    def _create_mainloop(self):
+        return None
+
+    @abc.abstractmethod
+    def _free_mainloop(self):
+        return
+
+    def lock(self):
+        """
+        Guards calls into libpulse made outside of callbacks, only needed if the mainloop runs in a
+        thread of its own.
+        """
+        return nullcontext()
+
+    def notify(self):
+        """
+        Called from callbacks whenever something a query waits for might have happened.
+        """
+
+    def context_notify_cb(self, context, userdata):
+        try:
+            self.state = libpulse.context_get_state(context)
+        except Exception:
+            self.state = libpulse.CONTEXT_FAILED
+            log.debug('Context failed')
+
+        self._state_changes.setdefault(self.state, monotonic())
+        trace.mark('state', STATE_NAMES.get(self.state, self.state))
+
+        if self.state == libpulse.CONTEXT_READY:
+            self._record_timing('connect', libpulse.CONTEXT_UNCONNECTED, libpulse.CONTEXT_AUTHORIZING)
+            self._record_timing('authorize', libpulse.CONTEXT_AUTHORIZING, libpulse.CONTEXT_READY)
+
+        self.notify()
+
+    def _record_timing(self, phase, since, until):
+        if since in self._state_changes and until in self._state_changes:
+            self.timings[phase] = self._state_changes[until] - self._state_changes[since]
+            log.debug(f'Phase {phase} took {self.timings[phase]:.6f}s')
+
+    def subscribe(self, mask, callback):
+        """
+        Calls `callback(event_type, index)` for every server event matching `mask`.
+
+        Returns False if subscribing failed.
+        """
+        result = {}
+
+        def subscribe_cb(context, event_type, index, userdata):
+            callback(event_type, index)
+
+        def success_cb(context, success, userdata):
+            result['success'] = bool(success)
+            self.notify()
+
+        self._subscribe_cb = libpulse.context_subscribe_cb_t(subscribe_cb)
+        self._subscribe_success_cb = libpulse.context_success_cb_t(success_cb)
+
+        def start():
+            libpulse.context_set_subscribe_callback(self.context, self._subscribe_cb, None)
+            operation = libpulse.context_subscribe(self.context, mask, self._subscribe_success_cb, None)
+
+            if operation:
+                libpulse.operation_unref(operation)
+
+        return self.run(start, lambda: 'success' in result) and result.get('success', False)
+
+    @abc.abstractmethod
+    def flush(self):
+        """
+        Dispatches all events received so far, without blocking.
+        """
+
+    @abc.abstractmethod
+    def run(self, start, done, timeout=None):
+        """
+        Calls `start()` once the context is ready and waits until `done()` returns true or the
+        deadline passed. Returns False if the context failed, didn't get ready in time or `done()`
+        still isn't true at the deadline, see error().
+        """
+        return False
+
+
+class Connection(BaseConnection):
+    """
+    Mainloop and context connected to a PulseAudio server.
+
+    A connection can be shared by any number of queries, as long as they are run one after another.
+    """
+
+    def _create_mainloop(self):
+        self._pa_mainloop = libpulse.mainloop_new()
+        return libpulse.mainloop_get_api(self._pa_mainloop)
+
+    def _free_mainloop(self):
+        libpulse.mainloop_free(self._pa_mainloop)
+
+    def iterate(self, timeout):
+        """
+        Runs a single mainloop iteration, blocking until events arrive or `timeout` seconds passed.
+
+        Returns the number of events dispatched, a negative value on errors.
+        """
+        if libpulse.mainloop_prepare(self._pa_mainloop, min(max(0, int(timeout * 1000000)), MAX_ITERATE_TIMEOUT)) < 0:
+            return -1
+
+        if libpulse.mainloop_poll(self._pa_mainloop) < 0:
+            return -1
+
+        return libpulse.mainloop_dispatch(self._pa_mainloop)
+
+    def flush(self):
+        """
+        Dispatches all events received so far, without blocking.
+        """
+        while self.iterate(0) > 0:
+            pass
+
+    def run(self, start, done, timeout=None):
+        """
+        Iterates the mainloop until `done()` returns true or the deadline passed.
+
+        `start()` is called once, as soon as the context is ready. Returns False if the context failed,
+        didn't get ready in time or `done()` still isn't true at the deadline, see error().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        started = None
+        self._timed_out = None
+
+        while True:
+            if started and done():
+                break
+
+            if self.failed or self._check_connect_timeout():
+                return False
+
+            remaining = deadline - monotonic()
+
+            if remaining <= 0:
+                log.debug(f'Stopping query after {timeout}s')
+                trace.mark('timeout')
+
+                if not started:
+                    self._connect_timed_out = True
+                    self.state = libpulse.CONTEXT_FAILED
+                    return False
+
+                self._timed_out = timeout
+                break
+
+            if self.state == libpulse.CONTEXT_READY and not started:
+                started = monotonic()
+                start()
+                continue
+
+            if not started:
+                remaining = min(remaining, self._connect_deadline() - monotonic())
+
+            if self.iterate(remaining) < 0:
+                log.debug('Mainloop failed')
+                trace.mark('mainloop_failed')
+                break
+
+        if started:
+            self.timings['operation'] = monotonic() - started
+            log.debug(f'Phase operation took {self.timings["operation"]:.6f}s')
+
+        return bool(started) and done()
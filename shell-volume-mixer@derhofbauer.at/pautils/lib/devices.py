@@ -0,0 +1,65 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from .pulseaudio import Pulseaudio
+from . import structs
+from . import volume
+from .fields import wants
+from .records import Port, intern
+
+
+class Devices(Pulseaudio):
+    """
+    Sinks and sources, decoding the ports and volume both have the same way.
+    """
+
+    _property_keys = ('alsa.card', 'device.description')
+    _volumes = True
+
+    # struct of the device's ports
+    _port_info = None
+
+    def _ports(self, pa_device, fields):
+        ports = {}
+        want_name, want_description, want_type, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'type', 'available'))
+
+        for port in structs.items(pa_device.ports, pa_device.n_ports, self._port_info):
+            name = intern(port.name)
+            data = Port()
+
+            if want_name:
+                data.name = name
+
+            if want_description:
+                data.description = intern(port.description)
+
+            if want_type:
+                data.type = port.type
+
+            if want_available:
+                data.available = True if port.available == 2 else (False if port.available == 1 else None)
+
+            ports[name] = data
+
+        return ports
+
+    def _volume(self, pa_device, fields):
+        cvolume = pa_device.volume
+        channel_map = pa_device.channel_map
+
+        return volume.read(fields, cvolume.values[:cvolume.channels], channel_map.map[:channel_map.channels],
+                           pa_device.base_volume, pa_device.n_volume_steps)
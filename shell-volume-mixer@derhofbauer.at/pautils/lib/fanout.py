@@ -0,0 +1,139 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from time import monotonic
+
+from . import log
+from . import libpulse
+from . import trace
+from .connection import Connection
+
+
+class Fanout:
+    """
+    Connections to several servers at once, a context each, all driven by a single mainloop.
+
+    Each server connects and is queried on its own. Servers that can't be reached fail as soon as their
+    connect timeout passed, without holding up the others, so queries take as long as the slowest server
+    answering does.
+    """
+
+    def __init__(self, servers, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS):
+        self.connections = {}
+        mainloop = None
+
+        for server in servers:
+            connection = Connection(timeout, connect_timeout, flags, server, mainloop)
+            self.connections[server] = connection
+            mainloop = mainloop or connection
+
+        self._mainloop = mainloop
+        self.timeout = mainloop.timeout
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        for connection in self.connections.values():
+            connection.connect()
+
+    def close(self):
+        # the mainloop is freed along with the connection owning it, after all others are gone
+        for connection in self.connections.values():
+            if connection is not self._mainloop:
+                connection.close()
+
+        self._mainloop.close()
+
+    def run(self, jobs, timeout=None):
+        """
+        Iterates the mainloop until every server's `done()` returns true, it failed or the deadline passed.
+
+        `jobs` are `(start, done)` by server, see Connection.run(). Returns whether each one succeeded by
+        server, errors of those that didn't are returned by the server's connection's error().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        pending = dict(jobs)
+        started = {}
+        results = {}
+
+        for server in pending:
+            self.connections[server]._timed_out = None
+
+        while pending:
+            for server, (start, done) in list(pending.items()):
+                connection = self.connections[server]
+
+                if server in started and done():
+                    results[server] = True
+                elif connection.failed or connection._check_connect_timeout():
+                    log.debug('Giving up on server', server)
+                    results[server] = False
+                elif connection.state == libpulse.CONTEXT_READY and server not in started:
+                    started[server] = monotonic()
+                    start()
+                    continue
+                else:
+                    continue
+
+                del pending[server]
+
+                if server in started:
+                    connection.timings['operation'] = monotonic() - started[server]
+
+            if not pending:
+                break
+
+            remaining = deadline - monotonic()
+
+            if remaining <= 0:
+                log.debug(f'Stopping queries after {timeout}s')
+                trace.mark('timeout')
+
+                for server in pending:
+                    connection = self.connections[server]
+
+                    # like Connection.run(), a started query not done yet failed as well
+                    if server not in started:
+                        connection._connect_timed_out = True
+                        connection.state = libpulse.CONTEXT_FAILED
+                    else:
+                        connection._timed_out = timeout
+
+                    results[server] = False
+
+                break
+
+            # wake up in time to give up on servers not ready yet
+            for server in pending:
+                if server not in started:
+                    remaining = min(remaining, self.connections[server]._connect_deadline() - monotonic())
+
+            if self._mainloop.iterate(max(0, remaining)) < 0:
+                log.debug('Mainloop failed')
+                trace.mark('mainloop_failed')
+
+                for server in pending:
+                    results[server] = False
+
+                break
+
+        return results
@@ -0,0 +1,55 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Projections are nested dicts of the keys wanted, None standing for all keys of an object (or all
+# of its sub-structures).
+
+
+def parse(arg):
+    """
+    Parses a comma separated list of keys, e.g. `index,name,profiles.available`.
+
+    Returns None if all keys are wanted.
+    """
+    if not arg:
+        return None
+
+    paths = arg if isinstance(arg, list) else arg.split(',')
+    fields = {}
+
+    for path in paths:
+        parts = [part for part in path.strip().split('.') if part]
+        node = fields
+
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                node = None
+                break
+
+            node = node.setdefault(part, {})
+
+        if node is not None and parts:
+            node[parts[-1]] = None
+
+    return fields or None
+
+
+def wants(fields, key):
+    return fields is None or key in fields
+
+
+def sub(fields, key):
+    return None if fields is None else fields.get(key)
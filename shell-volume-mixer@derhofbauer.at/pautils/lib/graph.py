@@ -0,0 +1,85 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Cards joined with the sinks and sources they provide, along with indexes to look objects up by.
+#
+# {
+#     "cards": {"3": {..., "sinks": [5], "sources": [4], "ports": {"analog-output": {..., "sinks": [5]}}}},
+#     "sinks": {"5": {..., "card": 3, "card_profile": "output:analog-stereo"}},
+#     "sources": {...},
+#     "names": {"cards": {"alsa_card...": 3}, "sinks": {...}, "sources": {...}},
+#     "alsaCards": {"cards": {"0": 3}, "sinks": {"0": [5]}, "sources": {"0": [4]}}
+# }
+
+TYPES = ('cards', 'sinks', 'sources')
+
+# types of the devices linked to cards
+DEVICES = ('sinks', 'sources')
+
+
+def join(data):
+    """
+    Builds the graph of the cards, sinks and sources listed in `data`, by type.
+
+    Objects are the ones decoded, linked to each other by index. Devices of a card expose the card's
+    ports of the same name.
+    """
+    cards = data['cards']
+    graph = {op_type: data[op_type] for op_type in TYPES}
+
+    for card in cards.values():
+        for op_type in DEVICES:
+            card[op_type] = []
+
+        for port in card.get('ports', {}).values():
+            port['sinks' if port.get('direction') == 'out' else 'sources'] = []
+
+    for op_type in DEVICES:
+        for index, device in graph[op_type].items():
+            card = cards.get(device.get('card'))
+            device['card_profile'] = None
+
+            if not card:
+                continue
+
+            card[op_type].append(index)
+            device['card_profile'] = card.get('active_profile')
+
+            card_ports = card.get('ports', {})
+
+            for name in device.get('ports', {}):
+                port = card_ports.get(name)
+
+                if port and op_type in port:
+                    port[op_type].append(index)
+
+    graph['names'] = {op_type: _index(graph[op_type], 'name') for op_type in TYPES}
+    graph['alsaCards'] = {'cards': _index(cards, 'alsaCard')}
+
+    for op_type in DEVICES:
+        alsa_cards = {}
+
+        for index, device in graph[op_type].items():
+            if device.get('alsaCard') is not None:
+                alsa_cards.setdefault(device['alsaCard'], []).append(index)
+
+        graph['alsaCards'][op_type] = alsa_cards
+
+    return graph
+
+
+def _index(objects, key):
+    return {value[key]: index for index, value in objects.items() if value.get(key) is not None}
@@ -15,10 +15,46 @@
 
 from ctypes import *
 
-try:
-    lib = CDLL('libpulse.so.0')
-except:
-    lib = CDLL('libpulse.so')
+# The library is only loaded and functions are only bound when they're first used, saving the
+# startup cost of resolving symbols that a query never needs.
+_lib = None
+_prototypes = {}
+
+
+def _load():
+    global _lib
+
+    if _lib is None:
+        try:
+            _lib = CDLL('libpulse.so.0')
+        except OSError:
+            _lib = CDLL('libpulse.so')
+
+    return _lib
+
+
+def _prototype(name, restype, argtypes):
+    _prototypes[name] = (restype, argtypes)
+
+
+def __getattr__(name):
+    if name == 'lib':
+        return _load()
+
+    if name not in _prototypes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    restype, argtypes = _prototypes[name]
+
+    function = getattr(_load(), f'pa_{name}')
+    function.restype = restype
+    function.argtypes = argtypes
+
+    # bound once, further lookups won't end up here
+    globals()[name] = function
+
+    return function
+
 
 STRING = c_char_p
 WSTRING = c_wchar_p
@@ -153,21 +189,120 @@ class sink_info(Structure):
         ('formats', POINTER(POINTER(format_info))),
     ]
 
-mainloop_new = lib.pa_mainloop_new
-mainloop_new.restype = POINTER(mainloop)
-mainloop_new.argtypes = []
-mainloop_get_api = lib.pa_mainloop_get_api
-mainloop_get_api.restype = POINTER(mainloop_api)
-mainloop_get_api.argtypes = [POINTER(mainloop)]
-mainloop_iterate = lib.pa_mainloop_iterate
-mainloop_iterate.restype = c_int
-mainloop_iterate.argtypes = [POINTER(mainloop), c_int, POINTER(c_int)]
-mainloop_free = lib.pa_mainloop_free
-mainloop_free.restype = None
-mainloop_free.argtypes = [POINTER(mainloop)]
+class source_port_info(Structure):
+    _fields_ = [
+        ('name', STRING),
+        ('description', STRING),
+        ('priority', c_uint32),
+        ('available', c_int),
+        ('availability_group', STRING),
+        ('type', c_uint32),
+    ]
+
+class source_info(Structure):
+    _fields_ = [
+        ('name', STRING),
+        ('index', c_uint32),
+        ('description', STRING),
+        ('sample_spec', sample_spec),
+        ('channel_map', pa_channel_map),
+        ('owner_module', c_uint32),
+        ('volume', pa_cvolume),
+        ('mute', c_int),
+        ('monitor_of_sink', c_uint32),
+        ('monitor_of_sink_name', STRING),
+        ('latency', c_uint64),
+        ('driver', STRING),
+        ('flags', c_int),
+        ('proplist', POINTER(proplist)),
+        ('configured_latency', c_uint64),
+        ('base_volume', c_uint32),
+        ('state', c_int),
+        ('n_volume_steps', c_uint32),
+        ('card', c_uint32),
+        ('n_ports', c_uint32),
+        ('ports', POINTER(POINTER(source_port_info))),
+        ('active_port', POINTER(source_port_info)),
+        ('n_formats', c_uint8),
+        ('formats', POINTER(POINTER(format_info))),
+    ]
+
+class sink_input_info(Structure):
+    _fields_ = [
+        ('index', c_uint32),
+        ('name', STRING),
+        ('owner_module', c_uint32),
+        ('client', c_uint32),
+        ('sink', c_uint32),
+        ('sample_spec', sample_spec),
+        ('channel_map', pa_channel_map),
+        ('volume', pa_cvolume),
+        ('buffer_usec', c_uint64),
+        ('sink_usec', c_uint64),
+        ('resample_method', STRING),
+        ('driver', STRING),
+        ('mute', c_int),
+        ('proplist', POINTER(proplist)),
+        ('corked', c_int),
+        ('has_volume', c_int),
+        ('volume_writable', c_int),
+        ('format', POINTER(format_info)),
+    ]
+
+class server_info(Structure):
+    _fields_ = [
+        ('user_name', STRING),
+        ('host_name', STRING),
+        ('server_version', STRING),
+        ('server_name', STRING),
+        ('sample_spec', sample_spec),
+        ('default_sink_name', STRING),
+        ('default_source_name', STRING),
+        ('cookie', c_uint32),
+        ('channel_map', pa_channel_map),
+    ]
+
+_prototype('mainloop_new', POINTER(mainloop), [])
+_prototype('mainloop_get_api', POINTER(mainloop_api), [POINTER(mainloop)])
+_prototype('mainloop_iterate', c_int, [POINTER(mainloop), c_int, POINTER(c_int)])
+_prototype('mainloop_prepare', c_int, [POINTER(mainloop), c_int])
+_prototype('mainloop_poll', c_int, [POINTER(mainloop)])
+_prototype('mainloop_dispatch', c_int, [POINTER(mainloop)])
+_prototype('mainloop_free', None, [POINTER(mainloop)])
+
+class threaded_mainloop(Structure):
+    pass
+
+_prototype('threaded_mainloop_new', POINTER(threaded_mainloop), [])
+_prototype('threaded_mainloop_free', None, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_start', c_int, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_stop', None, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_lock', None, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_unlock', None, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_wait', None, [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_signal', None, [POINTER(threaded_mainloop), c_int])
+_prototype('threaded_mainloop_get_api', POINTER(mainloop_api), [POINTER(threaded_mainloop)])
+_prototype('threaded_mainloop_in_thread', c_int, [POINTER(threaded_mainloop)])
+
+class pollfd(Structure):
+    _fields_ = [
+        ('fd', c_int),
+        ('events', c_short),
+        ('revents', c_short),
+    ]
+
+POLLIN = 0x001
+POLLPRI = 0x002
+POLLOUT = 0x004
+
+poll_func_t = CFUNCTYPE(c_int, POINTER(pollfd), c_ulong, c_int, c_void_p)
+_prototype('mainloop_set_poll_func', None, [POINTER(mainloop), poll_func_t, c_void_p])
 
 context_flags = c_int  # enum
 context_flags_t = context_flags
+CONTEXT_NOFLAGS = 0
+CONTEXT_NOAUTOSPAWN = 1
+CONTEXT_NOFAIL = 2
 
 context_state = c_int  # enum
 context_state_t = context_state
@@ -180,59 +315,159 @@ CONTEXT_READY = 4
 CONTEXT_FAILED = 5
 CONTEXT_TERMINATED = 6
 
-context_new = lib.pa_context_new
-context_new.restype = POINTER(context)
-context_new.argtypes = [POINTER(mainloop_api), STRING]
+_prototype('context_new', POINTER(context), [POINTER(mainloop_api), STRING])
 context_notify_cb_t = CFUNCTYPE(None, POINTER(context), c_void_p)
-context_set_state_callback = lib.pa_context_set_state_callback
-context_set_state_callback.restype = None
-context_set_state_callback.argtypes = [POINTER(context), context_notify_cb_t, c_void_p]
-context_connect = lib.pa_context_connect
-context_connect.restype = c_int
-context_connect.argtypes = [POINTER(context), STRING, context_flags_t, POINTER(spawn_api)]
-context_disconnect = lib.pa_context_disconnect
-context_disconnect.restype = None
-context_disconnect.argtypes = [POINTER(context)]
-context_unref = lib.pa_context_unref
-context_unref.restype = None
-context_unref.argtypes = [POINTER(context)]
-context_get_state = lib.pa_context_get_state
-context_get_state.restype = context_state_t
-context_get_state.argtypes = [POINTER(context)]
-
-operation_unref = lib.pa_operation_unref
-operation_unref.restype = None
-operation_unref.argtypes = [POINTER(operation)]
+_prototype('context_set_state_callback', None, [POINTER(context), context_notify_cb_t, c_void_p])
+_prototype('context_connect', c_int, [POINTER(context), STRING, context_flags_t, POINTER(spawn_api)])
+_prototype('context_disconnect', None, [POINTER(context)])
+_prototype('context_unref', None, [POINTER(context)])
+_prototype('context_get_state', context_state_t, [POINTER(context)])
+_prototype('context_errno', c_int, [POINTER(context)])
+_prototype('strerror', STRING, [c_int])
+
+# values for enumeration 'error_code'
+OK = 0
+ERR_ACCESS = 1
+ERR_COMMAND = 2
+ERR_INVALID = 3
+ERR_EXIST = 4
+ERR_NOENTITY = 5
+ERR_CONNECTIONREFUSED = 6
+ERR_PROTOCOL = 7
+ERR_TIMEOUT = 8
+ERR_AUTHKEY = 9
+ERR_INTERNAL = 10
+ERR_CONNECTIONTERMINATED = 11
+ERR_KILLED = 12
+ERR_INVALIDSERVER = 13
+ERR_MODINITFAILED = 14
+ERR_BADSTATE = 15
+ERR_NODATA = 16
+ERR_VERSION = 17
+
+context_success_cb_t = CFUNCTYPE(None, POINTER(context), c_int, c_void_p)
+
+subscription_mask = c_int  # enum
+subscription_mask_t = subscription_mask
+# values for enumeration 'subscription_mask'
+SUBSCRIPTION_MASK_NULL = 0x0000
+SUBSCRIPTION_MASK_SINK = 0x0001
+SUBSCRIPTION_MASK_SOURCE = 0x0002
+SUBSCRIPTION_MASK_SINK_INPUT = 0x0004
+SUBSCRIPTION_MASK_SOURCE_OUTPUT = 0x0008
+SUBSCRIPTION_MASK_MODULE = 0x0010
+SUBSCRIPTION_MASK_CLIENT = 0x0020
+SUBSCRIPTION_MASK_SAMPLE_CACHE = 0x0040
+SUBSCRIPTION_MASK_SERVER = 0x0080
+SUBSCRIPTION_MASK_CARD = 0x0200
+
+subscription_event_type = c_int  # enum
+subscription_event_type_t = subscription_event_type
+# values for enumeration 'subscription_event_type'
+SUBSCRIPTION_EVENT_SINK = 0x0000
+SUBSCRIPTION_EVENT_SOURCE = 0x0001
+SUBSCRIPTION_EVENT_SINK_INPUT = 0x0002
+SUBSCRIPTION_EVENT_SOURCE_OUTPUT = 0x0003
+SUBSCRIPTION_EVENT_MODULE = 0x0004
+SUBSCRIPTION_EVENT_CLIENT = 0x0005
+SUBSCRIPTION_EVENT_SAMPLE_CACHE = 0x0006
+SUBSCRIPTION_EVENT_SERVER = 0x0007
+SUBSCRIPTION_EVENT_CARD = 0x0009
+SUBSCRIPTION_EVENT_FACILITY_MASK = 0x000F
+SUBSCRIPTION_EVENT_NEW = 0x0000
+SUBSCRIPTION_EVENT_CHANGE = 0x0010
+SUBSCRIPTION_EVENT_REMOVE = 0x0020
+SUBSCRIPTION_EVENT_TYPE_MASK = 0x0030
+
+context_subscribe_cb_t = CFUNCTYPE(None, POINTER(context), subscription_event_type_t, c_uint32, c_void_p)
+_prototype('context_subscribe', POINTER(operation), [POINTER(context), subscription_mask_t, context_success_cb_t, c_void_p])
+_prototype('context_set_subscribe_callback', None, [POINTER(context), context_subscribe_cb_t, c_void_p])
+
+_prototype('operation_unref', None, [POINTER(operation)])
+
+operation_state_t = c_int
+OPERATION_RUNNING = 0
+OPERATION_DONE = 1
+OPERATION_CANCELLED = 2
+_prototype('operation_get_state', operation_state_t, [POINTER(operation)])
+_prototype('operation_cancel', None, [POINTER(operation)])
+
+server_info_cb_t = CFUNCTYPE(None, POINTER(context), POINTER(server_info), c_void_p)
+_prototype('context_get_server_info', POINTER(operation), [POINTER(context), server_info_cb_t, c_void_p])
 
 card_info_cb_t = CFUNCTYPE(None, POINTER(context), POINTER(card_info), c_int, c_void_p)
-context_get_card_info_by_index = lib.pa_context_get_card_info_by_index
-context_get_card_info_by_index.restype = POINTER(operation)
-context_get_card_info_by_index.argtypes = [POINTER(context), c_uint32, card_info_cb_t, c_void_p]
-context_get_card_info_by_name = lib.pa_context_get_card_info_by_name
-context_get_card_info_by_name.restype = POINTER(operation)
-context_get_card_info_by_name.argtypes = [POINTER(context), STRING, card_info_cb_t, c_void_p]
-context_get_card_info_list = lib.pa_context_get_card_info_list
-context_get_card_info_list.restype = POINTER(operation)
-context_get_card_info_list.argtypes = [POINTER(context), card_info_cb_t, c_void_p]
+_prototype('context_get_card_info_by_index', POINTER(operation), [POINTER(context), c_uint32, card_info_cb_t, c_void_p])
+_prototype('context_get_card_info_by_name', POINTER(operation), [POINTER(context), STRING, card_info_cb_t, c_void_p])
+_prototype('context_get_card_info_list', POINTER(operation), [POINTER(context), card_info_cb_t, c_void_p])
 
 sink_info_cb_t = CFUNCTYPE(None, POINTER(context), POINTER(sink_info), c_int, c_void_p)
-context_get_sink_info_by_index = lib.pa_context_get_sink_info_by_index
-context_get_sink_info_by_index.restype = POINTER(operation)
-context_get_sink_info_by_index.argtypes = [POINTER(context), c_uint32, sink_info_cb_t, c_void_p]
-context_get_sink_info_by_name = lib.pa_context_get_sink_info_by_name
-context_get_sink_info_by_name.restype = POINTER(operation)
-context_get_sink_info_by_name.argtypes = [POINTER(context), STRING, sink_info_cb_t, c_void_p]
-context_get_sink_info_list = lib.pa_context_get_sink_info_list
-context_get_sink_info_list.restype = POINTER(operation)
-context_get_sink_info_list.argtypes = [POINTER(context), sink_info_cb_t, c_void_p]
-
-proplist_gets = lib.pa_proplist_gets
-proplist_gets.restype = STRING
-proplist_gets.argtypes = [POINTER(proplist), STRING]
-
-proplist_to_string = lib.pa_proplist_to_string
-proplist_to_string.restype = STRING
-proplist_to_string.argtypes = [POINTER(proplist)]
+_prototype('context_get_sink_info_by_index', POINTER(operation), [POINTER(context), c_uint32, sink_info_cb_t, c_void_p])
+_prototype('context_get_sink_info_by_name', POINTER(operation), [POINTER(context), STRING, sink_info_cb_t, c_void_p])
+_prototype('context_get_sink_info_list', POINTER(operation), [POINTER(context), sink_info_cb_t, c_void_p])
+
+source_info_cb_t = CFUNCTYPE(None, POINTER(context), POINTER(source_info), c_int, c_void_p)
+_prototype('context_get_source_info_by_index', POINTER(operation), [POINTER(context), c_uint32, source_info_cb_t, c_void_p])
+_prototype('context_get_source_info_by_name', POINTER(operation), [POINTER(context), STRING, source_info_cb_t, c_void_p])
+_prototype('context_get_source_info_list', POINTER(operation), [POINTER(context), source_info_cb_t, c_void_p])
+
+_prototype('context_set_card_profile_by_index', POINTER(operation), [POINTER(context), c_uint32, STRING, context_success_cb_t, c_void_p])
+_prototype('context_set_card_profile_by_name', POINTER(operation), [POINTER(context), STRING, STRING, context_success_cb_t, c_void_p])
+_prototype('context_set_sink_port_by_index', POINTER(operation), [POINTER(context), c_uint32, STRING, context_success_cb_t, c_void_p])
+_prototype('context_set_sink_port_by_name', POINTER(operation), [POINTER(context), STRING, STRING, context_success_cb_t, c_void_p])
+_prototype('context_set_default_sink', POINTER(operation), [POINTER(context), STRING, context_success_cb_t, c_void_p])
+
+sink_input_info_cb_t = CFUNCTYPE(None, POINTER(context), POINTER(sink_input_info), c_int, c_void_p)
+_prototype('context_get_sink_input_info', POINTER(operation), [POINTER(context), c_uint32, sink_input_info_cb_t, c_void_p])
+_prototype('context_get_sink_input_info_list', POINTER(operation), [POINTER(context), sink_input_info_cb_t, c_void_p])
+
+class stream(Structure):
+    pass
+
+class buffer_attr(Structure):
+    _fields_ = [
+        ('maxlength', c_uint32),
+        ('tlength', c_uint32),
+        ('prebuf', c_uint32),
+        ('minreq', c_uint32),
+        ('fragsize', c_uint32),
+    ]
+
+SAMPLE_FLOAT32LE = 5
+SAMPLE_FLOAT32BE = 6
+
+stream_flags = c_int  # enum
+stream_flags_t = stream_flags
+STREAM_NOFLAGS = 0x0000
+STREAM_DONT_MOVE = 0x0200
+STREAM_PEAK_DETECT = 0x0800
+STREAM_ADJUST_LATENCY = 0x2000
+STREAM_DONT_INHIBIT_AUTO_SUSPEND = 0x8000
+
+stream_state = c_int  # enum
+stream_state_t = stream_state
+STREAM_UNCONNECTED = 0
+STREAM_CREATING = 1
+STREAM_READY = 2
+STREAM_FAILED = 3
+STREAM_TERMINATED = 4
+
+stream_notify_cb_t = CFUNCTYPE(None, POINTER(stream), c_void_p)
+stream_request_cb_t = CFUNCTYPE(None, POINTER(stream), c_size_t, c_void_p)
+_prototype('stream_new', POINTER(stream), [POINTER(context), STRING, POINTER(sample_spec), POINTER(pa_channel_map)])
+_prototype('stream_set_state_callback', None, [POINTER(stream), stream_notify_cb_t, c_void_p])
+_prototype('stream_set_read_callback', None, [POINTER(stream), stream_request_cb_t, c_void_p])
+_prototype('stream_connect_record', c_int, [POINTER(stream), STRING, POINTER(buffer_attr), stream_flags_t])
+_prototype('stream_get_state', stream_state_t, [POINTER(stream)])
+_prototype('stream_peek', c_int, [POINTER(stream), POINTER(c_void_p), POINTER(c_size_t)])
+_prototype('stream_drop', c_int, [POINTER(stream)])
+_prototype('stream_disconnect', c_int, [POINTER(stream)])
+_prototype('stream_unref', None, [POINTER(stream)])
+
+_prototype('proplist_gets', STRING, [POINTER(proplist), STRING])
+
+_prototype('proplist_iterate', STRING, [POINTER(proplist), POINTER(c_void_p)])
+
+_prototype('proplist_to_string', STRING, [POINTER(proplist)])
 
 # this is a "magic" number (probably -1 at int32, but unsigned?) and tells us there's something fishy
 NULL_ID = 4294967295
@@ -0,0 +1,249 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import sys
+from ctypes import byref, c_size_t, c_void_p, string_at
+from functools import partial
+from time import monotonic
+
+from . import log
+from . import libpulse
+from .connection import Connection
+
+# samples of the format memoryview.cast('f') reads
+SAMPLE_FORMAT = libpulse.SAMPLE_FLOAT32LE if sys.byteorder == 'little' else libpulse.SAMPLE_FLOAT32BE
+
+
+class Meter:
+    """
+    Writes a line of JSON with the peak level of each sink metered at a fixed rate, e.g.
+    `{"peaks": {"0": 0.421, "3": 0.0}}`.
+
+    Levels are read from record streams on the sinks' monitor sources, with the server detecting
+    peaks and sending only a few values per line written. Fragments are reduced to their maximum
+    as a whole and all sinks are written in the same line, so metering more sinks costs hardly any
+    more.
+    """
+
+    # lines written per second
+    rate = 20
+
+    # peak values the server sends per line written
+    samples_per_line = 2
+
+    _stream_flags = (libpulse.STREAM_PEAK_DETECT | libpulse.STREAM_ADJUST_LATENCY | libpulse.STREAM_DONT_MOVE
+                     | libpulse.STREAM_DONT_INHIBIT_AUTO_SUSPEND)
+
+    def __init__(self, outfile, lookups=None, rate=None, timeout=None, connect_timeout=None,
+                 flags=libpulse.CONTEXT_NOFLAGS):
+        self._outfile = outfile
+        self._lookups = lookups or ['@DEFAULT_SINK@']
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._flags = flags
+
+        if rate is not None:
+            if rate <= 0:
+                raise ValueError(f'invalid rate {rate}')
+
+            self.rate = rate
+
+        self._connection = None
+        self._streams = {}
+        self._gone = []
+        self._peaks = {}
+
+        # peeking is done in callbacks only, one after another
+        self._data = c_void_p()
+        self._size = c_size_t()
+
+    def run(self):
+        with Connection(self._timeout, self._connect_timeout, self._flags) as connection:
+            self._connection = connection
+
+            try:
+                if self.open():
+                    self._loop()
+            finally:
+                self.close()
+
+    def open(self):
+        """
+        Looks up the sinks' monitor sources and starts recording from them.
+
+        Returns False if there's nothing to meter, after writing why.
+        """
+        monitors = self._find_monitors()
+
+        if monitors is None:
+            self._write(self._connection.error())
+            return False
+
+        if not monitors:
+            self._write({'success': False, 'error': 'no sinks found'})
+            return False
+
+        with self._connection.lock():
+            for index, monitor in monitors.items():
+                self._record(index, monitor)
+
+        if not self._streams:
+            self._write({'success': False, 'error': 'recording from the sinks failed'})
+            return False
+
+        log.debug('Metering sinks', ', '.join(str(index) for index in self._streams))
+        return True
+
+    def close(self):
+        with self._connection.lock():
+            for stream, _, _ in self._streams.values():
+                libpulse.stream_disconnect(stream)
+                libpulse.stream_unref(stream)
+
+        self._streams = {}
+
+    def _loop(self):
+        connection = self._connection
+        interval = 1 / self.rate
+        next_line = monotonic() + interval
+
+        while not connection.failed and self._streams:
+            remaining = next_line - monotonic()
+
+            if remaining > 0:
+                if connection.iterate(remaining) < 0:
+                    break
+
+                continue
+
+            self._drop_gone()
+            self.emit()
+
+            # lines missed while falling behind are skipped rather than written in a burst
+            next_line = max(next_line + interval, monotonic())
+
+        if connection.failed:
+            self._write(connection.error())
+        elif not self._streams:
+            self._write({'success': False, 'error': 'all sinks metered are gone'})
+
+    def emit(self):
+        """
+        Writes the peaks received since the last line, 0 for sinks nothing was received for.
+        """
+        peaks = self._peaks
+        self._peaks = {}
+        self._write({'peaks': {index: round(peaks.get(index, 0.0), 3) for index in self._streams}})
+
+    def _find_monitors(self):
+        monitors = {}
+        pending = []
+        operations = []
+
+        def sink_cb(context, pa_sink, eol, userdata):
+            if eol:
+                pending.pop()
+                self._connection.notify()
+                return
+
+            if pa_sink and pa_sink[0]:
+                monitors[pa_sink[0].index] = pa_sink[0].monitor_source
+
+        callback = libpulse.sink_info_cb_t(sink_cb)
+        context = self._connection.context
+
+        def start():
+            for lookup in self._lookups:
+                if isinstance(lookup, int):
+                    operation = libpulse.context_get_sink_info_by_index(context, lookup, callback, None)
+                else:
+                    operation = libpulse.context_get_sink_info_by_name(context, lookup.encode('utf8'), callback, None)
+
+                if operation:
+                    operations.append(operation)
+                    pending.append(lookup)
+
+        success = self._connection.run(start, lambda: not pending)
+
+        with self._connection.lock():
+            for operation in operations:
+                if libpulse.operation_get_state(operation) == libpulse.OPERATION_RUNNING:
+                    libpulse.operation_cancel(operation)
+
+                libpulse.operation_unref(operation)
+
+        if not success:
+            return None
+
+        return {index: monitor for index, monitor in monitors.items() if monitor != libpulse.NULL_ID}
+
+    def _record(self, index, monitor):
+        spec = libpulse.sample_spec(SAMPLE_FORMAT, self.rate * self.samples_per_line, 1)
+        stream = libpulse.stream_new(self._connection.context, b'Peak meter', byref(spec), None)
+
+        if not stream:
+            log.debug(f'Creating stream for sink {index} failed')
+            return
+
+        read_cb = libpulse.stream_request_cb_t(partial(self.read_cb, index))
+        state_cb = libpulse.stream_notify_cb_t(partial(self.stream_notify_cb, index))
+        libpulse.stream_set_read_callback(stream, read_cb, None)
+        libpulse.stream_set_state_callback(stream, state_cb, None)
+
+        # NULL_ID being (uint32_t) -1, leaving everything but the size of fragments to the server
+        attr = libpulse.buffer_attr(libpulse.NULL_ID, libpulse.NULL_ID, libpulse.NULL_ID, libpulse.NULL_ID,
+                                    self.samples_per_line * 4)
+
+        if libpulse.stream_connect_record(stream, str(monitor).encode(), byref(attr), self._stream_flags) < 0:
+            log.debug(f'Recording from source {monitor} failed')
+            libpulse.stream_unref(stream)
+            return
+
+        self._streams[index] = (stream, read_cb, state_cb)
+
+    def _drop_gone(self):
+        for index in self._gone:
+            if index in self._streams:
+                stream, _, _ = self._streams.pop(index)
+                libpulse.stream_unref(stream)
+
+        self._gone = []
+
+    def read_cb(self, index, stream, nbytes, userdata):
+        data = self._data
+        size = self._size
+        peak = self._peaks.get(index, 0.0)
+
+        while libpulse.stream_peek(stream, byref(data), byref(size)) == 0 and size.value:
+            # holes come without data
+            if data.value:
+                peak = max(peak, max(memoryview(string_at(data.value, size.value)).cast('f')))
+
+            libpulse.stream_drop(stream)
+
+        self._peaks[index] = peak
+
+    def stream_notify_cb(self, index, stream, userdata):
+        state = libpulse.stream_get_state(stream)
+
+        if state in (libpulse.STREAM_FAILED, libpulse.STREAM_TERMINATED):
+            log.debug(f'Stream of sink {index} gone')
+            self._gone.append(index)
+
+    def _write(self, item):
+        self._outfile.write(json.dumps(item) + '\n')
+        self._outfile.flush()
@@ -0,0 +1,963 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import select
+import socket
+import struct
+import time
+from contextlib import nullcontext
+from functools import partial
+from itertools import count
+from time import monotonic
+
+from . import libpulse
+from . import log
+from . import tagstruct
+from . import trace
+from . import volume
+from .cards import Cards
+from .connection import ERROR_CODES, RETRY
+from .fields import sub, wants
+from .pulseaudio import Pulseaudio
+from .records import Card, Port, Profile, Sink, SinkInput, Source
+from .serverinfo import ServerInfo
+from .sink_inputs import SinkInputs
+from .sinks import Sinks
+from .sources import Sources
+
+# version of the protocol spoken, the server answers with its own and the lower one applies
+PROTOCOL_VERSION = 35
+# upper bits of the version exchanged tell whether shared memory is supported
+PROTOCOL_VERSION_MASK = 0xffff
+
+COMMAND_ERROR = 0
+COMMAND_REPLY = 2
+COMMAND_AUTH = 8
+COMMAND_SET_CLIENT_NAME = 9
+COMMAND_GET_SERVER_INFO = 20
+COMMAND_GET_SINK_INFO = 21
+COMMAND_GET_SINK_INFO_LIST = 22
+COMMAND_GET_SOURCE_INFO = 23
+COMMAND_GET_SOURCE_INFO_LIST = 24
+COMMAND_GET_SINK_INPUT_INFO = 29
+COMMAND_GET_SINK_INPUT_INFO_LIST = 30
+COMMAND_GET_CARD_INFO = 88
+COMMAND_GET_CARD_INFO_LIST = 89
+
+COOKIE_LENGTH = 256
+
+# packets of commands and replies are sent on this channel, others carry audio data
+CONTROL_CHANNEL = 0xffffffff
+
+# length, channel, offset (high and low word) and flags of each packet
+_header = struct.Struct('!IIIII')
+
+_available = {2: True, 1: False}
+
+
+def socket_path():
+    """
+    Path of the socket of the server libpulse would connect to, None if that's not a single local
+    socket (e.g. `tcp:host` or a list of servers to try), which only libpulse supports.
+    """
+    server = os.environ.get('PULSE_SERVER', '').strip()
+
+    if server.startswith('unix:') and ' ' not in server:
+        return server[5:]
+
+    if server.startswith('/') and ' ' not in server:
+        return server
+
+    if server:
+        return None
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or f'/run/user/{os.getuid()}'
+    return os.path.join(runtime_dir, 'pulse', 'native')
+
+
+def read_cookie():
+    """
+    Returns the cookie authorizing us, zeros if there's none and the server is left to check our credentials.
+    """
+    config_dir = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    paths = [
+        os.environ.get('PULSE_COOKIE'),
+        os.path.join(config_dir, 'pulse', 'cookie'),
+        os.path.expanduser('~/.pulse-cookie'),
+    ]
+
+    for path in paths:
+        if not path:
+            continue
+
+        try:
+            with open(path, 'rb') as file:
+                cookie = file.read(COOKIE_LENGTH)
+
+            if len(cookie) == COOKIE_LENGTH:
+                return cookie
+
+        except OSError:
+            pass
+
+    log.debug('No cookie found')
+    return bytes(COOKIE_LENGTH)
+
+
+class NativeConnection:
+    """
+    Connection speaking the native protocol over the server's Unix socket, without libpulse.
+
+    Commands are queued as they're issued and written together, any number of them can be in flight
+    at once. Replies are dispatched to the handler registered for their tag. Runs queries the same
+    way Connection does, see run().
+    """
+
+    # seconds a query may take, including connecting if necessary
+    timeout = 3.0
+
+    # seconds connecting and authorizing may take
+    connect_timeout = 1.0
+
+    # there's no libpulse context, queries send their commands through the connection itself
+    context = None
+
+    def __init__(self, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS, path=None):
+        self.timings = {}
+        self.flags = flags
+        self.path = path or socket_path()
+        # version of the protocol agreed on
+        self.version = None
+
+        if timeout is not None:
+            self.timeout = timeout
+
+        if connect_timeout is not None:
+            self.connect_timeout = connect_timeout
+        elif flags & libpulse.CONTEXT_NOFAIL:
+            # waiting for the server to show up may take as long as the query itself
+            self.connect_timeout = self.timeout
+
+        self._socket = None
+        self._ready = False
+        self._error = None
+        self._timed_out = None
+        self._connect_started = None
+        self._received = bytearray()
+        self._outgoing = bytearray()
+        self._handlers = {}
+        # 0 is never handed out, telling issued commands from failed ones
+        self._tags = count(1)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def failed(self):
+        return self._error is not None
+
+    def connect(self):
+        self._connect_started = monotonic()
+        trace.mark('state', 'connecting')
+
+        if not self.path:
+            self._fail('unsupported', f'unsupported server {os.environ.get("PULSE_SERVER")}')
+            return
+
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.connect_timeout)
+
+            try:
+                sock.connect(self.path)
+                break
+            except socket.timeout:
+                sock.close()
+                self._fail('timeout', f'not connected after {self.connect_timeout}s')
+                return
+            except OSError as e:
+                sock.close()
+
+                # with NOFAIL, wait for the server to show up for as long as connecting may take
+                if self.flags & libpulse.CONTEXT_NOFAIL and monotonic() - self._connect_started < self.connect_timeout:
+                    time.sleep(0.05)
+                    continue
+
+                self._fail('access_denied' if isinstance(e, PermissionError) else 'no_server', e.strerror)
+                return
+
+        self._socket = sock
+        self.timings['connect'] = monotonic() - self._connect_started
+        trace.mark('state', 'authorizing')
+
+        self.send(COMMAND_AUTH, tagstruct.Writer().u32(PROTOCOL_VERSION).arbitrary(read_cookie()), self._auth_cb)
+        self._flush(credentials=True)
+
+        # sent without waiting for the reply to authorizing, servers older than version 13 aren't supported
+        name = tagstruct.Writer().proplist({'application.name': 'ShellVolumeMixer'})
+        self.send(COMMAND_SET_CLIENT_NAME, name, self._client_name_cb)
+
+    def close(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def lock(self):
+        return nullcontext()
+
+    def notify(self):
+        pass
+
+    def error(self):
+        """
+        Returns the success/error envelope telling why the connection failed or the last query didn't
+        complete, as Connection.error() does.
+        """
+        if not self._error and self._timed_out is not None:
+            code, message = 'timeout', f'no answer within {self._timed_out}s'
+        else:
+            code, message = self._error or ('failed', 'unknown error')
+            message = f'context failed: {message}'
+
+        return {
+            'success': False,
+            'error': message,
+            'code': code,
+            'retry': RETRY[code],
+        }
+
+    def _fail(self, code, message):
+        if self._error:
+            return
+
+        log.debug('Connection failed:', message)
+        trace.mark('state', 'failed')
+        self._error = (code, message)
+        self.close()
+
+    def _auth_cb(self, reader, error):
+        if reader is None:
+            self._fail(ERROR_CODES.get(error, 'access_denied'), f'authorizing failed ({error})')
+            return
+
+        version = reader.u32() & PROTOCOL_VERSION_MASK
+
+        if version < 13:
+            self._fail('unsupported', f'protocol version {version}')
+            return
+
+        self.version = min(version, PROTOCOL_VERSION)
+        log.debug('Protocol version', self.version)
+
+    def _client_name_cb(self, reader, error):
+        if reader is None:
+            self._fail(ERROR_CODES.get(error, 'failed'), f'setting the name failed ({error})')
+            return
+
+        self._ready = True
+        self.timings['authorize'] = monotonic() - self._connect_started - self.timings['connect']
+        trace.mark('state', 'ready')
+
+    def send(self, command, payload, handler=None):
+        """
+        Queues a command, `handler(reader, error)` being called with a reader of the reply or None and the
+        error received.
+
+        Returns the command's tag, None if the connection failed.
+        """
+        if self.failed:
+            return None
+
+        tag = next(self._tags)
+        packet = bytes(tagstruct.Writer().u32(command).u32(tag)) + bytes(payload)
+
+        self._outgoing += _header.pack(len(packet), CONTROL_CHANNEL, 0, 0, 0) + packet
+
+        if handler:
+            self._handlers[tag] = handler
+
+        return tag
+
+    def cancel(self, tag):
+        """
+        Forgets about a command, its reply is dropped once it arrives.
+        """
+        self._handlers.pop(tag, None)
+
+    def _flush(self, credentials=False):
+        if not self._outgoing or not self._socket:
+            return
+
+        data = bytes(self._outgoing)
+        self._outgoing.clear()
+
+        try:
+            # servers accept a client running as the same user without a cookie
+            if credentials and hasattr(socket, 'SCM_CREDENTIALS'):
+                ucred = struct.pack('iII', os.getpid(), os.getuid(), os.getgid())
+                sent = self._socket.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_CREDENTIALS, ucred)])
+                data = data[sent:]
+
+            self._socket.sendall(data)
+
+        except OSError as e:
+            self._fail('terminated', f'sending failed: {e}')
+
+    def iterate(self, timeout):
+        """
+        Sends what was queued and dispatches replies, waiting up to `timeout` seconds for any to arrive.
+
+        Returns the number of packets dispatched, a negative value on errors.
+        """
+        if not self._socket:
+            self._fail('failed', 'not connected')
+
+        self._flush()
+
+        if self.failed:
+            return -1
+
+        try:
+            readable, _, _ = select.select([self._socket], [], [], max(0, timeout))
+
+            if not readable:
+                return 0
+
+            data = self._socket.recv(65536)
+
+        except OSError as e:
+            self._fail('terminated', f'receiving failed: {e}')
+            return -1
+
+        if not data:
+            self._fail('terminated', 'connection closed by the server')
+            return -1
+
+        self._received += data
+        return self._dispatch()
+
+    def _dispatch(self):
+        dispatched = 0
+
+        while len(self._received) >= _header.size:
+            length, channel, _, _, _ = _header.unpack_from(self._received)
+
+            if len(self._received) < _header.size + length:
+                break
+
+            packet = bytes(self._received[_header.size:_header.size + length])
+            del self._received[:_header.size + length]
+
+            if channel != CONTROL_CHANNEL:
+                continue
+
+            try:
+                self._handle(tagstruct.Reader(packet))
+            except (tagstruct.Error, IndexError, ValueError, struct.error) as e:
+                self._fail('failed', f'invalid packet: {e}')
+                return -1
+
+            dispatched += 1
+
+        return dispatched
+
+    def _handle(self, reader):
+        command = reader.u32()
+        tag = reader.u32()
+
+        if command not in (COMMAND_REPLY, COMMAND_ERROR):
+            log.debug('Ignoring command', command)
+            return
+
+        handler = self._handlers.pop(tag, None)
+
+        if not handler:
+            log.debug('No handler for reply', tag)
+            return
+
+        if command == COMMAND_ERROR:
+            handler(None, reader.u32())
+        else:
+            handler(reader, None)
+
+    def flush(self):
+        """
+        Dispatches all replies received so far, without blocking.
+        """
+        while self.iterate(0) > 0:
+            pass
+
+    def subscribe(self, mask, callback):
+        log.debug('Subscribing is not supported by the native backend')
+        return False
+
+    def run(self, start, done, timeout=None):
+        """
+        Sends and receives until `done()` returns true or the deadline passed.
+
+        `start()` is called once, as soon as the connection is ready. Returns False if the connection
+        failed, didn't get ready in time or `done()` still isn't true at the deadline, see error().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        connect_deadline = (self._connect_started or monotonic()) + self.connect_timeout
+        started = None
+        self._timed_out = None
+
+        while True:
+            if started and done():
+                break
+
+            if self.failed:
+                return False
+
+            now = monotonic()
+
+            if not self._ready and now >= connect_deadline:
+                trace.mark('connect_timeout')
+                self._fail('timeout', f'not connected after {self.connect_timeout}s')
+                return False
+
+            remaining = deadline - now
+
+            if remaining <= 0:
+                log.debug(f'Stopping query after {timeout}s')
+                trace.mark('timeout')
+
+                if not started:
+                    self._fail('timeout', f'not connected after {timeout}s')
+                    return False
+
+                self._timed_out = timeout
+                return False
+
+            if self._ready and not started:
+                started = now
+                start()
+                continue
+
+            if not started:
+                remaining = min(remaining, connect_deadline - now)
+
+            if self.iterate(remaining) < 0:
+                return False
+
+        return True
+
+
+class NativeQuery(Pulseaudio):
+    """
+    Queries objects through a NativeConnection, decoding the tagstructs of the replies into the same
+    records the libpulse decoders produce.
+    """
+
+    connection_class = NativeConnection
+
+    # commands querying a single object by index or name, and all of them
+    info_command = None
+    list_command = None
+
+    def build_callback(self, request):
+        return partial(self.reply_cb, request)
+
+    def get_by_index(self, index, callback):
+        return self._connection.send(self.info_command, tagstruct.Writer().u32(index).string(None), callback)
+
+    def get_by_name(self, name, callback):
+        return self._connection.send(self.info_command, tagstruct.Writer().u32(libpulse.NULL_ID).string(name),
+                                     callback)
+
+    def get_all(self, callback):
+        return self._connection.send(self.list_command, tagstruct.Writer(), callback)
+
+    def release(self):
+        request = self._request
+
+        for tag in request.operations:
+            self._connection.cancel(tag)
+
+        request.operations = []
+        request.pending = 0
+
+    def reply_cb(self, request, reader, error):
+        if not request.received:
+            request.received = True
+            trace.mark('first_callback', type(self).__name__)
+
+        if reader is not None:
+            started = time.perf_counter() if trace.ENABLED else None
+
+            stream = self.stream
+
+            while not reader.eof:
+                index, item = self.cb_data(reader)
+
+                if stream:
+                    stream(self, index, item)
+                else:
+                    request.data[index] = item
+
+            if started is not None:
+                trace.add(f'{type(self).__name__}.cb_data', started)
+
+        elif error != libpulse.ERR_NOENTITY:
+            log.debug('Query failed with error', error)
+
+        request.pending -= 1
+        trace.mark('eol', type(self).__name__)
+
+    def _device_ports(self, reader, fields):
+        """
+        Reads the ports of a sink or source.
+        """
+        version = self._connection.version
+        want_name, want_description, want_type, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'type', 'available'))
+        ports = {}
+
+        for _ in range(reader.u32()):
+            name = reader.string()
+            description = reader.string()
+            reader.u32()  # priority
+            available = reader.u32() if version >= 24 else 0
+            port_type = 0
+
+            if version >= 34:
+                reader.string()  # availability group
+                port_type = reader.u32()
+
+            port = ports[name] = Port()
+
+            if want_name:
+                port.name = name
+
+            if want_description:
+                port.description = description
+
+            if want_type:
+                port.type = port_type
+
+            if want_available:
+                port.available = _available.get(available)
+
+        return ports
+
+    def _formats(self, reader):
+        if self._connection.version >= 21:
+            for _ in range(reader.u8()):
+                reader.format_info()
+
+
+class NativeCards(NativeQuery):
+    _property_keys = Cards._property_keys
+
+    info_command = COMMAND_GET_CARD_INFO
+    list_command = COMMAND_GET_CARD_INFO_LIST
+
+    def cb_data(self, reader):
+        fields = self.fields
+        version = self._connection.version
+        card = Card()
+
+        index = reader.u32()
+        name = reader.string()
+        reader.u32()  # owner module
+        reader.string()  # driver
+        profiles = self._profiles(reader, sub(fields, 'profiles'))
+        active_profile = reader.string()
+        properties = reader.proplist(self._wanted_properties())
+        ports = self._ports(reader, sub(fields, 'ports')) if version >= 26 else {}
+
+        if wants(fields, 'index'):
+            card.index = index
+
+        if wants(fields, 'alsaCard'):
+            card.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            card.name = name
+
+        if wants(fields, 'description'):
+            card.description = properties.get('device.description') or properties.get('alsa.card_name')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            card.properties = self._exported(properties)
+
+        if wants(fields, 'active_profile'):
+            card.active_profile = active_profile
+
+        if wants(fields, 'profiles'):
+            card.profiles = profiles
+
+        if wants(fields, 'ports'):
+            card.ports = ports
+
+        return index, card
+
+    def _profiles(self, reader, fields):
+        version = self._connection.version
+        want_name, want_description, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'available'))
+        profiles = {}
+
+        for _ in range(reader.u32()):
+            name = reader.string()
+            description = reader.string()
+            reader.u32()  # sinks
+            reader.u32()  # sources
+            reader.u32()  # priority
+            available = reader.u32() if version >= 29 else 1
+
+            profile = profiles[name] = Profile()
+
+            if want_name:
+                profile.name = name
+
+            if want_description:
+                profile.description = description
+
+            if want_available:
+                profile.available = bool(available)
+
+        return profiles
+
+    def _ports(self, reader, fields):
+        version = self._connection.version
+        want_name, want_description, want_direction, want_available = (
+            wants(fields, key) for key in ('name', 'description', 'direction', 'available'))
+        ports = {}
+
+        for _ in range(reader.u32()):
+            name = reader.string()
+            description = reader.string()
+            reader.u32()  # priority
+            available = reader.u32()
+            direction = reader.u8()
+            reader.proplist(())
+
+            for _ in range(reader.u32()):
+                reader.string()  # profile
+
+            if version >= 27:
+                reader.s64()  # latency offset
+
+            if version >= 34:
+                reader.string()  # availability group
+                reader.u32()  # type
+
+            port = ports[name] = Port()
+
+            if want_name:
+                port.name = name
+
+            if want_description:
+                port.description = description
+
+            if want_direction:
+                port.direction = 'out' if direction == 1 else 'in'
+
+            if want_available:
+                port.available = _available.get(available)
+
+        return ports
+
+
+class NativeSinks(NativeQuery):
+    _property_keys = Sinks._property_keys
+    _volumes = True
+
+    info_command = COMMAND_GET_SINK_INFO
+    list_command = COMMAND_GET_SINK_INFO_LIST
+
+    def cb_data(self, reader):
+        fields = self.fields
+        version = self._connection.version
+        sink = Sink()
+
+        index = reader.u32()
+        name = reader.string()
+        description = reader.string()
+        reader.sample_spec()
+        positions = reader.channel_map()
+        reader.u32()  # owner module
+        values = reader.cvolume()
+        reader.boolean()  # mute
+        reader.u32()  # monitor source
+        reader.string()  # monitor source name
+        reader.usec()  # latency
+        reader.string()  # driver
+        reader.u32()  # flags
+        properties = reader.proplist(self._wanted_properties())
+        reader.usec()  # configured latency
+        card = libpulse.NULL_ID
+        ports = {}
+        active_port = None
+        # what libpulse assumes for older servers
+        base_volume = volume.NORM
+        volume_steps = volume.NORM + 1
+
+        if version >= 15:
+            base_volume = reader.volume()
+            reader.u32()  # state
+            volume_steps = reader.u32()
+            card = reader.u32()
+
+        if version >= 16:
+            ports = self._device_ports(reader, sub(fields, 'ports'))
+            active_port = reader.string()
+
+        self._formats(reader)
+
+        if wants(fields, 'index'):
+            sink.index = index
+
+        if wants(fields, 'alsaCard'):
+            sink.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            sink.name = name
+
+        if wants(fields, 'description'):
+            sink.description = description or properties.get('device.description')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            sink.properties = self._exported(properties)
+
+        if wants(fields, 'card'):
+            sink.card = card if card != libpulse.NULL_ID else None
+
+        if wants(fields, 'active_port'):
+            sink.active_port = active_port
+
+        if wants(fields, 'ports'):
+            sink.ports = ports
+
+        if wants(fields, 'volume'):
+            sink.volume = volume.read(sub(fields, 'volume'), list(values), positions, base_volume, volume_steps)
+
+        return index, sink
+
+
+class NativeSources(NativeQuery):
+    _property_keys = Sources._property_keys
+    _volumes = True
+
+    info_command = COMMAND_GET_SOURCE_INFO
+    list_command = COMMAND_GET_SOURCE_INFO_LIST
+
+    def cb_data(self, reader):
+        fields = self.fields
+        version = self._connection.version
+        source = Source()
+
+        index = reader.u32()
+        name = reader.string()
+        description = reader.string()
+        reader.sample_spec()
+        positions = reader.channel_map()
+        reader.u32()  # owner module
+        values = reader.cvolume()
+        reader.boolean()  # mute
+        monitor_of_sink = reader.u32()
+        reader.string()  # monitored sink name
+        reader.usec()  # latency
+        reader.string()  # driver
+        reader.u32()  # flags
+        properties = reader.proplist(self._wanted_properties())
+        reader.usec()  # configured latency
+        card = libpulse.NULL_ID
+        ports = {}
+        active_port = None
+        # what libpulse assumes for older servers
+        base_volume = volume.NORM
+        volume_steps = volume.NORM + 1
+
+        if version >= 15:
+            base_volume = reader.volume()
+            reader.u32()  # state
+            volume_steps = reader.u32()
+            card = reader.u32()
+
+        if version >= 16:
+            ports = self._device_ports(reader, sub(fields, 'ports'))
+            active_port = reader.string()
+
+        self._formats(reader)
+
+        if wants(fields, 'index'):
+            source.index = index
+
+        if wants(fields, 'alsaCard'):
+            source.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            source.name = name
+
+        if wants(fields, 'description'):
+            source.description = description or properties.get('device.description')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            source.properties = self._exported(properties)
+
+        if wants(fields, 'card'):
+            source.card = card if card != libpulse.NULL_ID else None
+
+        if wants(fields, 'monitor_of_sink'):
+            source.monitor_of_sink = monitor_of_sink if monitor_of_sink != libpulse.NULL_ID else None
+
+        if wants(fields, 'active_port'):
+            source.active_port = active_port
+
+        if wants(fields, 'ports'):
+            source.ports = ports
+
+        if wants(fields, 'volume'):
+            source.volume = volume.read(sub(fields, 'volume'), list(values), positions, base_volume, volume_steps)
+
+        return index, source
+
+
+class NativeSinkInputs(NativeQuery):
+    _property_keys = SinkInputs._property_keys
+    _derived_fields = SinkInputs._derived_fields
+    _volumes = True
+
+    info_command = COMMAND_GET_SINK_INPUT_INFO
+    list_command = COMMAND_GET_SINK_INPUT_INFO_LIST
+
+    def get_by_index(self, index, callback):
+        return self._connection.send(self.info_command, tagstruct.Writer().u32(index), callback)
+
+    def get_by_name(self, name, callback):
+        return None
+
+    def cb_data(self, reader):
+        fields = self.fields
+        version = self._connection.version
+        sink_input = SinkInput()
+
+        index = reader.u32()
+        name = reader.string()
+        reader.u32()  # owner module
+        client = reader.u32()
+        sink = reader.u32()
+        reader.sample_spec()
+        positions = reader.channel_map()
+        values = reader.cvolume()
+        reader.usec()  # buffer latency
+        reader.usec()  # sink latency
+        reader.string()  # resample method
+        reader.string()  # driver
+        # what libpulse assumes for older servers
+        mute = False
+        properties = {}
+        corked = False
+        has_volume = True
+
+        if version >= 11:
+            mute = reader.boolean()
+
+        if version >= 13:
+            properties = reader.proplist(self._wanted_properties())
+
+        if version >= 19:
+            corked = reader.boolean()
+
+        if version >= 20:
+            has_volume = reader.boolean()
+            reader.boolean()  # volume writable
+
+        if version >= 21:
+            reader.format_info()
+
+        if wants(fields, 'index'):
+            sink_input.index = index
+
+        if wants(fields, 'name'):
+            sink_input.name = name
+
+        if wants(fields, 'application'):
+            sink_input.application = properties.get('application.name')
+
+        if wants(fields, 'binary'):
+            sink_input.binary = properties.get('application.process.binary')
+
+        if wants(fields, 'pid'):
+            sink_input.pid = self._process_id(properties)
+
+        if wants(fields, 'icon'):
+            sink_input.icon = properties.get('application.icon_name')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            sink_input.properties = self._exported(properties)
+
+        if wants(fields, 'client'):
+            sink_input.client = client if client != libpulse.NULL_ID else None
+
+        if wants(fields, 'sink'):
+            sink_input.sink = sink if sink != libpulse.NULL_ID else None
+
+        if wants(fields, 'mute'):
+            sink_input.mute = mute
+
+        if wants(fields, 'corked'):
+            sink_input.corked = corked
+
+        if wants(fields, 'volume'):
+            sink_input.volume = volume.read(sub(fields, 'volume'), list(values), positions) if has_volume else None
+
+        return index, sink_input
+
+
+class NativeServerInfo(NativeQuery):
+    identity = ServerInfo.identity
+
+    def get_all(self, callback):
+        return self._connection.send(COMMAND_GET_SERVER_INFO, tagstruct.Writer(), callback)
+
+    def reply_cb(self, request, reader, error):
+        # there's only one server, its info isn't keyed by index
+        if reader is not None:
+            request.data = self.cb_data(reader)
+        else:
+            log.debug('No server info received')
+
+        request.pending -= 1
+
+    def cb_data(self, reader):
+        server_name = reader.string()
+        server_version = reader.string()
+        user_name = reader.string()
+        host_name = reader.string()
+        reader.sample_spec()
+        default_sink_name = reader.string()
+        default_source_name = reader.string()
+        cookie = reader.u32()
+
+        return {
+            'user_name': user_name,
+            'host_name': host_name,
+            'server_version': server_version,
+            'server_name': server_name,
+            'default_sink_name': default_sink_name,
+            'default_source_name': default_source_name,
+            'cookie': cookie,
+        }
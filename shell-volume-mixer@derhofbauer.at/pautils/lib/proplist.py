@@ -0,0 +1,56 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ctypes import byref, c_void_p
+
+from . import log
+from . import libpulse
+
+
+def decode(pa_proplist, prefixes=()):
+    """
+    Walks a proplist once, returning the properties with keys starting with any of `prefixes`.
+
+    Values of other keys are never read.
+    """
+    properties = {}
+
+    if not pa_proplist:
+        return properties
+
+    state = c_void_p()
+
+    try:
+        while True:
+            key = libpulse.proplist_iterate(pa_proplist, byref(state))
+
+            if not key:
+                break
+
+            key = key.decode('utf8', 'replace')
+
+            if not key.startswith(prefixes):
+                continue
+
+            value = libpulse.proplist_gets(pa_proplist, key.encode('utf8'))
+
+            if value is not None:
+                properties[key] = value.decode('utf8', 'replace')
+
+    except Exception as e:
+        log.debug('Reading properties failed:', e)
+
+    return properties
@@ -15,120 +15,237 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import abc
-from time import sleep
+from time import perf_counter
 
 from . import log
 from . import libpulse
+from . import proplist
+from . import records
+from . import trace
+from . import volume
+from .connection import Connection
+from .fields import wants
+
+
+class Request:
+    """
+    Results and operations of a single query.
+
+    Callbacks are bound to the request they were issued for, operations of an earlier query that
+    didn't finish in time never end up in a later one's results.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.pending = 0
+        self.operations = []
+        self.callback = None
+        self.received = False
+        # callbacks might not run in the thread tracing the query
+        self.trace = trace.current()
 
 
 class Pulseaudio:
-    _pa_state = libpulse.CONTEXT_UNCONNECTED
-    _op_done = False
+    connection_class = Connection
 
-    _iterations_max = 10000
-    _iterations_intrv = 0.0001
+    # properties read to derive fields from, and those fields
+    _property_keys = ()
+    _derived_fields = ('alsaCard', 'description')
 
+    # whether objects have a volume to convert when exporting, see volume.convert()
+    _volumes = False
 
-    _data = {}
-    _error = {
-        'success': False,
-        'error': None,
-    }
+    def __init__(self, connection=None, timeout=None, fields=None, properties=None):
+        # queries run through their own connection unless an already connected one is shared
+        self._owns_connection = connection is None
+        self._connection = self.connection_class(timeout) if self._owns_connection else connection
+        self._context = self._connection.context
 
-    def __init__(self):
-        self._pa_mainloop = libpulse.mainloop_new()
-        self._pa_mainloop_api = libpulse.mainloop_get_api(self._pa_mainloop)
+        # projection of the keys decoded, see fields.parse()
+        self.fields = fields
+        # prefixes of the properties output along with each object, e.g. `device.`
+        self.property_prefixes = tuple(properties or ())
 
-        self._context = libpulse.context_new(self._pa_mainloop_api, b'ShellVolumeMixer')
-        self._context_notify_cb = libpulse.context_notify_cb_t(self.context_notify_cb)
+        # called with each object as soon as it's decoded instead of collecting them, see stream.py
+        self.stream = None
 
-        libpulse.context_set_state_callback(self._context, self._context_notify_cb, None)
+        self._request = Request()
 
     def __enter__(self):
-        libpulse.context_connect(self._context, None, 0, None)
+        if self._owns_connection:
+            self._connection.connect()
+
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        libpulse.context_disconnect(self._context)
-        libpulse.context_unref(self._context)
-        libpulse.mainloop_free(self._pa_mainloop)
+        if self._owns_connection:
+            self._connection.close()
 
-    def context_notify_cb(self, context, userdata):
-        try:
-            self._pa_state = libpulse.context_get_state(context)
-        except Exception:
-            self._pa_state = libpulse.CONTEXT_FAILED
-            log.debug('Context failed')
+    @property
+    def data(self):
+        return self.export(self._request.data)
+
+    def export(self, items):
+        """
+        Turns records by index into the dicts output.
+        """
+        data = records.export(items)
+
+        if self._volumes:
+            volume.convert(data.values(), self.fields)
+
+        return data
+
+    @property
+    def records(self):
+        """
+        Objects of the last query as records, see records.py, instead of the dicts output.
+        """
+        return self._request.data
+
+    @property
+    def done(self):
+        return self._request.pending <= 0
 
     def get_info(self, index=None, name=None):
+        if name:
+            return self.get_batch([name])
+
+        if index is not None and index >= 0:
+            return self.get_batch([index])
+
+        return self.get_batch(None)
+
+    def get_batch(self, lookups):
+        """
+        Queries any number of indexes and names at once, all operations being issued together.
+
+        Passing None instead of a list queries all available data.
+        """
         log.debug('Querying details...')
-        operation = None
-        count = 0
+        self._request = Request()
 
-        while self._pa_state != libpulse.CONTEXT_TERMINATED:
-            if self._op_done:
-                break
+        if not self._connection.run(lambda: self.request(lookups), lambda: self.done):
+            self._request.data = self._connection.error()
 
-            if self._pa_state == libpulse.CONTEXT_FAILED:
-                self._data = self._error
-                self._data['error'] = 'context failed'
-                break
+        self.release()
+        log.debug('Query done')
 
-            if count >= self._iterations_max:
-                log.debug(f'Stopping iterations after {self._iterations_intrv * self._iterations_max}s (bug?)')
-                break
+        return self.data
 
-            if count > 0 and count % (self._iterations_max / 2) == 0:
-                log.debug(f'Delaying after {self._iterations_intrv * count}s (bug?)')
-                sleep(2)
+    def request(self, lookups=None):
+        request = self._request = Request()
+        request.callback = self.build_callback(request)
 
-            if self._pa_state == libpulse.CONTEXT_READY and operation is None:
-                callback = self.build_callback()
+        if lookups is None:
+            log.debug('Requesting all available data')
+            self._issue(self.get_all(request.callback))
+            return
 
-                if name:
-                    log.debug('Requesting details for', name)
-                    operation = self.get_by_name(name.encode('utf8'), callback)
+        for lookup in lookups:
+            log.debug('Requesting details for', lookup)
 
-                elif index and index >= 0:
-                    log.debug('Requesting details for', index)
-                    operation = self.get_by_index(index, callback)
+            if isinstance(lookup, int):
+                self._issue(self.get_by_index(lookup, request.callback))
+            else:
+                self._issue(self.get_by_name(lookup.encode('utf8'), request.callback))
 
-                else:
-                    log.debug('Requesting all available data')
-                    operation = self.get_all(callback)
+    def _issue(self, operation):
+        if not operation:
+            log.debug('Operation failed')
+            return
 
-            libpulse.mainloop_iterate(self._pa_mainloop, 0, None)
-            count += 1
-            sleep(self._iterations_intrv)
+        self._request.operations.append(operation)
+        self._request.pending += 1
+        trace.mark('issue', type(self).__name__, record=self._request.trace)
 
-        if operation:
-            libpulse.operation_unref(operation)
+    def release(self):
+        """
+        Releases the operations of the current query, cancelling those still running.
+        """
+        request = self._request
 
-        log.debug('Query done')
+        with self._connection.lock():
+            for operation in request.operations:
+                if libpulse.operation_get_state(operation) == libpulse.OPERATION_RUNNING:
+                    log.debug('Cancelling operation')
+                    libpulse.operation_cancel(operation)
 
-        return self._data
+                libpulse.operation_unref(operation)
 
-    def pa_cb(self, context, struct, eol, user_data):
+        request.operations = []
+        request.pending = 0
+
+    def pa_cb(self, request, context, struct, eol, user_data):
         log.debug('In callback')
 
+        if not request.received:
+            request.received = True
+            trace.mark('first_callback', type(self).__name__, record=request.trace)
+
         if eol:
-            self._op_done = True
-            log.debug('All done')
+            request.pending -= 1
+            log.debug('Operation done')
+            trace.mark('eol', type(self).__name__, record=request.trace)
+            self._connection.notify()
             return
 
         if not struct or not struct[0]:
             log.debug('No data received for callback')
             return
 
+        started = perf_counter() if trace.ENABLED else None
         item = self.cb_data(struct[0])
 
-        if item and 'index' in item:
-            self._data[item['index']] = item
+        if started is not None:
+            trace.add(f'{type(self).__name__}.cb_data', started, record=request.trace)
+
+        if item is not None:
+            if self.stream:
+                self.stream(self, struct[0].index, item)
+            else:
+                request.data[struct[0].index] = item
 
         log.debug('Callback done')
 
+    def _properties(self, pa_proplist):
+        prefixes = self._wanted_properties()
+
+        if not prefixes:
+            return {}
+
+        return proplist.decode(pa_proplist, prefixes)
+
+    def _wanted_properties(self):
+        """
+        Prefixes of the keys of properties to read, for output or to derive fields from.
+        """
+        fields = self.fields
+        prefixes = self.property_prefixes if wants(fields, 'properties') else ()
+
+        if fields is not None and not prefixes and not any(key in fields for key in self._derived_fields):
+            return ()
+
+        return self._property_keys + prefixes
+
+    def _exported(self, properties):
+        return {key: value for key, value in properties.items() if key.startswith(self.property_prefixes)}
+
+    def _alsa_card(self, properties):
+        try:
+            return int(properties['alsa.card'])
+        except (KeyError, ValueError):
+            log.debug('No property "alsa.card"')
+            return None
+
+    def _process_id(self, properties):
+        try:
+            return int(properties['application.process.id'])
+        except (KeyError, ValueError):
+            return None
+
     @abc.abstractmethod
-    def build_callback(self):
+    def build_callback(self, request):
         return
 
     @abc.abstractmethod
@@ -0,0 +1,121 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compact records of the objects decoded, only the keys wanted being set. They're turned into the plain
+# dicts output as JSON by export().
+
+# decoded names and descriptions by the bytes received, shared by all objects
+_strings = {}
+
+# number of strings kept before starting over, names of devices come and go over time
+_max_strings = 4096
+
+
+def intern(value):
+    """
+    Decodes a string received from libpulse, returning the same str object for the same bytes.
+    """
+    if value is None:
+        return None
+
+    string = _strings.get(value)
+
+    if string is None:
+        if len(_strings) >= _max_strings:
+            _strings.clear()
+
+        string = _strings[value] = value.decode('utf8')
+
+    return string
+
+
+class Record:
+    __slots__ = ()
+
+    # keys holding dicts of records, all other values are output as they are
+    _nested = ()
+
+    # keys holding a single record
+    _records = ()
+
+    def export(self):
+        data = {}
+
+        for key in self.__slots__:
+            try:
+                data[key] = getattr(self, key)
+            except AttributeError:
+                pass
+
+        for key in self._nested:
+            if key in data:
+                data[key] = {name: item.export() for name, item in data[key].items()}
+
+        for key in self._records:
+            if key in data:
+                data[key] = data[key].export()
+
+        return data
+
+
+class Card(Record):
+    __slots__ = ('index', 'alsaCard', 'name', 'description', 'properties', 'active_profile', 'profiles', 'ports')
+    _nested = ('profiles', 'ports')
+
+
+class Profile(Record):
+    __slots__ = ('name', 'description', 'available')
+
+
+class Port(Record):
+    __slots__ = ('name', 'description', 'direction', 'type', 'available')
+
+
+class Sink(Record):
+    __slots__ = ('index', 'alsaCard', 'name', 'description', 'properties', 'card', 'active_port', 'ports', 'volume')
+    _nested = ('ports',)
+    _records = ('volume',)
+
+
+class Source(Record):
+    __slots__ = ('index', 'alsaCard', 'name', 'description', 'properties', 'card', 'monitor_of_sink', 'active_port',
+                 'ports', 'volume')
+    _nested = ('ports',)
+    _records = ('volume',)
+
+
+class SinkInput(Record):
+    __slots__ = ('index', 'name', 'application', 'binary', 'pid', 'icon', 'properties', 'client', 'sink', 'mute',
+                 'corked', 'volume')
+    _records = ('volume',)
+
+
+class Volume(Record):
+    # raw values and channel positions, the other forms are added when exporting, see volume.convert()
+    __slots__ = ('values', 'channels', 'base', 'steps')
+
+
+def export(value):
+    """
+    Turns records, also those nested in dicts, into plain dicts.
+    """
+    if isinstance(value, Record):
+        return value.export()
+
+    if isinstance(value, dict):
+        return {key: export(item) for key, item in value.items()}
+
+    return value
@@ -0,0 +1,370 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import socket
+import stat
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from . import changes
+from . import fields
+from . import graph
+from . import log
+from . import libpulse
+from . import snapshot
+from . import trace
+from .cache import Cache
+from .connection import Connection
+from .libpulse import NULL_ID
+from .serverinfo import ServerInfo
+
+
+class Server:
+    """
+    Answers queries on a single long-lived connection.
+
+    Requests are JSON objects, one per line, e.g. `{"type": "cards", "index": 3}`,
+    `{"type": "sinks", "name": "alsa_output..."}`, `{"type": "cards", "indexes": [3, 7]}` or
+    `{"type": "all"}`, optionally limited to some keys with e.g. `"fields": "index,name"` or with
+    properties like `"properties": ["device."]`. Each one is answered with a single line, containing
+    the same JSON a one-shot call of query.py would have printed.
+
+    `{"type": "graph"}` returns cards, sinks and sources joined, along with indexes by name and ALSA
+    card, see graph.join().
+
+    `{"type": "apply", "changes": [...]}` applies card profiles, sink ports and the default sink at
+    once, see changes.apply().
+
+    Passing the tag of a previous result, e.g. `{"type": "cards", "since": "..."}`, only returns
+    what changed since. As long as no events were received for a type, that's answered without
+    querying the server at all.
+
+    If `threaded`, the mainloop runs in a thread of its own and socket clients are served
+    concurrently, each in a thread of its own.
+    """
+
+    types = snapshot.TYPES
+
+    def __init__(self, timeout=None, threaded=False, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS):
+        self._timeout = timeout
+        self._threaded = threaded
+        self._connect_timeout = connect_timeout
+        self._flags = flags
+        self._lock = threading.RLock()
+        self._connection = None
+        self._retired = []
+        # queries running on each connection, retired ones are closed once they're done
+        self._running = {}
+        self._queries = {}
+        self._server_info = None
+        self._caches = {}
+        self._tags = {}
+        self._events = {}
+        self._subscribed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        for connection in self._retired:
+            connection.close()
+
+        self._retired = []
+
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+            self._queries = {}
+            self._server_info = None
+
+    def _connect(self):
+        with self._lock:
+            if self._connection and not self._connection.failed:
+                return self._connection
+
+            if self._connection:
+                log.debug('Connection lost, reconnecting')
+
+                if self._running.get(self._connection):
+                    # other threads might still be waiting for their queries to fail
+                    self._retired.append(self._connection)
+                else:
+                    self._connection.close()
+
+                self._connection = None
+
+            self._open()
+            return self._connection
+
+    @contextmanager
+    def _connected(self):
+        """
+        The current connection, counted as in use until the query run on it is done.
+        """
+        with self._lock:
+            connection = self._connect()
+            self._running[connection] = self._running.get(connection, 0) + 1
+
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                self._running[connection] -= 1
+
+                if not self._running[connection]:
+                    del self._running[connection]
+
+                    if connection in self._retired:
+                        log.debug('Closing retired connection')
+                        self._retired.remove(connection)
+                        connection.close()
+
+    def _open(self):
+        if self._threaded:
+            from .threaded import ThreadedConnection
+            self._connection = ThreadedConnection(self._timeout, self._connect_timeout, self._flags)
+        else:
+            self._connection = Connection(self._timeout, self._connect_timeout, self._flags)
+
+        self._connection.connect()
+        self._queries = {op_type: snapshot.load(op_type)(self._connection) for op_type in self.types}
+        self._server_info = ServerInfo(self._connection)
+
+        self._tags = {}
+        self._events = dict.fromkeys(self.types, 0)
+
+        mask = libpulse.SUBSCRIPTION_MASK_NULL
+        for facility, facility_mask in snapshot.FACILITIES.values():
+            mask |= facility_mask
+
+        self._subscribed = self._connection.subscribe(mask, self.on_event)
+
+        if not self._subscribed:
+            log.debug('Subscribing failed, changes will always be queried')
+
+    def on_event(self, event_type, index):
+        facility = event_type & libpulse.SUBSCRIPTION_EVENT_FACILITY_MASK
+
+        for op_type, (type_facility, _) in snapshot.FACILITIES.items():
+            if type_facility == facility:
+                self._events[op_type] += 1
+
+    def changes(self, connection, op_type, since, query, server_info):
+        with self._lock:
+            return self._changes(connection, op_type, since, query, server_info)
+
+    def _changes(self, connection, op_type, since, query, server_info):
+        connection.flush()
+
+        # tags only match queries for the same keys, see snapshot.get_changes()
+        key = (op_type, json.dumps([query.fields, query.property_prefixes], sort_keys=True))
+
+        if self._subscribed and since and self._tags.get(key) == (since, self._events[op_type]):
+            log.debug('No events received for', op_type)
+            return {'unchanged': True, 'tag': since}
+
+        # events arriving while querying leave the result tagged for fewer events than were received
+        events = self._events[op_type]
+
+        if op_type not in self._caches:
+            self._caches[op_type] = Cache(op_type)
+
+        result = snapshot.get_changes(connection, op_type, query, server_info, self._caches[op_type], since)
+
+        if 'tag' in result:
+            self._tags[key] = (result['tag'], events)
+        else:
+            self._tags.pop(key, None)
+
+        return result
+
+    def query(self, request):
+        op_types = request.get('type')
+
+        if op_types == 'graph':
+            return self.graph(request)
+
+        if op_types == 'apply':
+            return self.apply(request)
+
+        if isinstance(op_types, str):
+            op_types = snapshot.parse_types(op_types)
+
+        if not isinstance(op_types, list) or not op_types or any(op_type not in self.types for op_type in op_types):
+            return {'success': False, 'error': f'invalid type {request.get("type")}'}
+
+        indexes = request.get('indexes', [])
+        names = request.get('names', [])
+
+        if request.get('index') is not None:
+            indexes = [request['index']]
+
+        if request.get('name'):
+            names = [request['name']]
+
+        if not isinstance(indexes, list) or any(type(index) is not int for index in indexes):
+            return {'success': False, 'error': 'invalid index'}
+
+        if not isinstance(names, list) or any(not isinstance(name, str) for name in names):
+            return {'success': False, 'error': 'invalid name'}
+
+        lookups = indexes + names
+
+        if len(op_types) > 1 and lookups:
+            return {'success': False, 'error': 'need a single type to query by index or name'}
+
+        since = request.get('since')
+
+        if since is not None and (not isinstance(since, str) or len(op_types) > 1 or lookups):
+            return {'success': False, 'error': 'need a single type without indexes or names to query changes'}
+
+        projection = request.get('fields')
+
+        if projection is not None and (not isinstance(projection, (str, list))
+                                       or any(not isinstance(key, str) for key in projection)):
+            return {'success': False, 'error': 'invalid fields'}
+
+        properties = request.get('properties', [])
+
+        if not isinstance(properties, list) or any(not isinstance(prefix, str) for prefix in properties):
+            return {'success': False, 'error': 'invalid properties'}
+
+        valid_lookups = [lookup for lookup in lookups if lookup != NULL_ID]
+
+        if lookups and not valid_lookups:
+            return {}
+
+        with self._connected() as connection:
+            # callbacks of queries running concurrently must not share an instance
+            if self._threaded:
+                queries = {op_type: snapshot.load(op_type)(connection) for op_type in op_types}
+                server_info = ServerInfo(connection)
+            else:
+                queries = {op_type: self._queries[op_type] for op_type in op_types}
+                server_info = self._server_info
+
+            for query in queries.values():
+                query.fields = fields.parse(projection)
+                query.property_prefixes = tuple(properties)
+
+            if since is not None:
+                return self.changes(connection, op_types[0], since, queries[op_types[0]], server_info)
+
+            if len(op_types) > 1:
+                return snapshot.get_info(connection, queries)
+
+            return queries[op_types[0]].get_batch(valid_lookups or None)
+
+    def graph(self, request):
+        properties = request.get('properties', [])
+
+        if not isinstance(properties, list) or any(not isinstance(prefix, str) for prefix in properties):
+            return {'success': False, 'error': 'invalid properties'}
+
+        with self._connected() as connection:
+            # all keys are needed to link objects, queries are set up like those of a threaded server
+            queries = {op_type: snapshot.load(op_type)(connection, properties=properties) for op_type in graph.TYPES}
+
+            return snapshot.get_graph(connection, queries)
+
+    def apply(self, request):
+        invalid = changes.parse(request.get('changes'))
+
+        if invalid:
+            return {'success': False, 'error': invalid}
+
+        with self._connected() as connection:
+            return changes.apply(connection, request['changes'])
+
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+
+        trace.begin(request.get('type') if isinstance(request, dict) else None)
+
+        if not isinstance(request, dict):
+            result = {'success': False, 'error': 'invalid request'}
+        else:
+            result = self.query(request)
+
+        started = perf_counter()
+        output = json.dumps(result)
+        trace.add('json', started)
+        trace.end()
+
+        return output
+
+    def serve_stream(self, infile, outfile):
+        for line in iter(infile.readline, ''):
+            line = line.strip()
+
+            if not line:
+                continue
+
+            outfile.write(self.handle(line) + '\n')
+            outfile.flush()
+
+    def serve_socket(self, path):
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            mode = None
+
+        if mode is not None:
+            # only a socket left behind by a previous server may be replaced
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(f'{path} exists and is not a socket')
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except ConnectionRefusedError:
+                    os.unlink(path)
+                else:
+                    raise FileExistsError(f'{path} is in use by another server')
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(path)
+            sock.listen()
+
+            try:
+                while True:
+                    client, _ = sock.accept()
+                    log.debug('Client connected')
+
+                    if self._threaded:
+                        threading.Thread(target=self.serve_client, args=(client,), daemon=True).start()
+                    else:
+                        self.serve_client(client)
+
+            finally:
+                os.unlink(path)
+
+    def serve_client(self, client):
+        with client, client.makefile('r', encoding='utf8') as infile, \
+                client.makefile('w', encoding='utf8') as outfile:
+            try:
+                self.serve_stream(infile, outfile)
+            except OSError as e:
+                log.debug('Client gone:', e)
@@ -0,0 +1,72 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from .pulseaudio import Pulseaudio
+from . import log
+from . import libpulse
+
+
+def _decode(value):
+    return value.decode('utf8') if value else None
+
+
+class ServerInfo(Pulseaudio):
+    def build_callback(self, request):
+        return libpulse.server_info_cb_t(partial(self.server_info_cb, request))
+
+    def get_by_index(self, index, callback):
+        return None
+
+    def get_by_name(self, name, callback):
+        return None
+
+    def get_all(self, callback):
+        return libpulse.context_get_server_info(self._context, callback, None)
+
+    def server_info_cb(self, request, context, struct, user_data):
+        # there's only one server, so no end of list is signalled
+        if struct and struct[0]:
+            request.data = self.cb_data(struct[0])
+        else:
+            log.debug('No server info received')
+
+        request.pending -= 1
+        self._connection.notify()
+
+    def cb_data(self, pa_server):
+        return {
+            'user_name': _decode(pa_server.user_name),
+            'host_name': _decode(pa_server.host_name),
+            'server_version': _decode(pa_server.server_version),
+            'server_name': _decode(pa_server.server_name),
+            'default_sink_name': _decode(pa_server.default_sink_name),
+            'default_source_name': _decode(pa_server.default_source_name),
+            'cookie': pa_server.cookie,
+        }
+
+    @property
+    def identity(self):
+        """
+        Identifies the server instance, changing whenever the server is restarted.
+        """
+        data = self.data
+
+        if not data or 'cookie' not in data:
+            return ''
+
+        return f'{data["host_name"]}/{data["cookie"]:08x}'
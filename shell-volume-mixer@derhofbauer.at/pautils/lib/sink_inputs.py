@@ -0,0 +1,99 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from .pulseaudio import Pulseaudio
+from . import libpulse
+from . import volume
+from .fields import sub, wants
+from .records import SinkInput, intern
+
+
+class SinkInputs(Pulseaudio):
+    """
+    Streams of applications playing to sinks.
+
+    The application's name, binary, process id and icon are read from the stream's properties, in the
+    same single pass over them that reads the properties output.
+    """
+
+    _property_keys = ('application.name', 'application.process.binary', 'application.process.id',
+                      'application.icon_name')
+    _derived_fields = ('application', 'binary', 'pid', 'icon')
+    _volumes = True
+
+    def build_callback(self, request):
+        return libpulse.sink_input_info_cb_t(partial(self.pa_cb, request))
+
+    def get_by_index(self, index, callback):
+        return libpulse.context_get_sink_input_info(self._context, index, callback, None)
+
+    def get_by_name(self, name, callback):
+        # streams can't be looked up by name
+        return None
+
+    def get_all(self, callback):
+        return libpulse.context_get_sink_input_info_list(self._context, callback, None)
+
+    def cb_data(self, pa_input):
+        fields = self.fields
+        properties = self._properties(pa_input.proplist)
+        sink_input = SinkInput()
+
+        if wants(fields, 'index'):
+            sink_input.index = pa_input.index
+
+        if wants(fields, 'name'):
+            sink_input.name = intern(pa_input.name)
+
+        if wants(fields, 'application'):
+            sink_input.application = properties.get('application.name')
+
+        if wants(fields, 'binary'):
+            sink_input.binary = properties.get('application.process.binary')
+
+        if wants(fields, 'pid'):
+            sink_input.pid = self._process_id(properties)
+
+        if wants(fields, 'icon'):
+            sink_input.icon = properties.get('application.icon_name')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            sink_input.properties = self._exported(properties)
+
+        if wants(fields, 'client'):
+            sink_input.client = pa_input.client if pa_input.client != libpulse.NULL_ID else None
+
+        if wants(fields, 'sink'):
+            sink_input.sink = pa_input.sink if pa_input.sink != libpulse.NULL_ID else None
+
+        if wants(fields, 'mute'):
+            sink_input.mute = bool(pa_input.mute)
+
+        if wants(fields, 'corked'):
+            sink_input.corked = bool(pa_input.corked)
+
+        if wants(fields, 'volume'):
+            sink_input.volume = None
+
+            if pa_input.has_volume:
+                cvolume = pa_input.volume
+                channel_map = pa_input.channel_map
+                sink_input.volume = volume.read(sub(fields, 'volume'), cvolume.values[:cvolume.channels],
+                                                channel_map.map[:channel_map.channels])
+
+        return sink_input
@@ -14,14 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .pulseaudio import Pulseaudio
-from . import log
+from functools import partial
+
+from .devices import Devices
 from . import libpulse
+from .fields import sub, wants
+from .records import Sink, intern
+
 
+class Sinks(Devices):
+    _port_info = libpulse.sink_port_info
 
-class Sinks(Pulseaudio):
-    def build_callback(self):
-        return libpulse.sink_info_cb_t(self.pa_cb)
+    def build_callback(self, request):
+        return libpulse.sink_info_cb_t(partial(self.pa_cb, request))
 
     def get_by_index(self, index, callback):
         return libpulse.context_get_sink_info_by_index(self._context, index, callback, None)
@@ -33,51 +38,39 @@ class Sinks(Pulseaudio):
         return libpulse.context_get_sink_info_list(self._context, callback, None)
 
     def cb_data(self, pa_sink):
-        sink_name = pa_sink.name.decode('utf8')
-        description = pa_sink.description.decode('utf8')
-
-        if not description:
-            try:
-                description = libpulse.proplist_gets(pa_sink.proplist, b'device.description')
-                description = description.decode('utf8') if description else None
-            except Exception:
-                log.debug('No property "device.description"')
-                description = sink_name
-
-        try:
-            alsa_card = libpulse.proplist_gets(pa_sink.proplist, b'alsa.card')
-            alsa_card = int(alsa_card.decode('utf8')) if alsa_card else None
-        except Exception:
-            log.debug('No property "alsa.card"')
-            alsa_card = None
-
-        sink = {
-            'index': pa_sink.index,
-            'alsaCard': alsa_card,
-            'name': sink_name,
-            'description': description,
-            'card': pa_sink.card if pa_sink.card != libpulse.NULL_ID else None,
-            'active_port': None,
-            'ports': {
-            },
-        }
-
-        if pa_sink.active_port and pa_sink.active_port[0]:
-            ap = pa_sink.active_port[0]
-            sink['active_port'] = ap.name.decode('utf8')
-
-        for index in range(0, pa_sink.n_ports):
-            if not pa_sink.ports[index] or not pa_sink.ports[index][0]:
-                continue
-
-            port = pa_sink.ports[index][0]
-            name = port.name.decode('utf8')
-
-            sink['ports'][name] = {
-                'name': name,
-                'description': port.description.decode('utf8'),
-                'type': port.type,
-                'available': True if port.available == 2 else (False if port.available == 1 else None),
-            }
+        fields = self.fields
+        properties = self._properties(pa_sink.proplist)
+        sink = Sink()
+
+        if wants(fields, 'index'):
+            sink.index = pa_sink.index
+
+        if wants(fields, 'alsaCard'):
+            sink.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            sink.name = intern(pa_sink.name)
+
+        if wants(fields, 'description'):
+            sink.description = intern(pa_sink.description) or properties.get('device.description')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            sink.properties = self._exported(properties)
+
+        if wants(fields, 'card'):
+            sink.card = pa_sink.card if pa_sink.card != libpulse.NULL_ID else None
+
+        if wants(fields, 'active_port'):
+            sink.active_port = None
+
+            if pa_sink.active_port and pa_sink.active_port[0]:
+                ap = pa_sink.active_port[0]
+                sink.active_port = intern(ap.name)
+
+        if wants(fields, 'ports'):
+            sink.ports = self._ports(pa_sink, sub(fields, 'ports'))
+
+        if wants(fields, 'volume'):
+            sink.volume = self._volume(pa_sink, sub(fields, 'volume'))
 
         return sink
@@ -0,0 +1,153 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from importlib import import_module
+
+from . import graph
+from . import log
+from . import libpulse
+
+# module and class of each type, only imported when needed
+TYPES = {
+    'cards': ('cards', 'Cards'),
+    'sinks': ('sinks', 'Sinks'),
+    'sources': ('sources', 'Sources'),
+    'sink_inputs': ('sink_inputs', 'SinkInputs'),
+}
+
+# the same for the native protocol backend, see native.py
+NATIVE_TYPES = {
+    'cards': ('native', 'NativeCards'),
+    'sinks': ('native', 'NativeSinks'),
+    'sources': ('native', 'NativeSources'),
+    'sink_inputs': ('native', 'NativeSinkInputs'),
+}
+
+# subscription event facility and mask of each type
+FACILITIES = {
+    'cards': (libpulse.SUBSCRIPTION_EVENT_CARD, libpulse.SUBSCRIPTION_MASK_CARD),
+    'sinks': (libpulse.SUBSCRIPTION_EVENT_SINK, libpulse.SUBSCRIPTION_MASK_SINK),
+    'sources': (libpulse.SUBSCRIPTION_EVENT_SOURCE, libpulse.SUBSCRIPTION_MASK_SOURCE),
+    'sink_inputs': (libpulse.SUBSCRIPTION_EVENT_SINK_INPUT, libpulse.SUBSCRIPTION_MASK_SINK_INPUT),
+}
+
+
+def load(op_type, native=False):
+    module, cls = (NATIVE_TYPES if native else TYPES)[op_type]
+    return getattr(import_module(f'.{module}', __package__), cls)
+
+
+def parse_types(arg):
+    """
+    Splits a comma separated list of types, `all` meaning every type available.
+    """
+    if arg == 'all':
+        return list(TYPES)
+
+    return [op_type for op_type in arg.split(',') if op_type]
+
+
+def get_info(connection, queries):
+    """
+    Lists all objects of several types at once, with queries sharing the same connection.
+
+    All operations are issued together, the result is returned as soon as every one of them is done.
+    """
+    log.debug('Querying snapshot of', ', '.join(queries))
+
+    def start():
+        for query in queries.values():
+            query.request()
+
+    def done():
+        return all(query.done for query in queries.values())
+
+    success = connection.run(start, done)
+
+    for query in queries.values():
+        query.release()
+
+    if not success:
+        return connection.error()
+
+    return {op_type: query.data for op_type, query in queries.items()}
+
+
+def get_servers(fanout, queries, lookups=None):
+    """
+    Queries several servers at once, see fanout.py, returning the result of each by server.
+
+    `queries` are the queries of each server by type, each server's result is either its data by type
+    or the error its connection failed with. Lookups are only meant for queries of a single type.
+    """
+    log.debug('Querying servers', ', '.join(queries))
+
+    def job(server_queries):
+        def start():
+            for query in server_queries.values():
+                query.request(lookups)
+
+        def done():
+            return all(query.done for query in server_queries.values())
+
+        return start, done
+
+    results = fanout.run({server: job(server_queries) for server, server_queries in queries.items()})
+    output = {}
+
+    for server, server_queries in queries.items():
+        for query in server_queries.values():
+            query.release()
+
+        if results[server]:
+            output[server] = {op_type: query.data for op_type, query in server_queries.items()}
+        else:
+            output[server] = fanout.connections[server].error()
+
+    return output
+
+
+def get_graph(connection, queries):
+    """
+    Lists cards, sinks and sources at once, joined to a graph, see graph.join().
+    """
+    result = get_info(connection, queries)
+
+    if 'success' in result:
+        return result
+
+    return graph.join(result)
+
+
+def get_changes(connection, op_type, query, server_info, cache, since=None):
+    """
+    Lists all objects of a type, returning only the changes since the result tagged `since`.
+
+    The server's info is queried along with the objects, to tell whether the server was restarted.
+    Tags of results limited to some fields or with properties only match the same kind of query.
+    """
+    result = get_info(connection, {op_type: query, 'server': server_info})
+
+    if 'success' in result:
+        return result
+
+    server = server_info.identity
+
+    if query.fields is not None or query.property_prefixes:
+        server += json.dumps([query.fields, query.property_prefixes], sort_keys=True)
+
+    return cache.diff(result[op_type], server, since)
@@ -0,0 +1,80 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from .devices import Devices
+from . import libpulse
+from .fields import sub, wants
+from .records import Source, intern
+
+
+class Sources(Devices):
+    _port_info = libpulse.source_port_info
+
+    def build_callback(self, request):
+        return libpulse.source_info_cb_t(partial(self.pa_cb, request))
+
+    def get_by_index(self, index, callback):
+        return libpulse.context_get_source_info_by_index(self._context, index, callback, None)
+
+    def get_by_name(self, name, callback):
+        return libpulse.context_get_source_info_by_name(self._context, name, callback, None)
+
+    def get_all(self, callback):
+        return libpulse.context_get_source_info_list(self._context, callback, None)
+
+    def cb_data(self, pa_source):
+        fields = self.fields
+        properties = self._properties(pa_source.proplist)
+        source = Source()
+
+        if wants(fields, 'index'):
+            source.index = pa_source.index
+
+        if wants(fields, 'alsaCard'):
+            source.alsaCard = self._alsa_card(properties)
+
+        if wants(fields, 'name'):
+            source.name = intern(pa_source.name)
+
+        if wants(fields, 'description'):
+            source.description = intern(pa_source.description) or properties.get('device.description')
+
+        if self.property_prefixes and wants(fields, 'properties'):
+            source.properties = self._exported(properties)
+
+        if wants(fields, 'card'):
+            source.card = pa_source.card if pa_source.card != libpulse.NULL_ID else None
+
+        if wants(fields, 'monitor_of_sink'):
+            monitor_of_sink = pa_source.monitor_of_sink
+            source.monitor_of_sink = monitor_of_sink if monitor_of_sink != libpulse.NULL_ID else None
+
+        if wants(fields, 'active_port'):
+            source.active_port = None
+
+            if pa_source.active_port and pa_source.active_port[0]:
+                ap = pa_source.active_port[0]
+                source.active_port = intern(ap.name)
+
+        if wants(fields, 'ports'):
+            source.ports = self._ports(pa_source, sub(fields, 'ports'))
+
+        if wants(fields, 'volume'):
+            source.volume = self._volume(pa_source, sub(fields, 'volume'))
+
+        return source
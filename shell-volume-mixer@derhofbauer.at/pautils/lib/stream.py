@@ -0,0 +1,57 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+# separators of compact output, without the blanks json.dumps() adds by default
+COMPACT = (',', ':')
+
+
+class Writer:
+    """
+    Writes each object as a line of JSON as soon as it's decoded, e.g.
+    `{"type": "cards", "index": 3, "data": {...}}`, instead of collecting a query's whole result first.
+
+    The output ends with `{"success": true}` once all queries are done, or with the error they failed
+    with. Lines are flushed as they're written, so the reading side can process objects while the
+    remaining ones are still being received.
+    """
+
+    def __init__(self, outfile, compact=False):
+        self._outfile = outfile
+        self._separators = COMPACT if compact else None
+
+    def attach(self, op_type, query):
+        """
+        Has `query` write its objects as they're decoded, as objects of type `op_type`.
+        """
+        def write(query, index, item):
+            self.write({'type': op_type, 'index': index, 'data': query.export({index: item})[index]})
+
+        query.stream = write
+
+    def end(self, result):
+        """
+        Writes the last line, `result` being what the queries returned.
+        """
+        if 'success' in result:
+            self.write(result)
+        else:
+            self.write({'success': True})
+
+    def write(self, item):
+        self._outfile.write(json.dumps(item, separators=self._separators) + '\n')
+        self._outfile.flush()
@@ -0,0 +1,31 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from ctypes import POINTER, c_void_p, cast
+
+
+def items(array, count, cls):
+    """
+    Returns the structures an array of `count` pointers points to, skipping NULL pointers.
+
+    All pointers are read at once and each structure is wrapped a single time, instead of creating
+    pointer objects for every element accessed.
+    """
+    if not count or not array:
+        return []
+
+    from_address = cls.from_address
+    return [from_address(address) for address in cast(array, POINTER(c_void_p * count)).contents if address]
@@ -0,0 +1,297 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tagged structures of the PulseAudio native protocol, the payload of every command and reply sent over
+# the socket. Each value is preceded by a tag telling its type, numbers are in network byte order.
+
+import struct
+
+from .records import intern
+
+STRING = ord('t')
+STRING_NULL = ord('N')
+U32 = ord('L')
+U8 = ord('B')
+U64 = ord('R')
+S64 = ord('r')
+SAMPLE_SPEC = ord('a')
+ARBITRARY = ord('x')
+BOOLEAN_TRUE = ord('1')
+BOOLEAN_FALSE = ord('0')
+TIMEVAL = ord('T')
+USEC = ord('U')
+CHANNEL_MAP = ord('m')
+CVOLUME = ord('v')
+PROPLIST = ord('P')
+VOLUME = ord('V')
+FORMAT_INFO = ord('f')
+
+_u32 = struct.Struct('!I')
+_u64 = struct.Struct('!Q')
+_s64 = struct.Struct('!q')
+_sample_spec = struct.Struct('!BBI')
+
+
+class Error(Exception):
+    pass
+
+
+class Reader:
+    """
+    Reads the values of a tagstruct one after another, each getter expecting the tag of its type.
+    """
+
+    def __init__(self, data, offset=0):
+        self._data = data
+        self._offset = offset
+
+    @property
+    def eof(self):
+        return self._offset >= len(self._data)
+
+    def _tag(self, tag):
+        try:
+            found = self._data[self._offset]
+        except IndexError:
+            raise Error(f'Expected {chr(tag)}, reached the end') from None
+
+        if found != tag:
+            raise Error(f'Expected {chr(tag)} at {self._offset}, got {chr(found)}')
+
+        self._offset += 1
+
+    def _unpack(self, layout):
+        try:
+            values = layout.unpack_from(self._data, self._offset)
+        except struct.error as e:
+            raise Error(f'Truncated value at {self._offset}') from e
+
+        self._offset += layout.size
+        return values
+
+    def u32(self):
+        # the most common values, read without going through _tag() and _unpack()
+        offset = self._offset
+
+        try:
+            if self._data[offset] != U32:
+                raise Error(f'Expected L at {offset}, got {chr(self._data[offset])}')
+
+            value = _u32.unpack_from(self._data, offset + 1)[0]
+        except (IndexError, struct.error):
+            raise Error(f'Truncated value at {offset}') from None
+
+        self._offset = offset + 5
+        return value
+
+    def u8(self):
+        self._tag(U8)
+        self._offset += 1
+        return self._data[self._offset - 1]
+
+    def u64(self):
+        self._tag(U64)
+        return self._unpack(_u64)[0]
+
+    def s64(self):
+        self._tag(S64)
+        return self._unpack(_s64)[0]
+
+    def usec(self):
+        self._tag(USEC)
+        return self._unpack(_u64)[0]
+
+    def volume(self):
+        self._tag(VOLUME)
+        return self._unpack(_u32)[0]
+
+    def boolean(self):
+        tag = self._data[self._offset] if not self.eof else None
+
+        if tag not in (BOOLEAN_TRUE, BOOLEAN_FALSE):
+            raise Error(f'Expected a boolean at {self._offset}')
+
+        self._offset += 1
+        return tag == BOOLEAN_TRUE
+
+    def string(self):
+        """
+        Returns a string, None for NULL. Strings are shared, see records.intern().
+        """
+        data = self._data
+        offset = self._offset
+        tag = data[offset] if offset < len(data) else None
+
+        if tag == STRING_NULL:
+            self._offset = offset + 1
+            return None
+
+        if tag != STRING:
+            raise Error(f'Expected t at {offset}')
+
+        end = data.find(b'\0', offset + 1)
+
+        if end < 0:
+            raise Error(f'Unterminated string at {offset}')
+
+        self._offset = end + 1
+        return intern(data[offset + 1:end])
+
+    def arbitrary(self):
+        self._tag(ARBITRARY)
+        length = self._unpack(_u32)[0]
+        value = self._data[self._offset:self._offset + length]
+
+        if len(value) != length:
+            raise Error(f'Truncated value at {self._offset}')
+
+        self._offset += length
+        return value
+
+    def sample_spec(self):
+        self._tag(SAMPLE_SPEC)
+        return self._unpack(_sample_spec)
+
+    def channel_map(self):
+        self._tag(CHANNEL_MAP)
+        return tuple(self._bytes(self._data[self._offset]))
+
+    def cvolume(self):
+        self._tag(CVOLUME)
+        channels = self._data[self._offset]
+        self._offset += 1
+        values = struct.unpack_from(f'!{channels}I', self._data, self._offset)
+        self._offset += 4 * channels
+
+        return values
+
+    def _bytes(self, count):
+        value = self._data[self._offset + 1:self._offset + 1 + count]
+        self._offset += 1 + count
+        return value
+
+    def proplist(self, prefixes=None):
+        """
+        Returns the properties with keys starting with any of `prefixes`, all if None.
+
+        Values of other keys are skipped without being decoded.
+        """
+        self._tag(PROPLIST)
+        properties = {}
+
+        while True:
+            key = self.string()
+
+            if key is None:
+                return properties
+
+            # the length is repeated by the value itself
+            self.u32()
+            value = self.arbitrary()
+
+            if prefixes is None or key.startswith(prefixes):
+                # values are stored including the terminating NUL of strings
+                properties[key] = value.rstrip(b'\0').decode('utf8', 'replace')
+
+    def format_info(self):
+        self._tag(FORMAT_INFO)
+        return self.u8(), self.proplist()
+
+
+class Writer:
+    """
+    Builds a tagstruct, the counterpart of Reader.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def __bytes__(self):
+        return bytes(self._data)
+
+    def u32(self, value):
+        self._data.append(U32)
+        self._data += _u32.pack(value)
+        return self
+
+    def u8(self, value):
+        self._data += bytes((U8, value))
+        return self
+
+    def u64(self, value):
+        self._data.append(U64)
+        self._data += _u64.pack(value)
+        return self
+
+    def s64(self, value):
+        self._data.append(S64)
+        self._data += _s64.pack(value)
+        return self
+
+    def usec(self, value):
+        self._data.append(USEC)
+        self._data += _u64.pack(value)
+        return self
+
+    def volume(self, value):
+        self._data.append(VOLUME)
+        self._data += _u32.pack(value)
+        return self
+
+    def boolean(self, value):
+        self._data.append(BOOLEAN_TRUE if value else BOOLEAN_FALSE)
+        return self
+
+    def string(self, value):
+        if value is None:
+            self._data.append(STRING_NULL)
+            return self
+
+        self._data.append(STRING)
+        self._data += (value.encode('utf8') if isinstance(value, str) else value) + b'\0'
+        return self
+
+    def arbitrary(self, value):
+        self._data.append(ARBITRARY)
+        self._data += _u32.pack(len(value)) + value
+        return self
+
+    def sample_spec(self, sample_format, channels, rate):
+        self._data.append(SAMPLE_SPEC)
+        self._data += _sample_spec.pack(sample_format, channels, rate)
+        return self
+
+    def channel_map(self, positions):
+        self._data += bytes((CHANNEL_MAP, len(positions))) + bytes(positions)
+        return self
+
+    def cvolume(self, values):
+        self._data += bytes((CVOLUME, len(values))) + struct.pack(f'!{len(values)}I', *values)
+        return self
+
+    def proplist(self, properties):
+        self._data.append(PROPLIST)
+
+        for key, value in properties.items():
+            value = (value.encode('utf8') if isinstance(value, str) else value) + b'\0'
+            self.string(key).u32(len(value)).arbitrary(value)
+
+        self._data.append(STRING_NULL)
+        return self
+
+    def format_info(self, encoding, properties):
+        self._data.append(FORMAT_INFO)
+        return self.u8(encoding).proplist(properties)
@@ -0,0 +1,144 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+from . import log
+from . import libpulse
+from . import trace
+from .connection import BaseConnection
+
+
+class ThreadedConnection(BaseConnection):
+    """
+    Connection with a mainloop running in a thread of its own.
+
+    Any number of threads can run queries at the same time, each waiting for its own operations to
+    complete. Callbacks are run in the mainloop's thread, so every query needs an instance of its
+    own.
+    """
+
+    def __init__(self, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS):
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        super().__init__(timeout, connect_timeout, flags)
+
+    @property
+    def _timed_out(self):
+        # queries of other threads must not see each other's timeouts
+        return getattr(self._local, 'timed_out', None)
+
+    @_timed_out.setter
+    def _timed_out(self, timeout):
+        self._local.timed_out = timeout
+
+    def _create_mainloop(self):
+        self._pa_mainloop = libpulse.threaded_mainloop_new()
+        return libpulse.threaded_mainloop_get_api(self._pa_mainloop)
+
+    def _free_mainloop(self):
+        libpulse.threaded_mainloop_free(self._pa_mainloop)
+
+    def connect(self):
+        with self.lock():
+            super().connect()
+
+        if libpulse.threaded_mainloop_start(self._pa_mainloop) < 0:
+            log.debug('Starting mainloop thread failed')
+            self.state = libpulse.CONTEXT_FAILED
+
+    def close(self):
+        with self.lock():
+            libpulse.context_disconnect(self.context)
+
+        libpulse.threaded_mainloop_stop(self._pa_mainloop)
+        libpulse.context_unref(self.context)
+        self._free_mainloop()
+
+    @contextmanager
+    def lock(self):
+        # callbacks run with the lock held already
+        if libpulse.threaded_mainloop_in_thread(self._pa_mainloop):
+            yield
+            return
+
+        libpulse.threaded_mainloop_lock(self._pa_mainloop)
+
+        try:
+            yield
+        finally:
+            libpulse.threaded_mainloop_unlock(self._pa_mainloop)
+
+    def notify(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def flush(self):
+        # events are dispatched by the mainloop thread as soon as they arrive
+        pass
+
+    def _wait(self, condition, deadline):
+        with self._condition:
+            while not condition():
+                remaining = deadline - monotonic()
+
+                if remaining <= 0:
+                    return False
+
+                self._condition.wait(remaining)
+
+        return True
+
+    def run(self, start, done, timeout=None):
+        """
+        Waits until `done()` returns true or the deadline passed, while the mainloop thread runs.
+
+        `start()` is called once with the mainloop locked, as soon as the context is ready. Returns
+        False if the context failed, didn't get ready in time or `done()` still isn't true at the
+        deadline, see error().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic() + timeout
+        self._timed_out = None
+
+        ready = self._wait(lambda: self.failed or self.state == libpulse.CONTEXT_READY,
+                           min(deadline, self._connect_deadline()))
+
+        if not ready:
+            log.debug(f'Context not ready after {self.connect_timeout}s')
+            trace.mark('connect_timeout')
+            self._connect_timed_out = True
+            self.state = libpulse.CONTEXT_FAILED
+
+        if self.failed:
+            return False
+
+        started = monotonic()
+
+        with self.lock():
+            start()
+
+        if not self._wait(lambda: self.failed or done(), deadline):
+            log.debug(f'Stopping query after {timeout}s')
+            trace.mark('timeout')
+            self._timed_out = timeout
+
+        self.timings['operation'] = monotonic() - started
+
+        with self.lock():
+            return done()
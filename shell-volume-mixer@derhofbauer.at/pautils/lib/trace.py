@@ -0,0 +1,115 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import atexit
+import json
+import os
+import sys
+import threading
+from time import perf_counter
+
+# Timings of a query's phases, written to stderr as a single line of JSON per query, e.g.
+# {"trace": {"query": "cards", "events": [["issue", 0.0021], ...], "timings": {"cb_data": {...}}}}.
+# Event times are seconds since the query began.
+#
+# Each thread traces a query of its own. Callbacks run by the mainloop's thread are passed the record
+# of the query they belong to, see current().
+
+ENABLED = 'PAUTILS_TRACE' in os.environ
+
+_local = threading.local()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def current():
+    """
+    The record of the query traced by the calling thread, None if there is none.
+    """
+    return getattr(_local, 'record', None)
+
+
+def begin(query):
+    if ENABLED:
+        _local.record = {
+            'query': query,
+            'start': perf_counter(),
+            'events': [],
+            'timings': {},
+        }
+
+
+def mark(event, *details, record=None):
+    if record is None:
+        record = current()
+
+    if record is not None:
+        record['events'].append([event, round(perf_counter() - record['start'], 6), *details])
+
+
+def add(timing, started, record=None):
+    """
+    Adds the time passed since `started` (a perf_counter() value) to a timing.
+    """
+    if record is None:
+        record = current()
+
+    if record is None:
+        return
+
+    seconds = perf_counter() - started
+    total = record['timings'].setdefault(timing, {'count': 0, 'total': 0.0, 'max': 0.0})
+
+    total['count'] += 1
+    total['total'] += seconds
+    total['max'] = max(total['max'], seconds)
+
+
+def end(file=sys.stderr):
+    record = current()
+
+    if record is None:
+        return
+
+    _local.record = None
+
+    del record['start']
+
+    for total in record['timings'].values():
+        total['total'] = round(total['total'], 6)
+        total['max'] = round(total['max'], 6)
+
+    file.write(json.dumps({'trace': record}) + '\n')
+    file.flush()
+
+
+def profile(path):
+    """
+    Profiles everything until the process exits, dumping the stats to `path` for pstats to read.
+    """
+    import cProfile
+
+    profiler = cProfile.Profile()
+
+    def dump():
+        profiler.disable()
+        profiler.dump_stats(path)
+
+    atexit.register(dump)
+    profiler.enable()
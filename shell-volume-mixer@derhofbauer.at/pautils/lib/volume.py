@@ -0,0 +1,113 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from itertools import accumulate, chain, repeat
+from math import log10
+from operator import add, mul
+
+from .fields import sub, wants
+from .records import Volume
+
+# raw value of 100%, i.e. 0dB
+NORM = 0x10000
+
+# names of channel positions by pa_channel_position_t
+POSITIONS = dict(enumerate([
+    'mono', 'front-left', 'front-right', 'front-center', 'rear-center', 'rear-left', 'rear-right', 'lfe',
+    'front-left-of-center', 'front-right-of-center', 'side-left', 'side-right',
+    *(f'aux{i}' for i in range(32)),
+    'top-center', 'top-front-left', 'top-front-right', 'top-front-center', 'top-rear-left', 'top-rear-right',
+    'top-rear-center',
+]))
+
+
+def read(fields, values, positions, base=None, steps=None):
+    """
+    Returns the record of a volume, the raw values being kept for convert() to work with.
+
+    `base` and `steps` are None for streams, which have neither.
+    """
+    volume = Volume()
+    volume.values = values
+
+    if wants(fields, 'channels'):
+        volume.channels = positions
+
+    if base is not None and wants(fields, 'base'):
+        volume.base = base
+
+    if steps is not None and wants(fields, 'steps'):
+        volume.steps = steps
+
+    return volume
+
+
+def convert(objects, fields=None):
+    """
+    Adds the linear, percent and dB forms of the volumes of objects exported, as lists by channel.
+
+    The values of all channels of all objects are converted together, each form being computed over a
+    single flat list. Channel positions are turned into names, e.g. `front-left`. `fields` are those
+    of the query, raw values are only kept if wanted.
+    """
+    fields = sub(fields, 'volume')
+    # streams playing passthrough have no volume at all
+    volumes = [item['volume'] for item in objects if isinstance(item, dict) and item.get('volume')]
+
+    if not volumes:
+        return
+
+    values = list(chain.from_iterable(volume['values'] for volume in volumes))
+    forms = {}
+
+    if wants(fields, 'percent'):
+        forms['percent'] = list(map(round, map(mul, values, repeat(100 / NORM)), repeat(2)))
+
+    if wants(fields, 'linear') or wants(fields, 'dB'):
+        factors = list(map(mul, values, repeat(1 / NORM)))
+
+        # the volume is cubic, see pa_sw_volume_to_linear()
+        if wants(fields, 'linear'):
+            forms['linear'] = list(map(round, map(pow, factors, repeat(3)), repeat(6)))
+
+        if wants(fields, 'dB'):
+            # adding 0.0 turns the -0.0 of values rounded to 0dB from below into 0.0
+            decibels = list(map(add, map(round, map(mul, map(log10, map(max, factors, repeat(1 / NORM))),
+                                                     repeat(60)), repeat(2)), repeat(0.0)))
+
+            # muted channels are at minus infinity, which JSON knows nothing of
+            if 0 in values:
+                for i, value in enumerate(values):
+                    if not value:
+                        decibels[i] = None
+
+            forms['dB'] = decibels
+
+    want_values = wants(fields, 'values')
+    ends = accumulate(len(volume['values']) for volume in volumes)
+    start = 0
+
+    for volume, end in zip(volumes, ends):
+        for form, converted in forms.items():
+            volume[form] = converted[start:end]
+
+        if 'channels' in volume:
+            volume['channels'] = list(map(POSITIONS.get, volume['channels']))
+
+        if not want_values:
+            del volume['values']
+
+        start = end
@@ -0,0 +1,151 @@
+# This file is part of GNOME Shell Volume Mixer
+# Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from collections import OrderedDict
+
+from . import log
+from . import libpulse
+from . import snapshot
+from .connection import Connection
+
+
+class Watch:
+    """
+    Subscribes to card, sink and sink input events and writes a line of JSON for each object added, changed or removed.
+
+    Only the object an event was received for is queried. Events arriving while a query is running are
+    coalesced, so each object is queried at most once per pass. If querying an object fails for any other
+    reason than it being gone, an error event is written for it instead.
+    """
+
+    types = ('cards', 'sinks', 'sink_inputs')
+
+    # types watched unless others are asked for
+    default_types = ('cards', 'sinks')
+
+    events = {
+        libpulse.SUBSCRIPTION_EVENT_NEW: 'new',
+        libpulse.SUBSCRIPTION_EVENT_CHANGE: 'change',
+        libpulse.SUBSCRIPTION_EVENT_REMOVE: 'remove',
+    }
+
+    # seconds to block in the mainloop without any events
+    _idle_timeout = 60
+
+    def __init__(self, outfile, op_types=None, timeout=None, connect_timeout=None, flags=libpulse.CONTEXT_NOFLAGS):
+        self._outfile = outfile
+        self._op_types = op_types or list(self.default_types)
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._flags = flags
+
+        self._connection = None
+        self._queries = {}
+        self._pending = OrderedDict()
+
+    def run(self):
+        with Connection(self._timeout, self._connect_timeout, self._flags) as connection:
+            self._connection = connection
+            mask = libpulse.SUBSCRIPTION_MASK_NULL
+
+            for op_type in self._op_types:
+                facility, facility_mask = snapshot.FACILITIES[op_type]
+                self._queries[facility] = (op_type, snapshot.load(op_type)(connection))
+                mask |= facility_mask
+
+            if not connection.subscribe(mask, self.on_event):
+                error = {'success': False, 'error': 'subscribing failed'}
+                self._write(connection.error() if connection.failed else error)
+                return
+
+            log.debug('Subscribed to', ', '.join(self._op_types))
+
+            while not connection.failed:
+                if self._pending:
+                    self._process()
+                elif connection.iterate(self._idle_timeout) < 0:
+                    break
+
+            self._write(connection.error())
+
+    def on_event(self, event_type, index):
+        facility = event_type & libpulse.SUBSCRIPTION_EVENT_FACILITY_MASK
+        event = self.events.get(event_type & libpulse.SUBSCRIPTION_EVENT_TYPE_MASK)
+
+        if facility not in self._queries or not event:
+            return
+
+        key = (facility, index)
+        previous = self._pending.pop(key, None)
+
+        # an object added and changed before we got to query it is still new
+        if previous == 'new' and event == 'change':
+            event = previous
+
+        self._pending[key] = event
+
+    def _process(self):
+        (facility, index), event = self._pending.popitem(last=False)
+        op_type, query = self._queries[facility]
+
+        data = None
+
+        if event != 'remove':
+            result = query.get_info(index=index)
+
+            if self._connection.failed:
+                return
+
+            if 'success' in result:
+                self._write_error(op_type, index, result)
+                return
+
+            data = result.get(index)
+
+            if not data:
+                if libpulse.context_errno(self._connection.context) != libpulse.ERR_NOENTITY:
+                    self._write_error(op_type, index, self._connection.error())
+                    return
+
+                log.debug(f'No data for {op_type} {index}, must have been removed')
+                event = 'remove'
+
+        item = {
+            'event': event,
+            'type': op_type,
+            'index': index,
+        }
+
+        if data:
+            item['data'] = data
+
+        self._write(item)
+
+    def _write_error(self, op_type, index, error):
+        log.debug(f'Querying {op_type} {index} failed:', error['error'])
+
+        self._write({
+            'event': 'error',
+            'type': op_type,
+            'index': index,
+            'error': error['error'],
+            'code': error['code'],
+        })
+
+    def _write(self, item):
+        self._outfile.write(json.dumps(item) + '\n')
+        self._outfile.flush()
@@ -1,9 +1,79 @@
 #!/usr/bin/env python3
 #
-# Usage: query.py [cards|sinks] [index or name, omit for all data]
+# Usage: query.py [cards|sinks|sources|sink_inputs] [indexes or names, omit for all data]
+#        query.py [all|comma separated list of types]
+#        query.py --serve [--socket path [--threaded]]
+#        query.py watch [cards|sinks|sink_inputs, omit for cards and sinks]
+#        query.py graph
+#        query.py meter [sink indexes or names, omit for the default sink] [--rate lines per second]
+#        query.py apply [JSON list of changes, read from stdin if omitted]
 #
-# Output is either a JSON object or an array of all data available, depending on
-# whether an index / name was passed or no parameters at all.
+# Options: --timeout seconds (maximum time a query may take, including connecting)
+#          --since tag (only output what changed since the result tagged, see below)
+#          --fields keys (comma separated keys to output, e.g. index,name,profiles.available)
+#          --properties prefixes (comma separated prefixes of properties to output, e.g. device.,alsa.)
+#          --server server (server to query instead of the default one, e.g. tcp:host, may be repeated)
+#          --stream (write each object as soon as it's received, see below)
+#          --compact (leave out blanks between keys and values)
+#          --trace (write timings of each query's phases to stderr, also enabled by PAUTILS_TRACE,
+#                   not available in watch and meter mode)
+#          --profile file (dump cProfile stats on exit)
+#
+# If no audio server can be reached the output is an error like {"success": false,
+# "error": "...", "code": "no_server", "retry": 1.0}, with retry being the seconds
+# after which trying again makes sense or null if it doesn't.
+#
+# Output is a JSON object of the data requested by index. Any number of indexes
+# and names can be queried at once, or none at all for all data. Querying several
+# types at once results in an object containing the data of each type by name.
+#
+# With --fields only the keys listed are decoded and output, keys of nested
+# objects like profiles or ports are selected with a dot. With --properties the
+# properties of each object with keys starting with any of the prefixes given are
+# output as well, as an object of "properties".
+#
+# Sink inputs, the streams of applications, can only be queried by index. Their
+# application, binary, pid and icon are taken from their properties.
+#
+# Querying all data of a type with --since results in {"tag": ..., "data": {...}}
+# for unknown or empty tags, {"unchanged": true, "tag": ...} if nothing changed
+# since the tagged result or {"tag": ..., "changed": {...}, "removed": [...]}.
+#
+# With --stream each object is written as a line of JSON as soon as it's received,
+# e.g. {"type": "cards", "index": 3, "data": {...}}, followed by a last line of
+# {"success": true} or the error the query failed with. Objects aren't collected,
+# so memory stays the same no matter how many there are. Not supported for the
+# graph, --since or more than one --server.
+#
+# The graph contains cards, sinks and sources, each sink and source linked to its
+# card and that card's active profile, each card linked to its sinks and sources
+# and each card port to the sinks or sources exposing it. Objects can be looked up
+# by name and ALSA card in "names" and "alsaCards". --fields does not apply.
+#
+# With more than one --server all of them are queried at once and the output is an
+# object of each server's result by server, a server that can't be reached being
+# answered with its error. --since isn't supported then.
+#
+# In serve mode queries are read as JSON objects, one per line (e.g.
+# {"type": "cards", "index": 3}), either from stdin or from clients connecting to
+# a Unix socket. Each query is answered with a single line of JSON output. With
+# --threaded socket clients are served concurrently.
+#
+# In watch mode a line of JSON is written for every object watched added, changed or
+# removed, e.g. {"event": "change", "type": "cards", "index": 3, "data": {...}}. An
+# object that couldn't be queried, e.g. because the server didn't answer in time, is
+# reported as {"event": "error", "type": ..., "index": ..., "error": ..., "code": ...}.
+#
+# In apply mode a list of changes is applied at once, e.g. [{"card": "alsa_card...",
+# "profile": "output:hdmi-stereo"}, {"sink": 3, "port": "hdmi-output"},
+# {"default_sink": "alsa_output..."}], cards and sinks given by index or name. The
+# output is {"results": [...], "cards": {...}, "sinks": {...}, "default_sink": ...},
+# with {"success": true} or the error of each change in the same order, followed by
+# the cards and sinks affected and the default sink as they are afterwards. If the
+# server failed after changes were sent, the error comes with the "results".
+#
+# In meter mode a line of JSON with the peak level of each sink, between 0 and 1, is
+# written 20 times a second (or --rate times), e.g. {"peaks": {"0": 0.421}}.
 #
 # This file is part of GNOME Shell Volume Mixer
 # Copyright (C) 2021 Alexander Hofbauer <alex@derhofbauer.at>
@@ -21,43 +91,283 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
 import json
 import sys
+from time import perf_counter
 
+from lib import fields
+from lib import libpulse
 from lib import log
-from lib.cards import Cards
-from lib.sinks import Sinks
+from lib import snapshot
+from lib import stream
+from lib import trace
+from lib.connection import Connection
 from lib.libpulse import NULL_ID
 
-if len(sys.argv) < 2:
+
+def positive_int(value):
+    number = int(value)
+
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+
+    return number
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('type', nargs='?', help='type of data to query (cards, sinks, sources, sink_inputs, all) or watch')
+parser.add_argument('filter', nargs='*', help='indexes or names, omit for all data')
+parser.add_argument('--serve', action='store_true', help='keep running and answer queries line by line')
+parser.add_argument('--socket', help='serve on a Unix socket instead of stdin / stdout')
+parser.add_argument('--threaded', action='store_true', help='serve socket clients concurrently')
+parser.add_argument('--timeout', type=float, help='seconds a query may take, including connecting')
+parser.add_argument('--connect-timeout', type=float, help='seconds connecting may take, failing early otherwise')
+parser.add_argument('--no-autospawn', action='store_true', help="don't start the audio server if it isn't running")
+parser.add_argument('--wait-for-server', action='store_true',
+                    help='wait for the audio server to show up, as long as --timeout unless --connect-timeout')
+parser.add_argument('--native', action='store_true', help='speak the native protocol, local servers only')
+parser.add_argument('--server', action='append', default=[], help='server to query, e.g. tcp:host, may be repeated')
+parser.add_argument('--rate', type=positive_int, help='lines of peaks to write per second when metering')
+parser.add_argument('--since', help='tag of a previous result, to only output what changed')
+parser.add_argument('--fields', help='comma separated keys to output, e.g. index,name,profiles.available')
+parser.add_argument('--properties', help='comma separated prefixes of properties to output, e.g. device.,alsa.')
+parser.add_argument('--stream', action='store_true', help='write objects line by line as soon as they are received')
+parser.add_argument('--compact', action='store_true', help='leave out blanks between keys and values')
+parser.add_argument('--trace', action='store_true', help='write timings of each query to stderr as JSON')
+parser.add_argument('--profile', help='file to dump cProfile stats to on exit')
+args = parser.parse_args()
+
+flags = libpulse.CONTEXT_NOFLAGS
+
+if args.no_autospawn:
+    flags |= libpulse.CONTEXT_NOAUTOSPAWN
+
+if args.wait_for_server:
+    flags |= libpulse.CONTEXT_NOFAIL
+
+server = args.server[0] if len(args.server) == 1 else None
+
+
+def connect():
+    if args.native:
+        from lib.native import NativeConnection
+        return NativeConnection(args.timeout, args.connect_timeout, flags)
+
+    return Connection(args.timeout, args.connect_timeout, flags, server)
+
+
+if args.trace:
+    trace.enable()
+
+if args.profile:
+    trace.profile(args.profile)
+
+
+if args.native and (args.serve or args.type in ('watch', 'meter', 'apply')):
+    print('The native backend only answers single queries')
+    sys.exit(1)
+
+if args.server and (args.native or args.serve or args.type in ('watch', 'meter')):
+    print('Only single queries using libpulse can be sent to other servers')
+    sys.exit(1)
+
+if args.native:
+    from lib.native import socket_path
+
+    if socket_path() is None:
+        log.debug('Server not supported by the native backend, using libpulse')
+        args.native = False
+
+if len(args.server) > 1 and args.type == 'apply':
+    print('Changes can only be applied to a single server')
+    sys.exit(1)
+
+if args.serve:
+    from lib.server import Server
+
+    with Server(args.timeout, args.threaded, args.connect_timeout, flags) as server:
+        try:
+            if args.socket:
+                server.serve_socket(args.socket)
+            else:
+                server.serve_stream(sys.stdin, sys.stdout)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f'Serving failed: {e}')
+            sys.exit(1)
+
+    sys.exit(0)
+
+
+if not args.type:
     print('Need a type to query')
     sys.exit(1)
 
-op_type = sys.argv[1]
-index = name = None
+if args.trace and args.type in ('watch', 'meter'):
+    print('Only single queries and changes applied can be traced')
+    sys.exit(1)
 
-if len(sys.argv) > 2:
-    filter_arg = sys.argv[2]
-    if filter_arg.isdigit():
-        index = int(filter_arg)
-    else:
-        name = filter_arg
+if args.type == 'watch':
+    from lib.watch import Watch
 
+    invalid = [op_type for op_type in args.filter if op_type not in Watch.types]
 
-if index == NULL_ID:
-    result = {}
+    if invalid:
+        print('Invalid type', ', '.join(invalid), 'to watch')
+        sys.exit(1)
+
+    try:
+        Watch(sys.stdout, args.filter, args.timeout, args.connect_timeout, flags).run()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
 
-elif op_type == 'cards':
-    with Cards() as cards:
-        result = cards.get_info(index=index, name=name)
+    sys.exit(1)
+
+if args.type == 'meter':
+    from lib.meter import Meter
+
+    lookups = [int(arg) if arg.isdigit() else arg for arg in args.filter]
+
+    try:
+        Meter(sys.stdout, lookups, args.rate, args.timeout, args.connect_timeout, flags).run()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+    sys.exit(1)
+
+if args.type == 'apply':
+    from lib import changes
+
+    try:
+        requested = json.loads(' '.join(args.filter) if args.filter else sys.stdin.read())
+    except ValueError:
+        requested = None
+
+    invalid = changes.parse(requested)
+
+    if invalid:
+        print('Invalid changes:', invalid)
+        sys.exit(1)
+
+    trace.begin(args.type)
+
+    with connect() as connection:
+        result = changes.apply(connection, requested)
 
-elif op_type == 'sinks':
-    with Sinks() as sinks:
-        result = sinks.get_info(index=index, name=name)
+    print(json.dumps(result, indent=4 if log.DEBUG else None, separators=stream.COMPACT if args.compact else None))
+    trace.end()
+    sys.exit(0)
 
+if args.type == 'graph':
+    from lib import graph
+    op_types = list(graph.TYPES)
 else:
-    print('Invalid type', op_type, 'requested')
+    op_types = snapshot.parse_types(args.type)
+
+invalid = [op_type for op_type in op_types if op_type not in snapshot.TYPES]
+
+if not op_types or invalid:
+    print('Invalid type', ', '.join(invalid) or args.type, 'requested')
+    sys.exit(1)
+
+if args.filter and len(op_types) > 1:
+    print('Need a single type to query by index or name')
+    sys.exit(1)
+
+if args.since is not None and (args.filter or len(op_types) > 1 or len(args.server) > 1):
+    print('Need a single type and server without indexes or names to query changes')
     sys.exit(1)
 
+if args.stream and (args.type == 'graph' or args.since is not None or len(args.server) > 1):
+    print('Only objects of plain queries of a single server can be streamed')
+    sys.exit(1)
+
+trace.begin(args.type)
+
+lookups = [int(arg) if arg.isdigit() else arg for arg in args.filter]
+valid_lookups = [lookup for lookup in lookups if lookup != NULL_ID]
+options = {
+    'fields': fields.parse(args.fields),
+    'properties': [prefix for prefix in (args.properties or '').split(',') if prefix],
+}
+writer = None
+
+if args.stream:
+    writer = stream.Writer(sys.stdout, args.compact)
+
+
+def load(op_type, connection):
+    query = snapshot.load(op_type, args.native)(connection, **options)
+
+    if writer:
+        writer.attach(op_type, query)
+
+    return query
+
+
+if lookups and not valid_lookups:
+    result = {}
+
+elif len(args.server) > 1:
+    from lib.fanout import Fanout
+
+    # all keys are needed to link objects of the graph
+    query_options = {'properties': options['properties']} if args.type == 'graph' else options
+
+    with Fanout(args.server, args.timeout, args.connect_timeout, flags) as fanout:
+        queries = {name: {op_type: snapshot.load(op_type)(connection, **query_options) for op_type in op_types}
+                   for name, connection in fanout.connections.items()}
+        result = snapshot.get_servers(fanout, queries, valid_lookups or None)
+
+    for name, server_result in result.items():
+        if 'success' in server_result:
+            continue
+
+        if args.type == 'graph':
+            result[name] = graph.join(server_result)
+        elif len(op_types) == 1:
+            result[name] = server_result[op_types[0]]
+
+elif args.since is not None:
+    from lib.cache import Cache
+
+    if args.native:
+        from lib.native import NativeServerInfo as ServerInfo
+    else:
+        from lib.serverinfo import ServerInfo
+
+    with connect() as connection:
+        query = snapshot.load(op_types[0], args.native)(connection, **options)
+        result = snapshot.get_changes(connection, op_types[0], query, ServerInfo(connection), Cache(op_types[0]),
+                                      args.since)
+
+elif args.type == 'graph':
+    with connect() as connection:
+        # all keys are needed to link objects
+        queries = {op_type: snapshot.load(op_type, args.native)(connection, properties=options['properties'])
+                   for op_type in op_types}
+        result = snapshot.get_graph(connection, queries)
+
+elif len(op_types) > 1:
+    with connect() as connection:
+        queries = {op_type: load(op_type, connection) for op_type in op_types}
+        result = snapshot.get_info(connection, queries)
+
+else:
+    with connect() as connection:
+        result = load(op_types[0], connection).get_batch(valid_lookups or None)
+
+
+if writer:
+    writer.end(result)
+    trace.end()
+    sys.exit(0)
+
+started = perf_counter()
+output = json.dumps(result, indent=4 if log.DEBUG else None, separators=stream.COMPACT if args.compact else None)
+trace.add('json', started)
 
-print(json.dumps(result, indent=4 if log.DEBUG else None))
+print(output)
+trace.end()